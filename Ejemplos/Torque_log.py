@@ -1,12 +1,25 @@
-import base64
-import io
 import pandas as pd
-import numpy as np
-import plotly.express as px
-from dash import Dash, html, dcc, Input, Output, dash_table, State, no_update
-import re
+import plotly.graph_objects as go
+from dash import Dash, html, dcc, Input, Output, dash_table, State, ctx, no_update
+import uuid
 
-app = Dash(__name__)
+from torque_cache import SessionStore, content_key
+from torque_core import TorqueCore, metric_unit, parse_contents, parse_file, time_series_figure
+from torque_plot import brushed_range, relayout_range, shared_x_range
+from torque_parse import ELAPSED_COLUMN, SESSION_COLUMN
+from torque_export import FORMATS, export_url, register_export_route
+from torque_upload import UPLOAD_ROUTE, register_upload_route
+
+# suppress_callback_exceptions: los controles y gráficos se crean en callbacks.
+app = Dash(__name__, suppress_callback_exceptions=True)
+
+# Frames ya parseados, por sesión de navegador y hash del contenido subido.
+# Los callbacks reciben sólo la clave (dcc.Store 'frame-key') y el id de
+# sesión; el store limita la memoria y vence las sesiones inactivas.
+session_store = SessionStore()
+# Parseo, biblioteca en disco (compartida con main.py), canales derivados e
+# índices por log (torque_core.py).
+core = TorqueCore()
 
 # Agregar fuente Inter desde Google Fonts
 font_link = html.Link(
@@ -15,75 +28,132 @@ font_link = html.Link(
 )
 app.title = "Torque Log Visualizer"
 
-app.layout = html.Div([
-    font_link,
-    html.Div([
-        html.H2("Torque Log Visualizer", style={'marginBottom': '20px'}),
-
-        dcc.Upload(
-            id='upload-data',
-            children=html.Div(['📁 Drag and Drop o ', html.A('Seleccionar CSV')]),
-            style={
-                'width': '100%', 'height': '60px', 'lineHeight': '60px',
-                'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
-                'textAlign': 'center', 'margin': '10px 0'
-            },
-            multiple=False
-        ),
+def serve_layout():
+    # Layout como función: cada carga de página recibe su propio id de sesión.
+    session_id = uuid.uuid4().hex
+    return html.Div([
+        dcc.Store(id='session-id', data=session_id),
+        font_link,
+        html.Div([
+            html.H2("Torque Log Visualizer", style={'marginBottom': '20px'}),
+
+            dcc.Upload(
+                id='upload-data',
+                children=html.Div(['📁 Drag and Drop o ', html.A('Seleccionar CSV')]),
+                style={
+                    'width': '100%', 'height': '60px', 'lineHeight': '60px',
+                    'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
+                    'textAlign': 'center', 'margin': '10px 0'
+                },
+                multiple=False
+            ),
+            html.Div([
+                # Para logs grandes: se sube crudo a disco, sin pasar por base64.
+                html.Button("📦 Subir log grande (directo a disco)", **{
+                    'data-stream-upload': UPLOAD_ROUTE,
+                    'data-target': 'frame-key',
+                    'data-session': session_id,
+                    'data-status': 'stream-upload-status',
+                }),
+                html.Div(id='stream-upload-status', style={'fontSize': '12px'}),
+            ], style={'margin': '10px 0'}),
 
-        html.Button("⬇️ Descargar Excel", id="download-button", style={'marginTop': '10px'}),
-        dcc.Download(id="download-dataframe-xlsx"),
+            dcc.Store(id='frame-key'),
 
-        html.Hr(),
-        html.Label("Seleccionar uso de variables"),
-        html.Div(id='variable-usage-checklist-container')
-    ], style={
-        'width': '350px',
-        'padding': '20px',
-        'borderRight': '1px solid #ccc',
-        'flexShrink': 0
-    }),
+            # La descarga es un link a la ruta de exportación (torque_export.py),
+            # que arma el archivo de a pedazos en vez de mandarlo por el callback.
+            html.Div([
+                html.Label("Exportar"),
+                dcc.RadioItems(
+                    id='export-format',
+                    options=[{'label': ' Excel', 'value': 'xlsx'},
+                             {'label': ' CSV (gzip)', 'value': 'csv.gz'},
+                             {'label': ' Parquet', 'value': 'parquet'}],
+                    value='xlsx', inline=True,
+                    labelStyle={'marginRight': '10px'}
+                ),
+                dcc.Dropdown(id='export-columns', multi=True, placeholder='Todas las columnas'),
+                dcc.Checklist(
+                    id='export-visible-range',
+                    options=[{'label': ' Sólo el rango visible del gráfico', 'value': 'visible'}],
+                    value=[]
+                ),
+                dcc.Store(id='time-range'),
+                html.A("⬇️ Descargar", id='export-link', href='', download='',
+                       style={'display': 'none'}),
+            ], style={'marginTop': '10px'}),
 
-    html.Div(id='output-visuals', style={'flexGrow': 1, 'padding': '20px'})
-], style={'fontFamily': 'Inter, sans-serif', 'display': 'flex', 'minHeight': '100vh'})
+            html.Hr(),
+            html.Label("Seleccionar uso de variables"),
+            html.Div(id='variable-usage-checklist-container')
+        ], style={
+            'width': '350px',
+            'padding': '20px',
+            'borderRight': '1px solid #ccc',
+            'flexShrink': 0
+        }),
 
+        html.Div(id='output-visuals', style={'flexGrow': 1, 'padding': '20px'})
+    ], style={'fontFamily': 'Inter, sans-serif', 'display': 'flex', 'minHeight': '100vh'})
 
-def parse_contents(contents):
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    csv_string = decoded.decode('utf-8')
-    df = pd.read_csv(io.StringIO(csv_string), skipinitialspace=True, na_values=["-"])
+app.layout = serve_layout
 
-    if "Device Time" in df.columns:
-        try:
-            df["Time"] = pd.to_datetime(df["Device Time"], format='%d-%b-%Y %H:%M:%S.%f')
-        except:
-            df["Time"] = pd.to_datetime(df["Device Time"], errors='coerce')
 
-    if "GPS Speed (Meters/second)" in df.columns:
-        df["GPS Speed (Kilometers/hour)"] = df["GPS Speed (Meters/second)"] * 3.6
-        df.drop(columns=["GPS Speed (Meters/second)"], inplace=True)
+def store_frame(session_id, key, parse, filename=''):
+    # De la biblioteca si ya se parseó (en esta app o en main.py); si no,
+    # se parsea y se guarda. Devuelve el mensaje de error, o ''.
+    df, summary, error = core.load(key, parse, filename)
+    if df is not None:
+        session_store.put(session_id, key, df, summary)
+    return error
 
-    return df
+def store_streamed_upload(path, key, session_id, filename):
+    # Upload directo (torque_upload.py): el archivo ya está en disco.
+    if session_store.get(session_id, key) is None:
+        return store_frame(session_id, key, lambda: parse_file(path), filename)
+    return None
 
-stored_df = {}
+register_upload_route(app.server, store_streamed_upload)
+register_export_route(app.server, session_store.get)
 
 @app.callback(
-    Output('variable-usage-checklist-container', 'children'),
-    Input('upload-data', 'contents')
+    Output('frame-key', 'data'),
+    Input('upload-data', 'contents'),
+    [State('session-id', 'data'),
+     State('upload-data', 'filename')]
 )
-def render_variable_checklists(contents):
+def load_upload(contents, session_id, filename):
+    # Único punto donde se parsea el archivo; el resto trabaja con la clave.
     if not contents:
+        return None
+
+    key = content_key(contents)
+    if session_store.get(session_id, key) is None:
+        error = store_frame(session_id, key, lambda: parse_contents(contents), filename or '')
+        if error:
+            return {'error': f"No se pudo leer el archivo: {error}"}
+    return {'key': key}
+
+@app.callback(
+    Output('variable-usage-checklist-container', 'children'),
+    Input('frame-key', 'data'),
+    State('session-id', 'data')
+)
+def render_variable_checklists(frame_ref, session_id):
+    if not frame_ref:
         return html.Div("📤 Subí un archivo para comenzar.")
+    if 'error' in frame_ref:
+        return html.Div(f"⚠️ {frame_ref['error']}")
 
-    df = parse_contents(contents)
-    stored_df['data'] = df
+    summary = session_store.summary(session_id, frame_ref['key'])
+    if summary is None:
+        return html.Div("⚠️ El archivo ya no está en memoria. Volvé a subirlo.")
 
     exclude = [
         'Latitude', 'Longitude', 'Horizontal Dilution of Precision', 'Bearing',
-        'G(x)', 'G(y)', 'G(z)', 'G(calibrated)'
+        'G(x)', 'G(y)', 'G(z)', 'G(calibrated)', SESSION_COLUMN, ELAPSED_COLUMN
     ]
-    variables = [col for col in df.columns if col not in exclude and pd.api.types.is_numeric_dtype(df[col])]
+    variables = [col for col in summary.index if col not in exclude]
 
     return html.Div([
         html.Label("Seleccionar métrica (una sola):"),
@@ -98,37 +168,127 @@ def render_variable_checklists(contents):
             id='hover-checklist',
             options=[{'label': var, 'value': var} for var in variables],
             labelStyle={'display': 'block', 'margin': '2px 0'}
+        ),
+        html.Br(),
+        html.Label("Canales sincronizados (pueden ser varios):"),
+        dcc.Dropdown(
+            id='multi-channels',
+            options=[{'label': var, 'value': var} for var in variables],
+            multi=True,
+            placeholder='Elegir canales...'
         )
     ])
 
 
+def metric_figure(df, metrica, x_range=None):
+    # Sólo se envían min/max por píxel del rango visible (torque_core.py).
+    return time_series_figure(df, metrica, x_range, title=f"{metrica} en el tiempo",
+                              font=dict(size=12, family="Inter"))
+
+
+@app.callback(
+    [Output('time-series', 'figure'),
+     Output('time-range', 'data')],
+    Input('time-series', 'relayoutData'),
+    [State('frame-key', 'data'),
+     State('metric-radio', 'value'),
+     State('session-id', 'data')],
+    prevent_initial_call=True
+)
+def zoom_time_series(relayout_data, frame_ref, metrica, session_id):
+    # Al hacer zoom se vuelve a decimar sólo el rango visible; con un rango
+    # corto llegan todos los puntos originales.
+    x_range = relayout_range(relayout_data)
+    if x_range is False or not frame_ref or not metrica:
+        return no_update, no_update
+    df = session_store.get(session_id, frame_ref.get('key'))
+    if df is None:
+        return no_update, no_update
+    # El rango queda atado a la clave: al subir otro archivo deja de valer.
+    time_range = {'key': frame_ref['key'], 'range': list(x_range) if x_range else None}
+    return metric_figure(df, metrica, x_range), time_range
+
+
+@app.callback(
+    Output('multi-plot', 'figure'),
+    [Input('multi-channels', 'value'),
+     Input('multi-plot', 'relayoutData')],
+    [State('frame-key', 'data'),
+     State('session-id', 'data')]
+)
+def update_multi_plot(channels, relayout_data, frame_ref, session_id):
+    x_range = None
+    if ctx.triggered_id == 'multi-plot':
+        # Zoom en cualquiera de los subplots: se vuelve a muestrear sólo el rango visible.
+        x_range = shared_x_range(relayout_data)
+        if x_range is False:
+            return no_update
+    key = (frame_ref or {}).get('key')
+    df = session_store.get(session_id, key)
+    channels = [c for c in channels or [] if df is not None and c in df.columns]
+    if not channels or 'Time' not in df.columns:
+        fig = go.Figure()
+        fig.update_layout(height=120, xaxis={'visible': False}, yaxis={'visible': False},
+                          annotations=[{'text': "Elegí canales en el panel izquierdo.",
+                                        'showarrow': False, 'font': {'size': 14}}])
+        return fig
+    # Todos los canales sobre la misma base de tiempo, con el eje x compartido.
+    return core.multi_channel_figure(key, df, channels, x_range, font=dict(size=12, family="Inter"))
+
+
+def map_figure(df, key, metrica, hover_columns, x_range=None):
+    # Con muchos puntos el mapa va agregado por celdas (torque_core.py); el
+    # hover con las columnas elegidas, cuando se mandan los puntos crudos.
+    # uirevision: al filtrar por rango se conserva la vista del mapa.
+    return core.map_figure(key, df, metrica, 'grid', x_range=x_range, hover_columns=hover_columns or [],
+                           color_scale='Jet', font=dict(size=12, family="Inter"),
+                           mapbox={"style": "carto-positron"})
+
+
+def stats_records(df, key, summary, metrica, x_range=None):
+    # Sin rango, la fila del resumen calculado al cargar; con rango, sobre el
+    # índice por tiempo del log.
+    stats = core.range_summary(key, df, summary, metrica, x_range)
+    unidad = metric_unit(metrica)
+
+    stats_data = pd.DataFrame({
+        'Statistic': ['Prom', 'Max', 'Min', 'Start', 'End', '25%', '50%', '75%', '90%'],
+        'Value': stats[['mean', 'max', 'min', 'first', 'last',
+                        'p25', 'p50', 'p75', 'p90']].tolist(),
+        'Unit': [unidad] * 9
+    })
+    return stats_data.to_dict('records')
+
+
 @app.callback(
-    Output('output-visuals', 'children'),
-    [Input('upload-data', 'contents'),
+    [Output('output-visuals', 'children'),
+     Output('time-range', 'data', allow_duplicate=True)],
+    [Input('frame-key', 'data'),
      Input('metric-radio', 'value'),
-     Input('hover-checklist', 'value')]
+     Input('hover-checklist', 'value')],
+    [State('session-id', 'data'),
+     State('time-range', 'data')],
+    prevent_initial_call='initial_duplicate'
 )
-def update_visuals(contents, metrica, hover_columns):
-    if not contents or not metrica:
-        return html.Div("📤 Subí un archivo y seleccioná una métrica."),
+def update_visuals(frame_ref, metrica, hover_columns, session_id, time_range):
+    # Al redibujar todo el gráfico temporal vuelve al log entero: el rango
+    # elegido antes ya no vale.
+    return render_visuals(frame_ref, metrica, hover_columns, session_id), (None if time_range else no_update)
+
 
-    df = parse_contents(contents)
-    stored_df['data'] = df
+def render_visuals(frame_ref, metrica, hover_columns, session_id):
+    if not frame_ref or 'key' not in frame_ref or not metrica:
+        return html.Div("📤 Subí un archivo y seleccioná una métrica.")
+
+    df = session_store.get(session_id, frame_ref['key'])
+    summary = session_store.summary(session_id, frame_ref['key'])
+    if df is None or summary is None:
+        return html.Div("⚠️ El archivo ya no está en memoria. Volvé a subirlo.")
 
     if 'Latitude' in df.columns and 'Longitude' in df.columns:
-        fig_map = px.scatter_map(
-            df,
-            lat='Latitude',
-            lon='Longitude',
-            color=metrica,
-            zoom=12,
-            height=500,
-            color_continuous_scale='Jet',
-            hover_data=[col for col in (hover_columns or []) if col in df.columns]
-        )
-        fig_map.update_layout(font=dict(size=12, family="Inter"), mapbox={"style": "carto-positron"}, margin={"r": 0, "t": 0, "l": 0, "b": 0})
+        fig_map = map_figure(df, frame_ref['key'], metrica, hover_columns)
 
-        map_graph = dcc.Graph(figure=fig_map, config={
+        map_graph = dcc.Graph(id='map-plot', figure=fig_map, config={
             'displayModeBar': 'hover',
             'displaylogo': False,
             'modeBarButtonsToAdd': ['zoom2d', 'pan2d', 'resetViewMapbox'],
@@ -138,30 +298,11 @@ def update_visuals(contents, metrica, hover_columns):
         map_graph = html.Div("⚠️ No hay coordenadas para mostrar el mapa.")
 
     # Single metric time plot
-    fig_time = px.line(df.dropna(subset=[metrica]), x='Time', y=metrica, title=f"{metrica} en el tiempo")
-    fig_time.update_layout(font=dict(size=12, family="Inter"))
-
-    col_data = df[metrica].dropna()
-    match = re.search(r'\(([^()]*)\)\s*$', metrica)
-    unidad = match.group(1) if match else ''
-    if unidad == 'Kilometers/hour':
-        unidad = 'km/h'
-
-    stats_data = pd.DataFrame({
-        'Statistic': ['Prom', 'Max', 'Min', 'Start', 'End', '25%', '50%', '75%', '90%'],
-        'Value': [
-            col_data.mean(), col_data.max(), col_data.min(),
-            col_data.iloc[0], col_data.iloc[-1],
-            np.percentile(col_data, 25),
-            np.percentile(col_data, 50),
-            np.percentile(col_data, 75),
-            np.percentile(col_data, 90)
-        ],
-        'Unit': [unidad] * 9
-    })
+    fig_time = metric_figure(df, metrica)
 
     stats_table = dash_table.DataTable(
-        data=stats_data.to_dict('records'),
+        id='stats-table',
+        data=stats_records(df, frame_ref['key'], summary, metrica),
         columns=[
             {"name": "Statistic", "id": "Statistic"},
             {"name": "Value", "id": "Value", "type": "numeric", "format": {"specifier": ".2f"}},
@@ -190,24 +331,86 @@ def update_visuals(contents, metrica, hover_columns):
         map_graph,
         html.Div([
             html.H4("📈 Métrica temporal"),
-            dcc.Graph(figure=fig_time)
+            dcc.Graph(id='time-series', figure=fig_time)
         ], style={'marginTop': '80px'}),
         html.Div([
             html.H4("📊 Estadísticas"),
             stats_table
+        ], style={'marginTop': '80px'}),
+        html.Div([
+            html.H4("🧭 Canales sincronizados"),
+            dcc.Graph(id='multi-plot', config={'displaylogo': False})
         ], style={'marginTop': '80px'})
     ], style={'padding': '20px'})
 
 
 @app.callback(
-    Output("download-dataframe-xlsx", "data"),
-    Input("download-button", "n_clicks"),
+    Output('stats-table', 'data'),
+    Input('time-range', 'data'),
+    [State('frame-key', 'data'),
+     State('metric-radio', 'value'),
+     State('session-id', 'data')],
+    prevent_initial_call=True
+)
+def brush_stats(time_range, frame_ref, metrica, session_id):
+    # Zoom en el gráfico temporal: estadísticas sólo de ese tramo.
+    key = (frame_ref or {}).get('key')
+    df = session_store.get(session_id, key)
+    summary = session_store.summary(session_id, key)
+    if df is None or summary is None or metrica not in summary.index:
+        return no_update
+    return stats_records(df, key, summary, metrica, brushed_range(time_range, key))
+
+
+@app.callback(
+    Output('map-plot', 'figure'),
+    Input('time-range', 'data'),
+    [State('frame-key', 'data'),
+     State('metric-radio', 'value'),
+     State('hover-checklist', 'value'),
+     State('session-id', 'data')],
     prevent_initial_call=True
 )
-def download_excel(n_clicks):
-    if 'data' in stored_df:
-        return dcc.send_data_frame(stored_df['data'].to_excel, "torque_log.xlsx", index=False)
-    return no_update
+def brush_map(time_range, frame_ref, metrica, hover_columns, session_id):
+    # Zoom en el gráfico temporal: el mapa muestra sólo los puntos del tramo.
+    key = (frame_ref or {}).get('key')
+    df = session_store.get(session_id, key)
+    if df is None or not metrica or 'Latitude' not in df.columns:
+        return no_update
+    return map_figure(df, key, metrica, hover_columns, brushed_range(time_range, key))
+
+
+@app.callback(
+    Output('export-columns', 'options'),
+    Input('frame-key', 'data'),
+    State('session-id', 'data')
+)
+def update_export_columns(frame_ref, session_id):
+    df = session_store.get(session_id, (frame_ref or {}).get('key'))
+    if df is None:
+        return []
+    return [{'label': col, 'value': col} for col in df.columns]
+
+
+@app.callback(
+    [Output('export-link', 'href'),
+     Output('export-link', 'download'),
+     Output('export-link', 'style')],
+    [Input('frame-key', 'data'),
+     Input('export-format', 'value'),
+     Input('export-columns', 'value'),
+     Input('export-visible-range', 'value'),
+     Input('time-range', 'data')],
+    State('session-id', 'data')
+)
+def update_export_link(frame_ref, fmt, columns, visible, time_range, session_id):
+    if not frame_ref or 'key' not in frame_ref:
+        return '', '', {'display': 'none'}
+    x_range = None
+    if visible and time_range and time_range.get('key') == frame_ref['key']:
+        x_range = time_range.get('range')
+    href = export_url(fmt, frame_ref['key'], session_id, columns, x_range)
+    return href, f"torque_log.{FORMATS[fmt][1]}", {'display': 'inline-block', 'marginTop': '10px'}
 
 
 if __name__ == '__main__':
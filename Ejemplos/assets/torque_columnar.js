@@ -0,0 +1,269 @@
+// Modo cliente de main.py (ver torque_columnar.py). El payload con el tiempo,
+// el GPS y la métrica elegida llega al cargar el archivo, y cada métrica nueva
+// llega sola a 'client-columns' la primera vez que se elige; acá se decodifica
+// y se arman el mapa, la serie temporal y la tabla de estadísticas.
+(function () {
+    const TIME_NAT = -2147483648;
+    const GRID_CELLS = 120;       // mismos valores que torque_plot.py
+    const RAW_POINT_LIMIT = 5000;
+    const DEFAULT_BUCKETS = 1000;
+    const STAT_ROWS = [
+        ["Average", "mean"], ["Maximum", "max"], ["Minimum", "min"],
+        ["Start", "first"], ["End", "last"], ["25th Percentile", "p25"],
+        ["Median", "p50"], ["75th Percentile", "p75"], ["90th Percentile", "p90"]
+    ];
+
+    // Lo decodificado se guarda por payload: cambiar de métrica no vuelve a
+    // leer el base64.
+    const decoded = new WeakMap();
+
+    function bytesOf(text) {
+        const raw = atob(text);
+        const bytes = new Uint8Array(raw.length);
+        for (let i = 0; i < raw.length; i++) bytes[i] = raw.charCodeAt(i);
+        return bytes.buffer;
+    }
+
+    function decodeTime(time) {
+        if (!time) return null;
+        if (time.encoding === "float64") {
+            return Array.from(new Float64Array(bytesOf(time.data)), v => (isNaN(v) ? null : v));
+        }
+        const deltas = new Int32Array(bytesOf(time.data));
+        const out = new Array(deltas.length);
+        let acc = time.start;
+        for (let i = 0; i < deltas.length; i++) {
+            if (deltas[i] === TIME_NAT) {
+                out[i] = null;
+            } else {
+                acc += deltas[i];
+                out[i] = acc;
+            }
+        }
+        return out;
+    }
+
+    function encodedColumn(payload, extra, name) {
+        return payload.columns[name] || (extra && extra[name]) || null;
+    }
+
+    function column(payload, name, extra) {
+        let cache = decoded.get(payload);
+        if (!cache) {
+            cache = { columns: {} };
+            decoded.set(payload, cache);
+        }
+        if (name === "__time__") {
+            if (!("time" in cache)) cache.time = decodeTime(payload.time);
+            return cache.time;
+        }
+        const encoded = encodedColumn(payload, extra, name);
+        if (!encoded) return null;
+        if (!cache.columns[name]) {
+            const values = new Float32Array(bytesOf(encoded.data));
+            const out = new Float64Array(values.length);
+            for (let i = 0; i < values.length; i++) out[i] = values[i] + encoded.offset;
+            cache.columns[name] = out;
+        }
+        return cache.columns[name];
+    }
+
+    function colorScale(payload, stats) {
+        // Misma regla que map_scales(): divergente si la métrica cruza el cero.
+        if (stats.min < 0 && stats.max > 0) return { colors: payload.scales.diverging, mid: 0 };
+        return { colors: payload.scales.sequential, mid: null };
+    }
+
+    function asPlotlyScale(colors) {
+        return colors.map((c, i) => [i / (colors.length - 1), c]);
+    }
+
+    function viewportBounds(relayout) {
+        if (!relayout) return null;
+        const derived = relayout["map._derived"];
+        if (derived && derived.coordinates) {
+            const lons = derived.coordinates.map(c => c[0]);
+            const lats = derived.coordinates.map(c => c[1]);
+            return [Math.min(...lons), Math.min(...lats), Math.max(...lons), Math.max(...lats)];
+        }
+        const center = relayout["map.center"];
+        const zoom = relayout["map.zoom"];
+        if (!center || zoom === undefined) return null;
+        const degPerPx = 360 / (512 * Math.pow(2, zoom));
+        const halfW = degPerPx * 500;
+        const halfH = degPerPx * 250 * Math.cos(center.lat * Math.PI / 180);
+        return [center.lon - halfW, center.lat - halfH, center.lon + halfW, center.lat + halfH];
+    }
+
+    function gridAggregate(lat, lon, values, rows, bounds) {
+        // Mismo agrupamiento que torque_plot.grid_aggregate().
+        const [west, south, east, north] = bounds;
+        const size = Math.max(east - west, north - south) / GRID_CELLS || 1e-6;
+        const cells = new Map();
+        for (const i of rows) {
+            if (isNaN(values[i])) continue;
+            const code = Math.floor((lat[i] - south) / size) * (GRID_CELLS + 1) + Math.floor((lon[i] - west) / size);
+            const cell = cells.get(code);
+            if (cell) {
+                cell.sum += values[i];
+                cell.max = Math.max(cell.max, values[i]);
+                cell.count += 1;
+            } else {
+                cells.set(code, { sum: values[i], max: values[i], count: 1 });
+            }
+        }
+        const out = { lat: [], lon: [], mean: [], custom: [] };
+        for (const [code, cell] of cells) {
+            const iy = Math.floor(code / (GRID_CELLS + 1));
+            const ix = code - iy * (GRID_CELLS + 1);
+            out.lat.push(south + (iy + 0.5) * size);
+            out.lon.push(west + (ix + 0.5) * size);
+            out.mean.push(cell.sum / cell.count);
+            out.custom.push([cell.max, cell.count]);
+        }
+        return out;
+    }
+
+    function mapFigure(payload, extra, metric, mapMode, bounds) {
+        const lat = column(payload, "Latitude");
+        const lon = column(payload, "Longitude");
+        if (!lat || !lon) return { data: [], layout: { height: 10 } };
+        const values = column(payload, metric, extra);
+        const latStats = payload.summary.Latitude;
+        const lonStats = payload.summary.Longitude;
+        const scale = colorScale(payload, payload.summary[metric]);
+        const rows = [];
+        for (let i = 0; i < lat.length; i++) {
+            if (isNaN(lat[i]) || isNaN(lon[i])) continue;
+            if (bounds && (lon[i] < bounds[0] || lat[i] < bounds[1] || lon[i] > bounds[2] || lat[i] > bounds[3])) continue;
+            rows.push(i);
+        }
+        const marker = {
+            colorscale: asPlotlyScale(scale.colors),
+            showscale: true,
+            colorbar: { title: { text: metric } }
+        };
+        if (scale.mid !== null) marker.cmid = scale.mid;
+
+        let trace;
+        if (mapMode === "points" || rows.length <= RAW_POINT_LIMIT) {
+            marker.color = rows.map(i => values[i]);
+            trace = {
+                type: "scattermap", mode: "markers", marker: marker,
+                lat: rows.map(i => lat[i]), lon: rows.map(i => lon[i]),
+                hovertemplate: `${metric}=%{marker.color:.2f}<extra></extra>`
+            };
+        } else {
+            const grid = gridAggregate(lat, lon, values, rows, bounds || [
+                lonStats.min, latStats.min, lonStats.max, latStats.max
+            ]);
+            marker.color = grid.mean;
+            trace = {
+                type: "scattermap", mode: "markers", marker: marker,
+                lat: grid.lat, lon: grid.lon, customdata: grid.custom,
+                hovertemplate: `${metric}=%{marker.color:.2f}<br>Maximum=%{customdata[0]:.2f}` +
+                    "<br>Points=%{customdata[1]}<extra></extra>"
+            };
+        }
+        const layout = {
+            height: 500,
+            margin: { r: 0, t: 0, l: 0, b: 0 },
+            map: { style: "open-street-map", zoom: 10,
+                   center: { lat: latStats.mean, lon: lonStats.mean } },
+            uirevision: metric
+        };
+        return { data: [trace], layout: layout };
+    }
+
+    function minmaxRows(time, values, nBuckets) {
+        // Mismo criterio que torque_plot.minmax_indices(): por balde de
+        // tiempo, la primera fila del mínimo y la del máximo.
+        const rows = [];
+        for (let i = 0; i < time.length; i++) {
+            if (time[i] !== null && !isNaN(values[i])) rows.push(i);
+        }
+        if (rows.length <= 2 * nBuckets) return rows;
+        const start = time[rows[0]];
+        const width = (time[rows[rows.length - 1]] - start) / nBuckets || 1;
+        const low = new Map();
+        const high = new Map();
+        for (const i of rows) {
+            const b = Math.min(Math.floor((time[i] - start) / width), nBuckets - 1);
+            if (!low.has(b) || values[i] < values[low.get(b)]) low.set(b, i);
+            if (!high.has(b) || values[i] > values[high.get(b)]) high.set(b, i);
+        }
+        return Array.from(new Set([...low.values(), ...high.values()])).sort((a, b) => a - b);
+    }
+
+    function timeSeriesFigure(payload, extra, metric) {
+        const time = column(payload, "__time__");
+        if (!time) return { data: [], layout: {} };
+        const values = column(payload, metric, extra);
+        const session = column(payload, "Session");
+        const x = [];
+        const y = [];
+        let previous = null;
+        for (const i of minmaxRows(time, values, DEFAULT_BUCKETS)) {
+            // Un hueco entre sesiones para no unirlas con una recta.
+            if (session && previous !== null && session[i] !== session[previous]) {
+                x.push(null);
+                y.push(null);
+            }
+            x.push(time[i]);
+            y.push(values[i]);
+            previous = i;
+        }
+        return {
+            data: [{ type: "scattergl", mode: "lines", x: x, y: y, name: metric, connectgaps: false }],
+            layout: {
+                title: { text: `${metric} over Time` },
+                xaxis: { type: "date" },
+                yaxis: { title: { text: metric } },
+                hovermode: "closest",
+                uirevision: metric
+            }
+        };
+    }
+
+    function statsRows(payload, metric) {
+        const stats = payload.summary[metric];
+        return STAT_ROWS.map(([label, field]) => ({ Statistic: label, Value: stats[field] }));
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        torque: {
+            render: function (metric, mapMode, relayout, payload, extra) {
+                const noUpdate = window.dash_clientside.no_update;
+                // Sin la columna todavía: se vuelve a llamar cuando llega.
+                if (!payload || !metric || !encodedColumn(payload, extra, metric)) {
+                    return [noUpdate, noUpdate, noUpdate];
+                }
+                const triggered = (window.dash_clientside.callback_context.triggered || [])
+                    .map(t => t.prop_id);
+                if (triggered.length === 1 && triggered[0] === "client-map.relayoutData") {
+                    // Zoom o pan del mapa: sólo se reagrupa el viewport.
+                    const bounds = viewportBounds(relayout);
+                    if (!bounds || mapMode === "points") return [noUpdate, noUpdate, noUpdate];
+                    return [mapFigure(payload, extra, metric, mapMode, bounds), noUpdate, noUpdate];
+                }
+                return [
+                    mapFigure(payload, extra, metric, mapMode, null),
+                    timeSeriesFigure(payload, extra, metric),
+                    statsRows(payload, metric)
+                ];
+            },
+            // Métrica elegida que el navegador todavía no tiene: se le pide
+            // al servidor (fetch_client_column en main.py).
+            missingColumn: function (metric, payload, extra) {
+                if (!payload || !metric || !payload.summary[metric] || encodedColumn(payload, extra, metric)) {
+                    return window.dash_clientside.no_update;
+                }
+                return metric;
+            },
+            // En modo cliente el servidor no se entera de los cambios de métrica.
+            serverMetric: function (metric, renderMode) {
+                return renderMode === "client" ? window.dash_clientside.no_update : metric;
+            }
+        }
+    });
+})();
@@ -0,0 +1,38 @@
+// Upload directo para los visualizadores de Torque (ver torque_upload.py).
+// Un click en cualquier elemento con data-stream-upload abre el selector de
+// archivos y manda el archivo crudo por POST, sin leerlo en memoria ni
+// pasarlo a base64. La respuesta del servidor ({key} o {error}) queda en el
+// dcc.Store indicado en data-target.
+async function streamUpload(trigger, file) {
+    const status = document.getElementById(trigger.dataset.status);
+    const setStatus = text => { if (status) status.textContent = text; };
+    const params = new URLSearchParams({ session: trigger.dataset.session || "", name: file.name });
+
+    setStatus(`Subiendo ${file.name}...`);
+    try {
+        // fetch envía el File en streaming desde el disco del navegador.
+        const response = await fetch(`${trigger.dataset.streamUpload}?${params}`, {
+            method: "POST",
+            body: file,
+            headers: { "Content-Type": "text/csv" }
+        });
+        const result = await response.json();
+        window.dash_clientside.set_props(trigger.dataset.target, { data: result });
+        setStatus(result.error ? result.error : `${file.name} cargado.`);
+    } catch (error) {
+        console.error("No se pudo subir el archivo:", error);
+        setStatus("No se pudo subir el archivo.");
+    }
+}
+
+document.addEventListener("click", event => {
+    const trigger = event.target.closest && event.target.closest("[data-stream-upload]");
+    if (!trigger) return;
+    const input = document.createElement("input");
+    input.type = "file";
+    input.accept = ".csv";
+    input.addEventListener("change", () => {
+        if (input.files[0]) streamUpload(trigger, input.files[0]);
+    });
+    input.click();
+});
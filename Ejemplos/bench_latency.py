@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Benchmark de MultiPing (ping.py) y del ONT Latency Monitor (delay_jitter.py)
+contra una red simulada local.
+
+Destinos posibles:
+- loopback (default): 127.0.x.y, sin demora inyectada. Mide el costo propio
+  del sondeo; no necesita privilegios si el backend es dgram/subprocess.
+- netns (--netns, Linux y root): crea un network namespace unido por un par
+  veth, con netem aplicando --delay ms y --loss % a la salida del namespace.
+  Una ruta "local" hace que el namespace responda por todo un /16, así se
+  pueden pinguear miles de hosts sin crear miles de interfaces.
+
+Mide, por backend:
+- multiping: sondas/s con todos los hosts en paralelo y CPU por sonda
+  (incluye la de los procesos ping hijos en el backend subprocess).
+- monitor: sondas secuenciales a un solo destino, como delay_jitter.py.
+- error de timestamp: RTT medido menos la demora inyectada (media, p50, p99).
+- memoria por host: bytes de un HostStats con la ventana y el historial llenos.
+
+Uso: python3 bench_latency.py [--hosts 1024] [--rounds 5] [--backend auto dgram subprocess]
+     sudo python3 bench_latency.py --netns --delay 5 --loss 1 --json resultado.json
+"""
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from statistics import mean, quantiles
+
+from latency_core import make_prober
+import ping
+
+NETNS = "mpbench"
+VETH_HOST = "mpb0"
+VETH_NS = "mpb1"
+HOST_ADDR = "10.213.0.1/30"
+NS_ADDR = "10.213.0.2/30"
+NS_RANGE = "10.214.0.0/16"
+
+
+def sh(*command):
+    subprocess.run(command, check=True, capture_output=True)
+
+
+def setup_netns(delay_ms: float, loss_pct: float):
+    """Arma el namespace con netem; devuelve la red cuyos hosts responden."""
+    teardown_netns()
+    sh("ip", "netns", "add", NETNS)
+    sh("ip", "link", "add", VETH_HOST, "type", "veth", "peer", "name", VETH_NS)
+    sh("ip", "link", "set", VETH_NS, "netns", NETNS)
+    sh("ip", "addr", "add", HOST_ADDR, "dev", VETH_HOST)
+    sh("ip", "link", "set", VETH_HOST, "up")
+    sh("ip", "route", "add", NS_RANGE, "via", NS_ADDR.split("/")[0])
+    ns = ("ip", "netns", "exec", NETNS)
+    sh(*ns, "ip", "addr", "add", NS_ADDR, "dev", VETH_NS)
+    sh(*ns, "ip", "link", "set", VETH_NS, "up")
+    sh(*ns, "ip", "link", "set", "lo", "up")
+    # Ruta local: el namespace contesta por cualquier IP del rango.
+    network = ipaddress.ip_network(NS_RANGE)
+    sh(*ns, "ip", "route", "add", "local", str(network), "dev", "lo")
+    netem = ["tc", "qdisc", "add", "dev", VETH_NS, "root", "netem", "delay", f"{delay_ms}ms"]
+    if loss_pct > 0:
+        netem += ["loss", f"{loss_pct}%"]
+    sh(*ns, *netem)
+    return network
+
+
+def teardown_netns():
+    # Al borrar el namespace el kernel elimina también el par veth.
+    subprocess.run(["ip", "netns", "del", NETNS], capture_output=True)
+
+
+def make_targets(count: int, network=None) -> list[str]:
+    if network is None:
+        network = ipaddress.ip_network("127.0.0.0/8")
+    # Salteamos x.x.0.y: en loopback es 127.0.0.1 y su vecindad inmediata.
+    hosts = (ip for ip in network.hosts() if int(ip) & 0xFF00)
+    return [str(ip) for ip, _ in zip(hosts, range(count))]
+
+
+def cpu_seconds() -> float:
+    """CPU propia más la de procesos hijos ya terminados (ping del sistema)."""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def error_stats(rtts, delay_ms):
+    received = [r for r in rtts if r is not None]
+    if not received:
+        return {"error_mean_ms": None, "error_p50_ms": None, "error_p99_ms": None}
+    errors = sorted(r - delay_ms for r in received)
+    if len(errors) >= 2:
+        cuts = quantiles(errors, n=100, method="inclusive")
+        p50, p99 = cuts[49], cuts[98]
+    else:
+        p50 = p99 = errors[0]
+    return {
+        "error_mean_ms": round(mean(errors), 4),
+        "error_p50_ms": round(p50, 4),
+        "error_p99_ms": round(p99, 4),
+    }
+
+
+async def bench_multiping(prober, targets, rounds, timeout, delay_ms):
+    """Todos los hosts en paralelo por ronda, como el loop de MultiPing."""
+    rtts = []
+    cpu0, wall0 = cpu_seconds(), time.perf_counter()
+    for _ in range(rounds):
+        rtts += await asyncio.gather(*(prober.aprobe(ip, timeout) for ip in targets))
+    wall, cpu = time.perf_counter() - wall0, cpu_seconds() - cpu0
+    probes = len(rtts)
+    return {
+        "probes": probes,
+        "loss_pct": round(100.0 * sum(r is None for r in rtts) / probes, 2),
+        "probes_per_s": round(probes / wall, 1),
+        "cpu_us_per_probe": round(cpu / probes * 1e6, 1),
+        **error_stats(rtts, delay_ms),
+    }
+
+
+def bench_monitor(prober, target, count, timeout, delay_ms):
+    """Sondas secuenciales a un destino, como el loop de delay_jitter.py."""
+    rtts = []
+    cpu0, wall0 = cpu_seconds(), time.perf_counter()
+    for _ in range(count):
+        rtts.append(prober.probe(target, timeout))
+    wall, cpu = time.perf_counter() - wall0, cpu_seconds() - cpu0
+    return {
+        "probes": count,
+        "loss_pct": round(100.0 * sum(r is None for r in rtts) / count, 2),
+        "probes_per_s": round(count / wall, 1),
+        "cpu_us_per_probe": round(cpu / count * 1e6, 1),
+        **error_stats(rtts, delay_ms),
+    }
+
+
+def bench_memory(host_count: int) -> dict:
+    """Bytes por host con la ventana de stats y el historial de sparkline llenos."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    stats_map = {}
+    for i in range(host_count):
+        stats = ping.HostStats()
+        for n in range(max(ping.SAMPLE_WINDOW, ping.SPARK_POINTS)):
+            stats.add(None if n % 17 == 0 else 1.0 + n * 0.01)
+        stats_map[f"10.0.{i >> 8}.{i & 0xFF}"] = stats
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"hosts": host_count, "bytes_per_host": round((after - before) / host_count)}
+
+
+def print_table(title, results):
+    print(f"\n{title}")
+    print(f"{'Backend':11} {'Sondas':>7} {'Sondas/s':>10} {'CPU us/s.':>10} {'Loss%':>6} "
+          f"{'Err med':>8} {'Err p50':>8} {'Err p99':>8}")
+    print("-" * 76)
+    for backend, r in results.items():
+        if "error" in r:
+            print(f"{backend:11} {r['error']}")
+            continue
+        fmt = lambda v: "-" if v is None else f"{v:.3f}"
+        print(f"{backend:11} {r['probes']:7d} {r['probes_per_s']:10.1f} {r['cpu_us_per_probe']:10.1f} "
+              f"{r['loss_pct']:6.1f} {fmt(r['error_mean_ms']):>8} {fmt(r['error_p50_ms']):>8} "
+              f"{fmt(r['error_p99_ms']):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de MultiPing y del monitor ONT.")
+    parser.add_argument("--hosts", type=int, default=1024, help="hosts simulados. Default: 1024")
+    parser.add_argument("--rounds", type=int, default=5, help="rondas sobre todos los hosts. Default: 5")
+    parser.add_argument("--monitor-probes", type=int, default=500,
+                        help="sondas secuenciales del modo monitor. Default: 500")
+    parser.add_argument("--timeout", type=float, default=1.0, help="timeout por sonda (s). Default: 1.0")
+    parser.add_argument("--backend", nargs="+", default=["auto", "dgram", "subprocess"],
+                        choices=["auto", "raw", "dgram", "subprocess"])
+    parser.add_argument("--netns", action="store_true", help="usar un namespace con netem (root)")
+    parser.add_argument("--delay", type=float, default=5.0, help="demora netem en ms. Default: 5")
+    parser.add_argument("--loss", type=float, default=0.0, help="pérdida netem en %%. Default: 0")
+    parser.add_argument("--json", help="guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    network = None
+    delay_ms = 0.0
+    if args.netns:
+        try:
+            network = setup_netns(args.delay, args.loss)
+        except (OSError, subprocess.CalledProcessError) as exc:
+            teardown_netns()
+            print(f"ERROR al crear el namespace (¿root? ¿iproute2/tc con netem?): {exc}")
+            sys.exit(1)
+        delay_ms = args.delay
+
+    targets = make_targets(args.hosts, network)
+    results = {
+        "config": {
+            "target": "netns" if args.netns else "loopback",
+            "hosts": len(targets),
+            "rounds": args.rounds,
+            "delay_ms": delay_ms,
+            "loss_pct": args.loss if args.netns else 0.0,
+        },
+        "multiping": {},
+        "monitor": {},
+        "memory": bench_memory(args.hosts),
+    }
+
+    try:
+        for backend in args.backend:
+            try:
+                prober = make_prober(backend)
+            except OSError as exc:
+                results["multiping"][backend] = results["monitor"][backend] = {"error": str(exc)}
+                continue
+            name = backend if backend != "auto" else f"auto/{prober.backend}"
+            try:
+                # El backend subprocess lanza un proceso por sonda: limitamos
+                # las rondas para que el benchmark no tarde minutos.
+                rounds = 1 if prober.backend == "subprocess" else args.rounds
+                results["multiping"][name] = asyncio.run(
+                    bench_multiping(prober, targets, rounds, args.timeout, delay_ms))
+                results["monitor"][name] = bench_monitor(
+                    prober, targets[0], args.monitor_probes, args.timeout, delay_ms)
+            finally:
+                prober.close()
+    finally:
+        if args.netns:
+            teardown_netns()
+
+    cfg = results["config"]
+    print(f"Destino: {cfg['target']} | hosts: {cfg['hosts']} | demora: {cfg['delay_ms']} ms "
+          f"| pérdida: {cfg['loss_pct']} %")
+    print_table("MultiPing (todos los hosts en paralelo)", results["multiping"])
+    print_table("Monitor (un destino, secuencial)", results["monitor"])
+    mem = results["memory"]
+    print(f"\nMemoria: {mem['bytes_per_host']} bytes por host ({mem['hosts']} hosts)")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Benchmark del parseo, las estadísticas y los gráficos de los visualizadores
+de Torque (main.py y Torque_log.py) con logs sintéticos (torque_synth.py).
+
+Para cada tamaño de --rows genera (o reusa, en --data-dir) un log con
+--channels PIDs y --sessions sesiones, y en un proceso nuevo por app y
+tamaño mide cada etapa como la corre el servidor:
+- upload: parse_contents() con el archivo en base64, como llega de
+  dcc.Upload (sólo hasta --upload-max-mb).
+- parse: parse_file(), el camino del upload directo a disco.
+- summary: resumen por columna (summarize_columns).
+- derived: canales derivados por defecto (TorqueCore.derive).
+- range_stats: estadísticas de un tramo del 10% del log (índice por tiempo
+  incluido, la primera vez).
+- time_figure / map_figure / multi_figure: figura armada y serializada a
+  JSON, como la manda Dash; se informa el tamaño del JSON.
+- client_payload (main.py): el Store del modo cliente.
+
+Por etapa: segundos, pico de memoria de Python (tracemalloc; no ve los
+buffers internos del parser de pandas ni de pyarrow) y, por corrida, el pico
+de RSS del proceso. tracemalloc agrega algo de tiempo: --no-tracemalloc
+para tiempos limpios.
+
+Uso: python3 bench_torque.py [--rows 10000 100000 1000000] [--apps main torque_log]
+     python3 bench_torque.py --rows 10000000 --stages parse summary --json resultado.json
+"""
+import argparse
+import base64
+import contextlib
+import gc
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import pandas as pd
+
+from torque_summary import summarize_columns
+from torque_synth import write_log
+
+METRIC = "Engine RPM(rpm)"
+MULTI_CHANNELS = 10
+RANGE_FRACTION = 0.1
+APPS = ("main", "torque_log")
+STAGES = ("upload", "parse", "summary", "derived", "range_stats", "time_figure", "map_figure",
+          "multi_figure", "client_payload")
+
+
+def log_path(data_dir: str, rows: int, channels: int, sessions: int, seed: int) -> str:
+    """Log sintético para esos parámetros; se genera sólo si no existe."""
+    path = os.path.join(data_dir, f"torque_{rows}r_{channels}c_{sessions}s_{seed}.csv")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        start = time.perf_counter()
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            size = write_log(f, rows, channels, sessions, seed=seed)
+        os.replace(tmp, path)
+        print(f"Generado {path} ({size / 1e6:.0f} MB) en {time.perf_counter() - start:.1f} s")
+    return path
+
+
+def middle_range(df: pd.DataFrame, fraction: float = RANGE_FRACTION):
+    """Tramo de `fraction` del log, centrado, como lo devuelve el zoom de Plotly."""
+    start, end = df["Time"].min(), df["Time"].max()
+    middle = start + (end - start) / 2
+    half = (end - start) * fraction / 2
+    return str(middle - half), str(middle + half)
+
+
+def figure_bytes(fig) -> int:
+    return len(fig.to_json())
+
+
+def main_stages():
+    """Etapas de main.py: (nombre, función(estado) -> bytes enviados o None)."""
+    import main as app
+
+    def upload(s):
+        df, error = app.parse_contents(s.pop("contents"))
+        if df is None:
+            raise RuntimeError(error)
+
+    def parse(s):
+        s["df"], error = app.parse_file(s["path"])
+        if s["df"] is None:
+            raise RuntimeError(error)
+
+    def summary(s):
+        s["summary"] = summarize_columns(s["df"])
+
+    def derived(s):
+        s["df"], s["summary"], _ = app.core.derive(s["key"], s["df"], s["summary"])
+        app.frame_cache.put(s["key"], s["df"], s["summary"])
+
+    def range_stats(s):
+        app.core.range_summary(s["key"], s["df"], s["summary"], METRIC, middle_range(s["df"]))
+
+    def time_figure(s):
+        return figure_bytes(app.time_series_figure(s["df"], METRIC))
+
+    def map_figure(s):
+        scale, midpoint = app.map_scales(s["summary"].loc[METRIC])
+        return figure_bytes(app.core.map_figure(s["key"], s["df"], METRIC, "grid",
+                                                color_scale=scale, midpoint=midpoint))
+
+    def client_payload(s):
+        return len(json.dumps(app.columnar_payload(s["df"], s["summary"], [METRIC])))
+
+    return [("upload", upload), ("parse", parse), ("summary", summary), ("derived", derived),
+            ("range_stats", range_stats), ("time_figure", time_figure), ("map_figure", map_figure),
+            ("client_payload", client_payload)]
+
+
+def torque_log_stages():
+    """Etapas de Torque_log.py."""
+    import Torque_log as app
+    session_id = "bench"
+
+    def upload(s):
+        df, error = app.parse_contents(s.pop("contents"))
+        if df is None:
+            raise RuntimeError(error)
+
+    def parse(s):
+        s["df"], error = app.parse_file(s["path"])
+        if s["df"] is None:
+            raise RuntimeError(error)
+
+    def summary(s):
+        s["summary"] = summarize_columns(s["df"])
+
+    def derived(s):
+        s["df"], s["summary"], _ = app.core.derive(s["key"], s["df"], s["summary"])
+        app.session_store.put(session_id, s["key"], s["df"], s["summary"])
+
+    def range_stats(s):
+        app.stats_records(s["df"], s["key"], s["summary"], METRIC, middle_range(s["df"]))
+
+    def time_figure(s):
+        return figure_bytes(app.metric_figure(s["df"], METRIC))
+
+    def map_figure(s):
+        return figure_bytes(app.map_figure(s["df"], s["key"], METRIC, []))
+
+    def multi_figure(s):
+        channels = [c for c in s["summary"].index if c not in ("Latitude", "Longitude")][:MULTI_CHANNELS]
+        return figure_bytes(app.core.multi_channel_figure(s["key"], s["df"], channels))
+
+    return [("upload", upload), ("parse", parse), ("summary", summary), ("derived", derived),
+            ("range_stats", range_stats), ("time_figure", time_figure), ("map_figure", map_figure),
+            ("multi_figure", multi_figure)]
+
+
+def run_app(app: str, path: str, stages, upload_max_mb: float, trace: bool) -> dict:
+    """Corre en un proceso nuevo: importa la app y mide cada etapa en orden."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        available = main_stages() if app == "main" else torque_log_stages()
+    # Plotly importa y valida perezosamente en la primera figura: que no
+    # cuente en la primera etapa que grafica.
+    import plotly.express as px
+    px.line(pd.DataFrame({"x": [0, 1], "y": [0, 1]}), x="x", y="y").to_json()
+    state = {"path": path, "key": "0" * 32}
+    size_mb = os.path.getsize(path) / 1e6
+    results = {}
+    for name, stage in available:
+        if name not in stages:
+            continue
+        if name == "upload":
+            if size_mb > upload_max_mb:
+                continue
+            with open(path, "rb") as f:
+                state["contents"] = "data:text/csv;base64," + base64.b64encode(f.read()).decode("ascii")
+        gc.collect()
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                sent = stage(state)
+            error = None
+        except Exception as e:
+            sent, error = None, f"{type(e).__name__}: {e}"
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace else None
+        if trace:
+            tracemalloc.stop()
+        results[name] = {"seconds": round(seconds, 4),
+                         "peak_mb": round(peak / 1e6, 1) if peak is not None else None,
+                         "sent_mb": round(sent / 1e6, 2) if sent is not None else None,
+                         "error": error}
+        if error and name == "parse":
+            break
+    # ru_maxrss: KB en Linux, bytes en macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / 1e6 if sys.platform == "darwin" else rss / 1e3
+    return {"stages": results, "max_rss_mb": round(rss_mb, 1)}
+
+
+def print_table(rows: int, app: str, size_mb: float, result: dict):
+    print(f"\n{app} - {rows} filas ({size_mb:.0f} MB), pico RSS {result['max_rss_mb']:.0f} MB")
+    print(f"  {'etapa':<15}{'s':>10}{'pico MB':>10}{'JSON MB':>10}")
+    for name, r in result["stages"].items():
+        peak = "-" if r["peak_mb"] is None else f"{r['peak_mb']:.1f}"
+        sent = "-" if r["sent_mb"] is None else f"{r['sent_mb']:.2f}"
+        line = f"  {name:<15}{r['seconds']:>10.3f}{peak:>10}{sent:>10}"
+        print(line + (f"  {r['error']}" if r["error"] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del parseo y los gráficos de los visualizadores de Torque.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000],
+                        help="tamaños de log a medir. Default: 10000 100000 1000000")
+    parser.add_argument("--channels", type=int, default=100, help="PIDs por log. Default: 100")
+    parser.add_argument("--sessions", type=int, default=3, help="sesiones por log. Default: 3")
+    parser.add_argument("--seed", type=int, default=0, help="semilla del generador. Default: 0")
+    parser.add_argument("--apps", nargs="+", choices=APPS, default=list(APPS), help="apps a medir")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES), help="etapas a medir")
+    parser.add_argument("--upload-max-mb", type=float, default=200,
+                        help="tamaño máximo de archivo para la etapa upload (base64 en memoria). Default: 200")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "torque_bench"),
+                        help="dónde guardar y reusar los logs generados")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="no medir memoria por etapa")
+    parser.add_argument("--json", help="guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    # Las etapas que grafican o resumen necesitan el frame y su resumen.
+    stages = set(args.stages) | {"parse"}
+    if stages - {"upload", "parse"}:
+        stages |= {"summary", "derived"}
+
+    results = {"config": vars(args).copy(), "runs": []}
+    # Un proceso nuevo por app y tamaño: cachés, imports y pico de RSS propios.
+    context = get_context("spawn")
+    for rows in args.rows:
+        path = log_path(args.data_dir, rows, args.channels, args.sessions, args.seed)
+        size_mb = os.path.getsize(path) / 1e6
+        for app in args.apps:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(run_app, app, path, stages, args.upload_max_mb,
+                                     not args.no_tracemalloc).result()
+            print_table(rows, app, size_mb, result)
+            results["runs"].append(dict(result, app=app, rows=rows, file_mb=round(size_mb, 1)))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
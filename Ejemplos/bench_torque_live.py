@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la ingesta en vivo de Torque Pro (torque_live.py).
+
+Simula --vehicles autos mandando lecturas como Torque (una request GET con
+--pids sensores cada una) y mide:
+- store: LiveStore.ingest() directo desde N threads, sin HTTP. Es el techo
+  de lo que puede absorber el buffer columnar.
+- http: requests reales contra la ruta /torque de un servidor Flask local
+  (werkzeug con threads) o contra --url, una conexión por auto.
+- memoria por sesión con --rows lecturas.
+
+Con --hz (lecturas por segundo de cada auto en Torque; default 1) informa
+cuántos autos a la vez soporta cada camino.
+
+El servidor local es el de desarrollo de werkzeug (un thread por request,
+sin keep-alive): para medir el caso real, levantar main.py detrás de un
+servidor WSGI (gunicorn -w 4 --threads 8 main:server) y usar --url.
+
+Uso: python3 bench_torque_live.py [--vehicles 200] [--requests 50] [--pids 30] [--hz 1]
+     python3 bench_torque_live.py --url http://servidor:8050/torque
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+import tracemalloc
+from statistics import quantiles
+from urllib.parse import urlencode, urlsplit
+
+import numpy as np
+from flask import Flask
+from werkzeug.serving import make_server
+
+from torque_live import LIVE_ROUTE, LiveStore, register_live_routes
+
+
+def torque_params(vehicle: int, reading: int, pids: int) -> dict:
+    """Parámetros de una lectura como los manda Torque Pro."""
+    params = {"v": "8", "session": str(1714567890000 + vehicle), "id": f"{vehicle:032x}",
+              "eml": "bench@example.com", "time": str(1714567890000 + reading * 1000)}
+    params["kff1006"] = f"{-34.6 + reading * 1e-5:.6f}"
+    params["kff1005"] = f"{-58.4 + vehicle * 1e-4:.6f}"
+    for i in range(pids - 2):
+        params[f"k{i + 0x0c:x}"] = f"{(reading * 7 + i * 13) % 250 / 3:.2f}"
+    return params
+
+
+def run_threads(count: int, target) -> float:
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+
+def bench_store(vehicles: int, requests: int, pids: int) -> dict:
+    store = LiveStore()
+    # Las cadenas de la query se arman antes: sólo se mide la ingesta.
+    readings = [[torque_params(v, r, pids) for r in range(requests)] for v in range(vehicles)]
+
+    def vehicle(v):
+        for params in readings[v]:
+            store.ingest(params)
+
+    wall = run_threads(vehicles, vehicle)
+    total = vehicles * requests
+    rows = sum(s["rows"] for s in store.sessions())
+    return {"requests": total, "rows_stored": rows, "requests_per_s": round(total / wall, 1),
+            "us_per_request": round(wall / total * 1e6, 1)}
+
+
+def bench_http(url: str, vehicles: int, requests: int, pids: int) -> dict:
+    parts = urlsplit(url)
+    latencies = [[] for _ in range(vehicles)]
+    errors = [0] * vehicles
+
+    def vehicle(v):
+        conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+        for r in range(requests):
+            query = urlencode(torque_params(v, r, pids))
+            start = time.perf_counter()
+            try:
+                conn.request("GET", f"{parts.path}?{query}")
+                response = conn.getresponse()
+                body = response.read()
+                if body != b"OK!":
+                    errors[v] += 1
+                if response.will_close:
+                    conn.close()
+                    conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+            except OSError:
+                errors[v] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=10)
+            latencies[v].append((time.perf_counter() - start) * 1000)
+        conn.close()
+
+    wall = run_threads(vehicles, vehicle)
+    flat = sorted(x for lat in latencies for x in lat)
+    cuts = quantiles(flat, n=100, method="inclusive") if len(flat) >= 2 else flat * 99
+    total = vehicles * requests
+    return {"requests": total, "errors": sum(errors), "requests_per_s": round(total / wall, 1),
+            "latency_p50_ms": round(cuts[49], 2), "latency_p99_ms": round(cuts[98], 2)}
+
+
+def bench_memory(rows: int, pids: int) -> dict:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = LiveStore()
+    for r in range(rows):
+        store.ingest(torque_params(0, r, pids))
+    # read() vuelca las lecturas pendientes al buffer columnar.
+    store.session(store.sessions()[0]["id"]).read(rows)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {"rows": rows, "pids": pids, "bytes_per_row": round((after - before) / rows, 1)}
+
+
+def start_local_server():
+    server_app = Flask(__name__)
+    store = LiveStore()
+    register_live_routes(server_app, store)
+    server = make_server("127.0.0.1", 0, server_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}{LIVE_ROUTE}", store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la ingesta en vivo de Torque Pro.")
+    parser.add_argument("--vehicles", type=int, default=200, help="autos simultáneos. Default: 200")
+    parser.add_argument("--requests", type=int, default=50, help="lecturas por auto. Default: 50")
+    parser.add_argument("--pids", type=int, default=30, help="sensores por lectura. Default: 30")
+    parser.add_argument("--hz", type=float, default=1.0, help="lecturas/s de cada auto. Default: 1")
+    parser.add_argument("--rows", type=int, default=20000, help="lecturas para medir memoria. Default: 20000")
+    parser.add_argument("--url", help="servidor externo (ej. http://host:8050/torque) en vez del local")
+    parser.add_argument("--json", help="guardar los resultados en este archivo")
+    args = parser.parse_args()
+
+    results = {"config": vars(args).copy()}
+    results["store"] = bench_store(args.vehicles, args.requests, args.pids)
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url, _ = start_local_server()
+    try:
+        results["http"] = bench_http(url, args.vehicles, args.requests, args.pids)
+    finally:
+        if server is not None:
+            server.shutdown()
+    results["memory"] = bench_memory(args.rows, args.pids)
+
+    for name in ("store", "http"):
+        r = results[name]
+        r["vehicles_at_hz"] = int(np.floor(r["requests_per_s"] / args.hz))
+
+    print(f"{args.vehicles} autos x {args.requests} lecturas, {args.pids} sensores por lectura")
+    s = results["store"]
+    print(f"\nstore: {s['requests_per_s']:.0f} lecturas/s ({s['us_per_request']} us c/u), "
+          f"{s['rows_stored']} filas guardadas")
+    h = results["http"]
+    print(f"http:  {h['requests_per_s']:.0f} requests/s, p50 {h['latency_p50_ms']} ms, "
+          f"p99 {h['latency_p99_ms']} ms, {h['errors']} errores ({url})")
+    print(f"\nA {args.hz:g} lectura/s por auto: ~{s['vehicles_at_hz']} autos por la ingesta, "
+          f"~{h['vehicles_at_hz']} por HTTP")
+    m = results["memory"]
+    print(f"Memoria: {m['bytes_per_row']} bytes por lectura con {m['pids']} sensores")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
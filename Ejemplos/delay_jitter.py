@@ -1,32 +1,23 @@
 import argparse
-import csv
 import logging
-import os
 import socket
-import struct
 import threading
 import time
 import webbrowser
-from collections import deque
 from datetime import datetime
-from statistics import mean
 
 from flask import Flask, jsonify, render_template_string
 
-# ============================================================
-# ICMP
-# ============================================================
-
-ICMP_ECHO_REQUEST = 8
-ICMP_ECHO_REPLY = 0
-PAYLOAD_SIZE = 32
+from latency_core import CsvSink, MemorySink, WindowStats, make_prober
 
 # ============================================================
 # Estado global compartido entre el medidor y Flask
 # ============================================================
 
-samples = deque()
-samples_lock = threading.Lock()
+# El sondeo ICMP, las estadísticas de ventana y el CSV vienen de
+# latency_core.py, compartido con ping.py (MultiPing).
+memory = MemorySink(600)
+stats = WindowStats(600)
 stop_event = threading.Event()
 
 app = Flask(__name__)
@@ -38,198 +29,47 @@ TIMEOUT = 1.0
 MAX_POINTS = 600
 WINDOW_MINUTES = 30.0
 CSV_FILE = ""
-
-
-def internet_checksum(data: bytes) -> int:
-    """Calcula el checksum de 16 bits usado por ICMP."""
-    if len(data) % 2:
-        data += b"\x00"
-
-    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
-    total = (total >> 16) + (total & 0xFFFF)
-    total += total >> 16
-    return (~total) & 0xFFFF
-
-
-class RawIcmpPinger:
-    """
-    Envía ICMP Echo Request usando un socket RAW y mide el RTT con
-    time.perf_counter_ns(), evitando parsear la salida de ping.exe.
-    """
-
-    def __init__(self, target: str, timeout: float):
-        self.target = target
-        self.target_ip = socket.gethostbyname(target)
-        self.timeout = timeout
-        self.identifier = os.getpid() & 0xFFFF
-        self.sequence = 0
-
-        self.sock = socket.socket(
-            socket.AF_INET,
-            socket.SOCK_RAW,
-            socket.IPPROTO_ICMP,
-        )
-
-    def close(self):
-        self.sock.close()
-
-    def _build_packet(self, sequence: int) -> bytes:
-        # Header ICMP sin checksum para poder calcularlo después.
-        header = struct.pack(
-            "!BBHHH",
-            ICMP_ECHO_REQUEST,
-            0,                  # code
-            0,                  # checksum temporal
-            self.identifier,
-            sequence,
-        )
-
-        # Payload de 32 bytes. No usamos el contenido para medir tiempo;
-        # el RTT se calcula exclusivamente con perf_counter_ns().
-        payload = (
-            b"ONTMON"
-            + struct.pack("!H", sequence)
-            + os.urandom(PAYLOAD_SIZE - 8)
-        )
-
-        checksum = internet_checksum(header + payload)
-
-        header = struct.pack(
-            "!BBHHH",
-            ICMP_ECHO_REQUEST,
-            0,
-            checksum,
-            self.identifier,
-            sequence,
-        )
-
-        return header + payload
-
-    def ping(self):
-        """
-        Devuelve RTT en milisegundos con decimales.
-        Devuelve None si vence el timeout.
-        """
-        self.sequence = (self.sequence + 1) & 0xFFFF
-        sequence = self.sequence
-        packet = self._build_packet(sequence)
-
-        # El reloj empieza lo más cerca posible del envío real.
-        start_ns = time.perf_counter_ns()
-        self.sock.sendto(packet, (self.target_ip, 0))
-
-        deadline_ns = start_ns + int(self.timeout * 1_000_000_000)
-
-        while True:
-            remaining_ns = deadline_ns - time.perf_counter_ns()
-            if remaining_ns <= 0:
-                return None
-
-            self.sock.settimeout(remaining_ns / 1_000_000_000)
-
-            try:
-                received_packet, address = self.sock.recvfrom(65535)
-                end_ns = time.perf_counter_ns()
-            except socket.timeout:
-                return None
-
-            if len(received_packet) < 8:
-                continue
-
-            # Los sockets RAW IPv4 normalmente entregan también el header IP.
-            # Detectamos si está presente y encontramos dónde comienza ICMP.
-            if (received_packet[0] >> 4) == 4 and len(received_packet) >= 20:
-                ihl = (received_packet[0] & 0x0F) * 4
-                if len(received_packet) < ihl + 8:
-                    continue
-                icmp = received_packet[ihl:]
-            else:
-                icmp = received_packet
-
-            icmp_type, code, _, packet_id, packet_seq = struct.unpack(
-                "!BBHHH",
-                icmp[:8],
-            )
-
-            # Ignoramos cualquier ICMP que no sea exactamente nuestra respuesta.
-            if (
-                icmp_type == ICMP_ECHO_REPLY
-                and code == 0
-                and packet_id == self.identifier
-                and packet_seq == sequence
-                and address[0] == self.target_ip
-            ):
-                return (end_ns - start_ns) / 1_000_000.0
-
-
-def save_sample(sample: dict):
-    """Agrega una muestra al CSV de la sesión."""
-    with open(CSV_FILE, "a", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-        writer.writerow(
-            [
-                sample["seq"],
-                sample["timestamp"],
-                "" if sample["rtt_ms"] is None else sample["rtt_ms"],
-                "" if sample["jitter_ms"] is None else sample["jitter_ms"],
-                "TIMEOUT" if sample["rtt_ms"] is None else "OK",
-            ]
-        )
+BACKEND = "auto"
 
 
 def measurement_loop():
     """Loop de medición ejecutado en un thread separado de Flask."""
     try:
-        pinger = RawIcmpPinger(TARGET, TIMEOUT)
+        pinger = make_prober(BACKEND)
     except PermissionError:
-        print("\nERROR: no hay permisos para abrir el socket ICMP RAW.")
+        print("\nERROR: no hay permisos para abrir el socket ICMP.")
         print("Windows: abrí PowerShell/CMD como Administrador.")
-        print("Linux/macOS: ejecutá con sudo.\n")
+        print("Linux/macOS: ejecutá con sudo o usá --backend dgram/subprocess.\n")
         stop_event.set()
         return
     except OSError as exc:
-        print(f"\nERROR al crear el socket ICMP RAW: {exc}\n")
+        print(f"\nERROR al crear el socket ICMP: {exc}\n")
         stop_event.set()
         return
 
-    previous_rtt = None
+    sink = CsvSink(CSV_FILE)
     sample_number = 0
     next_run = time.perf_counter()
 
     try:
         while not stop_event.is_set():
             sample_number += 1
-            rtt = pinger.ping()
-
-            if rtt is None:
-                # Tras una pérdida reseteamos la referencia para no calcular
-                # jitter entre dos muestras separadas por un timeout.
-                jitter = None
-                previous_rtt = None
-            else:
-                # Jitter instantáneo: variación absoluta entre RTT consecutivos.
-                jitter = (
-                    abs(rtt - previous_rtt)
-                    if previous_rtt is not None
-                    else None
-                )
-                previous_rtt = rtt
-
-            sample = {
-                "seq": sample_number,
-                "timestamp": datetime.now().isoformat(timespec="milliseconds"),
-                "rtt_ms": None if rtt is None else round(rtt, 6),
-                "jitter_ms": None if jitter is None else round(jitter, 6),
-            }
-
-            # La web sólo conserva una ventana móvil.
-            with samples_lock:
-                samples.append(sample)
-                while len(samples) > MAX_POINTS:
-                    samples.popleft()
+            rtt = pinger.probe(TARGET_IP, TIMEOUT)
+
+            # La web sólo conserva una ventana móvil; las estadísticas se
+            # actualizan junto con ella, bajo el mismo lock.
+            with memory.lock:
+                jitter = stats.add(rtt)
+                sample = {
+                    "seq": sample_number,
+                    "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+                    "rtt_ms": None if rtt is None else round(rtt, 6),
+                    "jitter_ms": None if jitter is None else round(jitter, 6),
+                }
+                memory.samples.append(sample)
 
             # El CSV conserva toda la sesión.
-            save_sample(sample)
+            sink.write(sample)
 
             if rtt is None:
                 print(f"{sample_number:06d}  TIMEOUT")
@@ -253,42 +93,7 @@ def measurement_loop():
 
     finally:
         pinger.close()
-
-
-def current_stats(data):
-    """Estadísticas de la ventana actualmente visible en el dashboard."""
-    sent = len(data)
-    rtts = [item["rtt_ms"] for item in data if item["rtt_ms"] is not None]
-    jitters = [
-        item["jitter_ms"]
-        for item in data
-        if item["jitter_ms"] is not None
-    ]
-
-    if sent == 0:
-        return {
-            "sent": 0,
-            "received": 0,
-            "loss_pct": 0.0,
-            "last_rtt": None,
-            "min_rtt": None,
-            "avg_rtt": None,
-            "max_rtt": None,
-            "avg_jitter": None,
-            "max_jitter": None,
-        }
-
-    return {
-        "sent": sent,
-        "received": len(rtts),
-        "loss_pct": round((sent - len(rtts)) * 100 / sent, 3),
-        "last_rtt": None if not rtts else rtts[-1],
-        "min_rtt": None if not rtts else round(min(rtts), 6),
-        "avg_rtt": None if not rtts else round(mean(rtts), 6),
-        "max_rtt": None if not rtts else round(max(rtts), 6),
-        "avg_jitter": None if not jitters else round(mean(jitters), 6),
-        "max_jitter": None if not jitters else round(max(jitters), 6),
-    }
+        sink.close()
 
 
 HTML = r"""
@@ -519,29 +324,19 @@ def index():
 
 @app.route("/api/data")
 def api_data():
-    with samples_lock:
-        data = list(samples)
+    with memory.lock:
+        data = list(memory.samples)
+        window_stats = stats.snapshot()
 
     return jsonify({
         "samples": data,
-        "stats": current_stats(data),
+        "stats": window_stats,
     })
 
 
-def create_csv():
-    with open(CSV_FILE, "w", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file)
-        writer.writerow([
-            "seq",
-            "timestamp",
-            "rtt_ms",
-            "jitter_ms",
-            "status",
-        ])
-
-
 def main():
     global TARGET, TARGET_IP, INTERVAL, TIMEOUT, MAX_POINTS, WINDOW_MINUTES, CSV_FILE
+    global BACKEND, memory, stats
 
     parser = argparse.ArgumentParser(
         description="Monitor preciso de latencia y jitter ICMP hacia una ONT."
@@ -571,6 +366,12 @@ def main():
         default=30.0,
         help="Duración temporal visible del gráfico en minutos. Default: 30",
     )
+    parser.add_argument(
+        "--backend",
+        choices=["auto", "raw", "dgram", "subprocess"],
+        default="auto",
+        help="Socket ICMP raw/dgram o ping del sistema. Default: auto",
+    )
     parser.add_argument(
         "--port",
         type=int,
@@ -599,14 +400,14 @@ def main():
     # temporal elegida, aunque --points tenga un valor menor.
     required_points = int((WINDOW_MINUTES * 60) / INTERVAL) + 10
     MAX_POINTS = max(args.points, required_points)
+    BACKEND = args.backend
 
     stop_event.clear()
-    with samples_lock:
-        samples.clear()
+    memory = MemorySink(MAX_POINTS)
+    stats = WindowStats(MAX_POINTS)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     CSV_FILE = f"ont_latency_{timestamp}.csv"
-    create_csv()
 
     # Evita que Flask ensucie la consola con un GET /api/data cada 500 ms.
     logging.getLogger("werkzeug").setLevel(logging.ERROR)
@@ -0,0 +1,466 @@
+"""
+Núcleo compartido de medición de latencia.
+
+Lo usan ping.py (MultiPing) y delay_jitter.py (ONT Latency Monitor):
+- Backends de sondeo: IcmpProber (socket RAW o DATAGRAM, uno solo para
+  todos los hosts) y SubprocessPinger (ping del sistema).
+- WindowStats: estadísticas incrementales sobre una ventana móvil.
+- Sinks: CsvSink y MemorySink para guardar las muestras.
+"""
+import asyncio
+import csv
+import itertools
+import os
+import platform
+import socket
+import struct
+import subprocess
+import threading
+import time
+from collections import deque
+
+# ============================================================
+# ICMP
+# ============================================================
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+PAYLOAD_SIZE = 32
+
+IS_WINDOWS = platform.system() == "Windows"
+
+
+def internet_checksum(data: bytes) -> int:
+    """Calcula el checksum de 16 bits usado por ICMP."""
+    if len(data) % 2:
+        data += b"\x00"
+
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return (~total) & 0xFFFF
+
+
+def build_echo_request(identifier: int, sequence: int) -> bytes:
+    """Arma un ICMP Echo Request con payload de PAYLOAD_SIZE bytes."""
+    # El payload no se usa para medir tiempo; el RTT sale de perf_counter_ns().
+    payload = b"ONTMON" + struct.pack("!H", sequence) + os.urandom(PAYLOAD_SIZE - 8)
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, identifier, sequence)
+    checksum = internet_checksum(header + payload)
+    header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, checksum, identifier, sequence)
+    return header + payload
+
+
+def open_icmp_socket(mode: str = "auto"):
+    """
+    Abre un socket ICMP y devuelve (socket, es_raw).
+
+    mode="raw" exige socket RAW (root/Administrador), mode="dgram" usa el
+    socket DATAGRAM sin privilegios de Linux/macOS (net.ipv4.ping_group_range)
+    y mode="auto" prueba RAW y, si no hay permisos, DATAGRAM.
+    """
+    if mode in ("auto", "raw"):
+        try:
+            return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+        except PermissionError:
+            if mode == "raw":
+                raise
+    return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+
+
+class IcmpProber:
+    """
+    Envía ICMP Echo Request a cualquier cantidad de destinos desde un único
+    socket. Un thread receptor toma el timestamp apenas llega cada respuesta
+    y la despacha al sondeo pendiente con la misma secuencia, así cientos de
+    hosts no necesitan un socket (ni un proceso ping) cada uno.
+    """
+
+    def __init__(self, mode: str = "auto"):
+        self.sock, self.is_raw = open_icmp_socket(mode)
+        self.identifier = os.getpid() & 0xFFFF
+        self._sequence = itertools.count(1)
+        self._pending = {}  # seq -> (ip, start_ns, callback)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._receive_loop, daemon=True, name="icmp-rx")
+        self._thread.start()
+
+    @property
+    def backend(self) -> str:
+        return "raw" if self.is_raw else "dgram"
+
+    def close(self):
+        self._closed.set()
+        self._thread.join()
+        self.sock.close()
+
+    def send(self, ip: str, callback) -> int:
+        """
+        Envía un echo a ip (ya resuelta) y registra callback(rtt_ms), que se
+        llama desde el thread receptor cuando llega la respuesta. Devuelve la
+        secuencia usada, para poder cancelarla con forget().
+        """
+        with self._lock:
+            seq = next(self._sequence) & 0xFFFF
+            packet = build_echo_request(self.identifier, seq)
+            # El reloj empieza lo más cerca posible del envío real.
+            self._pending[seq] = (ip, time.perf_counter_ns(), callback)
+        try:
+            self.sock.sendto(packet, (ip, 0))
+        except OSError:
+            self.forget(seq)
+            raise
+        return seq
+
+    def forget(self, seq: int):
+        with self._lock:
+            self._pending.pop(seq, None)
+
+    def probe(self, ip: str, timeout: float):
+        """Versión bloqueante: RTT en ms, o None si vence el timeout."""
+        done = threading.Event()
+        result = []
+
+        def on_reply(rtt):
+            result.append(rtt)
+            done.set()
+
+        try:
+            seq = self.send(ip, on_reply)
+        except OSError:
+            return None
+        if not done.wait(timeout):
+            self.forget(seq)
+            return None
+        return result[0]
+
+    async def aprobe(self, ip: str, timeout: float):
+        """Versión asyncio de probe(); no bloquea el event loop."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def on_reply(rtt):
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(rtt))
+
+        try:
+            seq = self.send(ip, on_reply)
+        except OSError:
+            return None
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.forget(seq)
+            return None
+
+    def _receive_loop(self):
+        self.sock.settimeout(0.1)
+        while not self._closed.is_set():
+            try:
+                packet, address = self.sock.recvfrom(65535)
+                end_ns = time.perf_counter_ns()
+            except socket.timeout:
+                continue
+            except OSError:
+                if self._closed.is_set():
+                    return
+                continue
+
+            # RAW IPv4 entrega también el header IP, y en macOS DATAGRAM también:
+            # se detecta por la versión, sea cual sea el tipo de socket.
+            if (packet[0] >> 4) == 4:
+                icmp = packet[(packet[0] & 0x0F) * 4:]
+            else:
+                icmp = packet
+            if len(icmp) < 8:
+                continue
+
+            icmp_type, code, _, packet_id, packet_seq = struct.unpack("!BBHHH", icmp[:8])
+            # En DATAGRAM el kernel reescribe el identificador, así que sólo
+            # lo validamos en RAW.
+            if icmp_type != ICMP_ECHO_REPLY or code != 0:
+                continue
+            if self.is_raw and packet_id != self.identifier:
+                continue
+
+            with self._lock:
+                pending = self._pending.get(packet_seq)
+                if pending is None or pending[0] != address[0]:
+                    continue
+                del self._pending[packet_seq]
+            ip, start_ns, callback = pending
+            callback((end_ns - start_ns) / 1_000_000.0)
+
+
+# ============================================================
+# ping del sistema
+# ============================================================
+
+def make_ping_cmd(host, timeout=1.0):
+    if IS_WINDOWS:
+        # -n 1 (uno), -w timeout(ms)
+        return ["ping", "-n", "1", "-w", str(int(timeout * 1000)), host]
+    else:
+        # -c 1 (uno), -W timeout(s)
+        return ["ping", "-c", "1", "-W", str(max(1, round(timeout))), host]
+
+
+def parse_latency(output: str) -> float | None:
+    out = output.lower()
+    # Linux example: "64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=14.1 ms"
+    # Windows example: "Approximate round trip times in milli-seconds: Minimum = 14ms, Maximum = 14ms, Average = 14ms"
+    if "time=" in out:
+        try:
+            # take substring after time= and up to ' ms'
+            part = out.split("time=")[1].split()[0]
+            # remove trailing 'ms' if present
+            part = part.replace("ms", "")
+            return float(part)
+        except Exception:
+            return None
+    if "average" in out and "ms" in out:
+        try:
+            avg = out.split("average =")[-1].strip().replace("ms", "").replace("msec", "").strip()
+            return float(avg)
+        except Exception:
+            return None
+    return None
+
+
+class SubprocessPinger:
+    """
+    Backend de respaldo: ejecuta el ping del sistema y parsea su salida.
+    No necesita privilegios pero cuesta un proceso por muestra.
+    """
+
+    backend = "subprocess"
+
+    def close(self):
+        pass
+
+    def probe(self, host: str, timeout: float):
+        try:
+            proc = subprocess.run(
+                make_ping_cmd(host, timeout),
+                capture_output=True,
+                timeout=timeout + 2.0,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        out = proc.stdout.decode(errors="ignore") + proc.stderr.decode(errors="ignore")
+        return parse_latency(out)
+
+    async def aprobe(self, host: str, timeout: float):
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *make_ping_cmd(host, timeout),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout + 2.0)
+        except Exception:
+            return None
+        out = (stdout or b"").decode(errors="ignore") + (stderr or b"").decode(errors="ignore")
+        return parse_latency(out)
+
+
+def make_prober(backend: str = "auto"):
+    """
+    Crea el backend pedido: "raw", "dgram", "subprocess" o "auto" (socket
+    ICMP si se puede abrir, si no el ping del sistema).
+    """
+    if backend == "subprocess":
+        return SubprocessPinger()
+    if backend == "auto":
+        try:
+            return IcmpProber("auto")
+        except OSError:
+            return SubprocessPinger()
+    return IcmpProber(backend)
+
+
+# ============================================================
+# Estadísticas
+# ============================================================
+
+class WindowStats:
+    """
+    Estadísticas de RTT y jitter sobre las últimas `window` muestras.
+
+    Todo se actualiza en O(1) amortizado por muestra: sumas corrientes para
+    los promedios y deques monótonas para mínimos y máximos, de modo que
+    consultar las estadísticas no recorre la ventana.
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.samples = deque()  # (rtt, jitter); None en timeouts
+        self.sent = 0           # totales de la sesión
+        self.recv = 0
+        self._index = 0
+        self._previous_rtt = None
+        self._rtt_sum = 0.0
+        self._rtt_count = 0
+        self._jitter_sum = 0.0
+        self._jitter_count = 0
+        self._rtt_min = deque()     # (índice, valor) crecientes
+        self._rtt_max = deque()     # (índice, valor) decrecientes
+        self._jitter_max = deque()
+
+    @staticmethod
+    def _push_extreme(queue, index, value, keep):
+        while queue and not keep(queue[-1][1], value):
+            queue.pop()
+        queue.append((index, value))
+
+    def add(self, rtt):
+        """Agrega una muestra (None = timeout) y devuelve su jitter."""
+        self.sent += 1
+        if rtt is None:
+            # Tras una pérdida reseteamos la referencia para no calcular
+            # jitter entre dos muestras separadas por un timeout.
+            jitter = None
+            self._previous_rtt = None
+        else:
+            self.recv += 1
+            # Jitter instantáneo: variación absoluta entre RTT consecutivos.
+            jitter = abs(rtt - self._previous_rtt) if self._previous_rtt is not None else None
+            self._previous_rtt = rtt
+
+        index = self._index
+        self._index += 1
+        self.samples.append((rtt, jitter))
+        if rtt is not None:
+            self._rtt_sum += rtt
+            self._rtt_count += 1
+            self._push_extreme(self._rtt_min, index, rtt, lambda old, new: old < new)
+            self._push_extreme(self._rtt_max, index, rtt, lambda old, new: old > new)
+        if jitter is not None:
+            self._jitter_sum += jitter
+            self._jitter_count += 1
+            self._push_extreme(self._jitter_max, index, jitter, lambda old, new: old > new)
+
+        if len(self.samples) > self.window:
+            old_rtt, old_jitter = self.samples.popleft()
+            oldest = self._index - self.window
+            if old_rtt is not None:
+                self._rtt_sum -= old_rtt
+                self._rtt_count -= 1
+            if old_jitter is not None:
+                self._jitter_sum -= old_jitter
+                self._jitter_count -= 1
+            for queue in (self._rtt_min, self._rtt_max, self._jitter_max):
+                while queue and queue[0][0] < oldest:
+                    queue.popleft()
+        return jitter
+
+    def last(self):
+        if not self.samples: return None
+        return self.samples[-1][0]
+
+    def last_rtt(self):
+        """Último RTT recibido en la ventana (ignora timeouts)."""
+        for rtt, _ in reversed(self.samples):
+            if rtt is not None:
+                return rtt
+        return None
+
+    def avg_latency(self):
+        return self._rtt_sum / self._rtt_count if self._rtt_count else None
+
+    def loss_pct(self):
+        """Pérdida acumulada de toda la sesión."""
+        if self.sent == 0: return 0.0
+        return 100.0 * (self.sent - self.recv) / self.sent
+
+    def snapshot(self) -> dict:
+        """Estadísticas de la ventana actual, en el formato del dashboard."""
+        sent = len(self.samples)
+        if sent == 0:
+            return {
+                "sent": 0,
+                "received": 0,
+                "loss_pct": 0.0,
+                "last_rtt": None,
+                "min_rtt": None,
+                "avg_rtt": None,
+                "max_rtt": None,
+                "avg_jitter": None,
+                "max_jitter": None,
+            }
+
+        has_rtt = self._rtt_count > 0
+        has_jitter = self._jitter_count > 0
+        return {
+            "sent": sent,
+            "received": self._rtt_count,
+            "loss_pct": round((sent - self._rtt_count) * 100 / sent, 3),
+            "last_rtt": self.last_rtt(),
+            "min_rtt": round(self._rtt_min[0][1], 6) if has_rtt else None,
+            "avg_rtt": round(self._rtt_sum / self._rtt_count, 6) if has_rtt else None,
+            "max_rtt": round(self._rtt_max[0][1], 6) if has_rtt else None,
+            "avg_jitter": round(self._jitter_sum / self._jitter_count, 6) if has_jitter else None,
+            "max_jitter": round(self._jitter_max[0][1], 6) if has_jitter else None,
+        }
+
+
+# ============================================================
+# Sinks de muestras
+# ============================================================
+
+CSV_FIELDS = ["seq", "timestamp", "rtt_ms", "jitter_ms", "status"]
+
+
+class CsvSink:
+    """
+    Guarda cada muestra como una fila CSV. El archivo queda abierto durante
+    la sesión y se hace flush por fila, en vez de abrirlo en cada muestra.
+    Si with_host es True se agrega la columna host (MultiPing).
+    """
+
+    def __init__(self, path: str, with_host: bool = False):
+        self.path = path
+        self.with_host = with_host
+        self._lock = threading.Lock()
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow((["host"] if with_host else []) + CSV_FIELDS)
+        self._file.flush()
+
+    def write(self, sample: dict):
+        row = [
+            sample["seq"],
+            sample["timestamp"],
+            "" if sample["rtt_ms"] is None else sample["rtt_ms"],
+            "" if sample["jitter_ms"] is None else sample["jitter_ms"],
+            "TIMEOUT" if sample["rtt_ms"] is None else "OK",
+        ]
+        if self.with_host:
+            row.insert(0, sample["host"])
+        with self._lock:
+            self._writer.writerow(row)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class MemorySink:
+    """Conserva las últimas maxlen muestras para servirlas por la web."""
+
+    def __init__(self, maxlen: int):
+        self.samples = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+
+    def write(self, sample: dict):
+        with self.lock:
+            self.samples.append(sample)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def snapshot(self) -> list:
+        with self.lock:
+            return list(self.samples)
@@ -1,76 +1,219 @@
 import base64
-import io
+import os
+import tempfile
+import uuid
 import pandas as pd
 import plotly.express as px
-from dash import Dash, html, dcc, Input, Output, State, callback_context, dash_table
+from dash import Dash, html, dcc, Input, Output, State, ClientsideFunction, Patch, ctx, dash_table, no_update
 import dash_loading_spinners as dls
 import numpy as np
 
+from torque_cache import FrameCache, SessionStore, content_key
+from torque_columnar import columnar_payload, encode_column
+from torque_core import GPS_SPEED_KMH, TorqueCore, map_scales, parse_contents, parse_file, time_series_figure
+from torque_plot import brushed_range, decimate_frame, relayout_range, viewport_bounds
+from torque_parse import ELAPSED_COLUMN, SESSION_COLUMN
+from torque_jobs import JOB_MIN_BYTES, ParseJobs
+from torque_live import LIVE_ROUTE, LiveStore, register_live_routes
+from torque_summary import TRIP_COLUMN, binned_profile, summarize_columns
+from torque_upload import UPLOAD_DIR, UPLOAD_ROUTE, register_upload_route
+
 FA = "https://use.fontawesome.com/releases/v5.8.1/css/all.css"
 
-def remove_duplicate_header(csv_content, header_row=0):
-    lines = csv_content.split("\n")
-    header = lines[header_row]
-    unique_lines = [header] + [line for i, line in enumerate(lines) if line != header and i != header_row]
-    return "\n".join(unique_lines)
-
-def parse_contents(contents):
-    content_type, content_string = contents.split(',')
-    decoded = base64.b64decode(content_string)
-    try:
-        # Intentar leer como CSV sin validar content_type
-        csv_string = decoded.decode('utf-8')
-        csv_string_no_dup_header = remove_duplicate_header(csv_string)
-        df = pd.read_csv(io.StringIO(csv_string_no_dup_header), skipinitialspace=True, na_values=["-"])
-        
-        if "Device Time" in df.columns:
-            try:
-                df["Time"] = pd.to_datetime(df["Device Time"], format='%d-%b-%Y %H:%M:%S.%f')
-            except ValueError:
-                try:
-                    df["Time"] = pd.to_datetime(df["Device Time"])
-                except ValueError as e2:
-                    print(f"Error converting 'Device Time': {e2}")
-                    return None, "Error parsing 'Device Time'. Check the format."
-        elif "GPS Time" in df.columns:
-            try:
-                df["Time"] = pd.to_datetime(df["GPS Time"])
-            except ValueError as e:
-                print(f"Error converting 'GPS Time': {e}")
-                return None, "Error parsing 'GPS Time'. Check the format."
-                
-    except Exception as e:
-        print(e)
-        return None, 'There was an error processing the file.'
-    
-     # Conversión de velocidad a km/h
-    if "GPS Speed (Meters/second)" in df.columns:
-        df["GPS Speed (km/h)"] = df["GPS Speed (Meters/second)"] * 3.6
-    
-    return df, ''
-
-
-app = Dash(__name__, external_stylesheets=[FA], title="Torque Logs Visualizer")
-
-app.layout = html.Div([
+# suppress_callback_exceptions: 'time-series' se crea dentro de un callback.
+app = Dash(__name__, external_stylesheets=[FA], title="Torque Logs Visualizer",
+           suppress_callback_exceptions=True)
+# Para servidores WSGI (gunicorn main:server), necesarios para la ingesta en vivo.
+server = app.server
+
+# Frames ya parseados, por hash del contenido subido. Los callbacks reciben
+# sólo la clave (dcc.Store 'frame-key'), no el archivo.
+frame_cache = FrameCache()
+# Frames de las sesiones de navegador que definieron sus propios canales
+# derivados; las demás ven el de frame_cache.
+session_frames = SessionStore()
+# Parseo, biblioteca en disco (compartida con Torque_log.py), canales
+# derivados (aceleración, consumo, medias móviles y los que se definan en la
+# página) e índices por log: torque_core.py.
+core = TorqueCore()
+# Logs grandes: se parsean en un pool de procesos y la página sigue el avance.
+parse_jobs = ParseJobs(parse_file, core.library.directory)
+
+def load_frame(key, parse, filename=''):
+    """
+    Deja en frame_cache el frame de `key`: si no está en memoria se relee de
+    la biblioteca y, si es un log nuevo, se parsea con parse() y se guarda.
+    Devuelve None o un mensaje de error.
+    """
+    cached = frame_cache.get(key)
+    if cached is not None:
+        # Si se definieron canales después de cargarlo, se agregan ahora.
+        if not core.current(cached):
+            add_derived_channels(key, cached, frame_cache.summary(key))
+        return None
+    df, summary, error_message = core.load(key, parse, filename)
+    if df is None:
+        return error_message
+    frame_cache.put(key, df, summary)
+    return None
+
+def add_derived_channels(key, df, summary):
+    df, summary, errors = core.derive(key, df, summary)
+    frame_cache.put(key, df, summary)
+    return errors
+
+def session_frame(key, session_id):
+    """
+    (clave, frame, resumen) del log `key` como lo ve la sesión: el de
+    frame_cache, o uno con los canales derivados propios de la sesión si los
+    definió. La clave es la que va a los índices de core (session_key).
+    Frame y resumen son None si el log no está en memoria.
+    """
+    df = frame_cache.get(key)
+    summary = frame_cache.summary(key)
+    if df is None or summary is None or not core.channels.customized(session_id):
+        return key, df, summary
+    view = session_frames.get(session_id, key)
+    if view is None or not core.current(view, session_id):
+        # Sobre el frame compartido: los canales que ya calculó otra sesión
+        # salen del cache del motor.
+        view, view_summary, _ = core.derive(key, df, summary, session_id)
+        session_frames.put(session_id, key, view, view_summary)
+    return core.session_key(key, session_id), view, session_frames.summary(session_id, key)
+
+def store_streamed_upload(path, key, session_id, filename):
+    # Upload directo (torque_upload.py): el archivo ya está en disco. Uno
+    # grande y nuevo se encola (torque_jobs.py) y la respuesta vuelve enseguida;
+    # el navegador sigue el trabajo con la clave en el Store 'parse-job'.
+    if key in frame_cache or key in core.library or os.path.getsize(path) < JOB_MIN_BYTES:
+        return load_frame(key, lambda: parse_file(path), filename)
+    parse_jobs.submit(path, key, filename)
+    return None
+
+register_upload_route(app.server, store_streamed_upload)
+
+# Torque Pro en vivo: configurar http://<este servidor>:8050/torque como
+# "Webserver URL" en las opciones de real-time upload.
+live_store = LiveStore()
+register_live_routes(app.server, live_store)
+LIVE_POINTS = 20000  # puntos que conserva el gráfico en vivo
+
+page = html.Div([
     dcc.Upload(
         id='upload-data',
-        children=html.Div(['Drag and Drop or ', html.A('Select a .csv File')]),
+        children=html.Div(['Drag and Drop or ', html.A('Select .csv Files'),
+                           ' (several files are imported in parallel)']),
         style={
             'width': '100%', 'height': '60px', 'lineHeight': '60px',
             'borderWidth': '1px', 'borderStyle': 'dashed', 'borderRadius': '5px',
             'textAlign': 'center', 'margin': '10px 0', 'cursor': 'pointer',
         },
-        multiple=False
+        multiple=True
     ),
+    html.Div([
+        # Para logs grandes: se sube crudo a disco, sin pasar por base64.
+        html.Button('Upload large log (direct to disk)', **{
+            'data-stream-upload': UPLOAD_ROUTE,
+            'data-target': 'parse-job',
+            'data-status': 'stream-upload-status',
+        }),
+        html.Span(id='stream-upload-status', style={'marginLeft': '10px'}),
+    ], style={'margin': '10px 0'}),
+    dcc.Store(id='frame-key'),
+    # Parseo en segundo plano: clave del log y consulta periódica del avance.
+    dcc.Store(id='parse-job'),
+    dcc.Interval(id='job-poll', interval=500, disabled=True),
+    html.Div(id='job-status', style={'color': '#555'}),
+    html.Details([
+        html.Summary('Previously uploaded logs (click a row to open)'),
+        dash_table.DataTable(
+            id='library-table',
+            columns=[{'id': c, 'name': c} for c in ('Name', 'Start', 'Duration', 'Distance (km)', 'Channels')],
+            page_size=10,
+            style_cell={'textAlign': 'left', 'cursor': 'pointer'},
+            style_header={'backgroundColor': 'white', 'fontWeight': 'bold'},
+        ),
+    ], style={'margin': '10px 0'}),
     dcc.Dropdown(
         id='value-dropdown',
         placeholder='Select a value...',
         style={'margin': '10px 0'}
     ),
+    # Canales calculados a partir de otros (torque_derived.py).
+    html.Details([
+        html.Summary('Derived channels'),
+        html.Div([
+            dcc.Input(id='channel-name', placeholder='Name, e.g. Power (kW)', style={'flex': 1}),
+            dcc.Input(id='channel-expression', style={'flex': 3},
+                      placeholder='Expression, e.g. deriv(`Speed (OBD)(km/h)` / 3.6); empty removes the channel'),
+            html.Button('Save channel', id='channel-save'),
+        ], style={'display': 'flex', 'gap': '10px', 'margin': '10px 0'}),
+        html.Div(id='channel-status'),
+        html.Ul(id='channel-list', style={'fontSize': '12px'}),
+        dcc.Store(id='channels-revision', data=0),
+    ], style={'margin': '10px 0'}),
+    dcc.RadioItems(
+        id='map-mode',
+        options=[
+            {'label': 'Map: aggregated grid (points when zoomed in)', 'value': 'grid'},
+            {'label': 'Map: all points', 'value': 'points'},
+        ],
+        value='grid',
+        inline=True,
+        inputStyle={'marginRight': '5px', 'marginLeft': '10px'},
+    ),
+    # 'client': los datos se mandan una vez y el navegador redibuja al cambiar
+    # de métrica (torque_columnar.py, assets/torque_columnar.js).
+    dcc.RadioItems(
+        id='render-mode',
+        options=[
+            {'label': 'Render on server', 'value': 'server'},
+            {'label': 'Render in browser (instant metric switching)', 'value': 'client'},
+        ],
+        value='server',
+        inline=True,
+        inputStyle={'marginRight': '5px', 'marginLeft': '10px'},
+    ),
+    # Copia de la métrica que sólo se actualiza en modo servidor.
+    dcc.Store(id='server-metric'),
+    # Rango de tiempo elegido con zoom en el gráfico temporal: filtra el mapa
+    # y las estadísticas.
+    dcc.Store(id='time-range'),
     dls.Ring(
         html.Div(id='output-data-upload', style={'margin': '20px 0'}),
     ),
+    # Comparación entre viajes de la biblioteca (torque_summary.binned_profile).
+    html.Details([
+        html.Summary('Compare trips'),
+        dcc.Dropdown(id='compare-trips', multi=True, placeholder='Trips to compare...',
+                     style={'margin': '10px 0'}),
+        html.Div([
+            dcc.Dropdown(id='compare-x', placeholder='X channel', style={'flex': 1}),
+            dcc.Dropdown(id='compare-y', placeholder='Y channel', style={'flex': 1}),
+        ], style={'display': 'flex', 'gap': '10px'}),
+        dcc.RadioItems(
+            id='compare-mode',
+            options=[
+                {'label': 'Average of Y per X interval', 'value': 'binned'},
+                {'label': 'Overlay samples', 'value': 'overlay'},
+            ],
+            value='binned',
+            inline=True,
+            inputStyle={'marginRight': '5px', 'marginLeft': '10px'},
+        ),
+        dcc.Graph(id='compare-plot'),
+    ], style={'margin': '20px 0'}),
+    html.Details([
+        html.Summary(f'Live sessions (Torque Pro real-time upload to {LIVE_ROUTE})'),
+        dcc.Interval(id='live-refresh', interval=5000),
+        dcc.Interval(id='live-tick', interval=1000, disabled=True),
+        dcc.Store(id='live-cursor'),
+        html.Div([
+            dcc.Dropdown(id='live-session', placeholder='Live session', style={'flex': 1}),
+            dcc.Dropdown(id='live-channel', placeholder='Channel', style={'flex': 1}),
+        ], style={'display': 'flex', 'gap': '10px', 'margin': '10px 0'}),
+        dcc.Graph(id='live-graph'),
+    ], style={'margin': '20px 0'}),
     html.A(
         className="github-fab",
         href="https://github.com/rdlxs/python_curso/tree/main/Ejemplos",
@@ -86,44 +229,476 @@ app.layout = html.Div([
     ),
 ])
 
+def serve_layout():
+    # Un id por carga de página: los canales derivados que se definen en la
+    # página son de esa sesión de navegador (torque_derived.ChannelEngine).
+    return html.Div([dcc.Store(id='session-id', data=uuid.uuid4().hex), page])
+
+app.layout = serve_layout
+
 @app.callback(
-    [Output('output-data-upload', 'children'),
-     Output('value-dropdown', 'options')],
+    [Output('frame-key', 'data'),
+     Output('parse-job', 'data')],
     [Input('upload-data', 'contents'),
-     Input('value-dropdown', 'value')]
+     Input('library-table', 'active_cell')],
+    State('upload-data', 'filename')
 )
-def update_output(list_of_contents, selected_value):
-    triggered_by = [p['prop_id'] for p in callback_context.triggered][0]
+def load_upload(list_of_contents, library_cell, filename):
+    # Único punto donde se parsea el archivo; el resto trabaja con la clave.
+    if ctx.triggered_id == 'library-table':
+        key = (library_cell or {}).get('row_id')
+        if key not in core.library:
+            return no_update, no_update
+        error_message = load_frame(key, lambda: (None, "The cached log could not be read."))
+        return ({'error': error_message} if error_message else {'key': key}), no_update
 
-    if list_of_contents:
-        df, error_message = parse_contents(list_of_contents)
-        if df is None:
-            return html.Div(error_message, style={'color': 'red'}), []
+    if not list_of_contents:
+        return None, no_update
+    if len(list_of_contents) > 1:
+        return no_update, import_uploads(list_of_contents, filename)
 
-        time_column = "Time" if "Time" in df.columns else None
-        valid_columns = [col for col in df.columns if df[col].dtype in ['float64', 'int64']]
-        dropdown_options = [{'label': col, 'value': col} for col in valid_columns]
+    contents = list_of_contents[0]
+    name = (filename or [''])[0]
+    key = content_key(contents)
+    # El base64 ocupa 4/3 del archivo: uno grande y nuevo se parsea en segundo plano.
+    if key not in frame_cache and key not in core.library and len(contents) * 3 // 4 >= JOB_MIN_BYTES:
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.csv', dir=UPLOAD_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(base64.b64decode(contents.partition(',')[2]))
+        parse_jobs.submit(path, key, name)
+        return no_update, {'key': key, 'name': name}
 
-        if 'upload-data' in triggered_by and valid_columns:
-            if "GPS Speed (km/h)" in valid_columns:
-                selected_value = "GPS Speed (km/h)"
-            else:
-                selected_value = valid_columns[0]
-        if selected_value:
-            if any(df[selected_value] < 0) and any(df[selected_value] > 0):
-                color_scale = px.colors.sequential.RdBu
-                color_continuous_midpoint = 0
+    error_message = load_frame(key, lambda: parse_contents(contents), name)
+    if error_message:
+        return {'error': error_message}, no_update
+    return {'key': key}, no_update
+
+def partial_key(key):
+    return f"{key}-partial"
+
+@app.callback(
+    [Output('job-status', 'children'),
+     Output('job-poll', 'disabled'),
+     Output('frame-key', 'data', allow_duplicate=True)],
+    [Input('parse-job', 'data'),
+     Input('job-poll', 'n_intervals')],
+    State('frame-key', 'data'),
+    prevent_initial_call=True
+)
+def poll_parse_job(job, _n, frame_ref):
+    """
+    Sigue el parseo en segundo plano: muestra etapa y filas, abre la primera
+    sesión apenas el trabajo la deja y el log completo al terminar.
+    """
+    if not job:
+        return '', True, no_update
+    if 'error' in job:
+        return '', True, {'error': job['error']}
+    if 'batch' in job:
+        return poll_import(job, frame_ref)
+    key = job['key']
+    current = (frame_ref or {}).get('key')
+    status = parse_jobs.status(key)
+    if status is None or status['done']:
+        # Sin trabajo (ya estaba cargado) o terminado: el log está en la biblioteca.
+        # La vista previa de la primera sesión ya no hace falta.
+        frame_cache.discard(partial_key(key))
+        core.forget(partial_key(key))
+        error = (status or {}).get('error') or load_frame(key, lambda: (None, "The parsed log could not be read."))
+        if error:
+            return '', True, {'error': error}
+        return '', True, ({'key': key} if current != key else no_update)
+
+    frame = no_update
+    if status['partial'] and current != partial_key(key):
+        preview = parse_jobs.partial(key)
+        if preview is not None:
+            add_derived_channels(partial_key(key), preview, summarize_columns(preview))
+            frame = {'key': partial_key(key), 'partial': True}
+    text = (f"Parsing {job.get('name') or 'log'} in the background: {status['stage']}, "
+            f"{status['rows']:,} rows read ({status['fraction']:.0%})")
+    if status['partial']:
+        text += ". Showing the first session until the whole log is ready."
+    return text, False, frame
+
+def import_uploads(list_of_contents, filenames):
+    """
+    Varios archivos a la vez: se escriben a disco y se encolan en el parseo
+    en segundo plano (ParseJobs), directo a la biblioteca. Devuelve el lote
+    para el Store 'parse-job'; poll_parse_job muestra el avance y abre el
+    primero que se haya podido cargar.
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    batch = []
+    for contents, name in zip(list_of_contents, filenames or [''] * len(list_of_contents)):
+        key = content_key(contents)
+        batch.append({'key': key, 'name': name})
+        if key in frame_cache or key in core.library:
+            continue
+        fd, path = tempfile.mkstemp(suffix='.csv', dir=UPLOAD_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(base64.b64decode(contents.partition(',')[2]))
+        parse_jobs.submit(path, key, name)
+    return {'batch': batch}
+
+def poll_import(job, frame_ref):
+    """Avance de un lote de import_uploads; al terminar todo se abre el primero cargado."""
+    batch = job['batch']
+    # running(): un trabajo que dejó de dar señales de vida no traba el lote.
+    running = [j for j in batch if parse_jobs.running(j['key'])]
+    status = parse_jobs.status(running[0]['key']) if running else None
+    if status is not None:
+        current = running[0]
+        text = (f"Importing {len(batch)} logs in the background: {len(batch) - len(running)} done. "
+                f"{current['name'] or 'log'}: {status['stage']}, {status['rows']:,} rows read "
+                f"({status['fraction']:.0%})")
+        return text, False, no_update
+
+    loaded = [j['key'] for j in batch if j['key'] in frame_cache or j['key'] in core.library]
+    if not loaded:
+        return '', True, {'error': 'None of the files could be processed.'}
+    error = load_frame(loaded[0], lambda: (None, "The imported log could not be read."))
+    if error:
+        return '', True, {'error': error}
+    text = f"Imported {len(loaded)} of {len(batch)} logs." if len(loaded) < len(batch) else ''
+    return text, True, ({'key': loaded[0]} if (frame_ref or {}).get('key') != loaded[0] else no_update)
+
+def format_duration(seconds):
+    if seconds is None:
+        return ''
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes // 60}:{minutes % 60:02d}:{secs:02d}"
+
+@app.callback(
+    [Output('library-table', 'data'),
+     Output('library-table', 'tooltip_data'),
+     Output('compare-trips', 'options')],
+    Input('frame-key', 'data')
+)
+def update_library(_frame_ref):
+    # Se relee al cargar un log, que puede ser uno nuevo en la biblioteca.
+    entries = core.library.entries()
+    data = [{
+        'id': e['key'],
+        'Name': e.get('name') or e['key'][:8],
+        'Start': (e.get('start') or '')[:19].replace('T', ' '),
+        'Duration': format_duration(e.get('duration_s')),
+        'Distance (km)': '' if e.get('distance_km') is None else round(e['distance_km'], 1),
+        'Channels': len(e.get('channels', [])),
+    } for e in entries]
+    tooltips = [{'Channels': {'value': ', '.join(e.get('channels', [])), 'type': 'text'}} for e in entries]
+    trips = [{'label': row['Name'], 'value': row['id']} for row in data]
+    return data, tooltips, trips
+
+@app.callback(
+    [Output('compare-x', 'options'),
+     Output('compare-x', 'value'),
+     Output('compare-y', 'options'),
+     Output('compare-y', 'value')],
+    Input('compare-trips', 'value'),
+    [State('compare-x', 'value'),
+     State('compare-y', 'value')]
+)
+def update_compare_channels(keys, x, y):
+    # Canales presentes en todos los viajes elegidos, según los metadatos.
+    channel_sets = [core.library.info(key).get('channels', []) for key in keys or []]
+    if not channel_sets:
+        return [], None, [], None
+    common = [c for c in channel_sets[0] if c != SESSION_COLUMN and all(c in cs for cs in channel_sets[1:])]
+    options = [{'label': c, 'value': c} for c in common]
+    if x not in common:
+        speeds = [c for c in common if 'Speed' in c]
+        x = next((c for c in speeds if 'km/h' in c), speeds[0] if speeds else None)
+        x = x or (ELAPSED_COLUMN if ELAPSED_COLUMN in common else None)
+    if y not in common:
+        y = next((c for c in common if 'Coolant' in c), next((c for c in common if c != x), None))
+    return options, x, options, y
+
+@app.callback(
+    Output('compare-plot', 'figure'),
+    [Input('compare-trips', 'value'),
+     Input('compare-x', 'value'),
+     Input('compare-y', 'value'),
+     Input('compare-mode', 'value')]
+)
+def compare_trips(keys, x, y, mode):
+    if not keys or not x or not y or x == y:
+        return px.scatter(title='Select trips and two channels to compare')
+    # Sólo se leen (memory-mapped) las dos columnas de cada viaje.
+    frames = {}
+    for key in keys:
+        df, _ = core.library.load(key, columns=[x, y])
+        if df is not None:
+            name = core.library.info(key).get('name') or key[:8]
+            frames[name if name not in frames else f"{name} ({key[:6]})"] = df
+
+    if mode == 'overlay':
+        data = pd.concat([decimate_frame(df, x, y).assign(**{TRIP_COLUMN: name})
+                          for name, df in frames.items()], ignore_index=True)
+        fig = px.scatter(data, x=x, y=y, color=TRIP_COLUMN, render_mode='webgl', opacity=0.6,
+                         title=f'{y} vs {x}')
+    else:
+        profile = binned_profile(frames, x, y)
+        fig = px.line(profile, x=x, y='mean', color=TRIP_COLUMN, markers=True,
+                      hover_data={'min': ':.2f', 'max': ':.2f', 'count': True},
+                      labels={'mean': f'{y} (average)'}, title=f'Average {y} by {x}')
+    fig.update_layout(hovermode='closest', legend_title_text='Trip')
+    return fig
+
+@app.callback(
+    [Output('channel-status', 'children'),
+     Output('channel-list', 'children'),
+     Output('channels-revision', 'data')],
+    Input('channel-save', 'n_clicks'),
+    [State('channel-name', 'value'),
+     State('channel-expression', 'value'),
+     State('frame-key', 'data'),
+     State('session-id', 'data')]
+)
+def save_channel(n_clicks, name, expression, frame_ref, session_id):
+    # Los canales que se definen acá son sólo de esta sesión de navegador.
+    status = ''
+    if n_clicks:
+        try:
+            if (expression or '').strip():
+                core.channels.define(name, expression, session_id)
             else:
-                color_scale = px.colors.sequential.Jet
-                color_continuous_midpoint = None
+                core.channels.remove((name or '').strip(), session_id)
+        except ValueError as e:
+            status = html.Span(str(e), style={'color': 'red'})
+        else:
+            key = (frame_ref or {}).get('key')
+            df = frame_cache.get(key)
+            if df is not None:
+                view, view_summary, errors = core.derive(key, df, frame_cache.summary(key), session_id)
+                session_frames.put(session_id, key, view, view_summary)
+                if (name or '').strip() in errors:
+                    status = html.Span(errors[name.strip()], style={'color': 'red'})
+    channels = [html.Li([html.B(c['name']), f" = {c['expression']}"])
+                for c in core.channels.channels(session_id)]
+    return status, channels, core.channels.revision_of(session_id)
+
+@app.callback(
+    [Output('value-dropdown', 'options'),
+     Output('value-dropdown', 'value')],
+    [Input('frame-key', 'data'),
+     Input('channels-revision', 'data')],
+    [State('value-dropdown', 'value'),
+     State('session-id', 'data')]
+)
+def update_dropdown(frame_ref, _revision, current_value, session_id):
+    # Las métricas son las columnas numéricas del resumen calculado al cargar,
+    # incluidos los canales derivados de la sesión.
+    _, _, summary = session_frame(frame_ref.get('key'), session_id) if frame_ref else (None, None, None)
+    if summary is None:
+        return [], None
+
+    valid_columns = [col for col in summary.index if col not in (SESSION_COLUMN, ELAPSED_COLUMN)]
+    dropdown_options = [{'label': col, 'value': col} for col in valid_columns]
+
+    if ctx.triggered_id == 'channels-revision' and current_value in valid_columns:
+        return dropdown_options, current_value
+    selected_value = None
+    if valid_columns:
+        if GPS_SPEED_KMH in valid_columns:
+            selected_value = GPS_SPEED_KMH
+        else:
+            selected_value = valid_columns[0]
+    return dropdown_options, selected_value
+
+@app.callback(
+    [Output('time-series', 'figure'),
+     Output('time-range', 'data')],
+    Input('time-series', 'relayoutData'),
+    [State('frame-key', 'data'),
+     State('value-dropdown', 'value'),
+     State('session-id', 'data')],
+    prevent_initial_call=True
+)
+def zoom_time_series(relayout_data, frame_ref, selected_value, session_id):
+    # Al hacer zoom se vuelve a decimar sólo el rango visible; con un rango
+    # corto llegan todos los puntos originales.
+    x_range = relayout_range(relayout_data)
+    if x_range is False or not frame_ref or not selected_value:
+        return no_update, no_update
+    _, df, _ = session_frame(frame_ref.get('key'), session_id)
+    if df is None or "Time" not in df.columns or selected_value not in df.columns:
+        return no_update, no_update
+    time_range = {'key': frame_ref['key'], 'range': list(x_range) if x_range else None}
+    fig = time_series_figure(df, selected_value, x_range, title=f'{selected_value} over Time', hovermode='closest')
+    return fig, time_range
+
+def statistics_records(stats):
+    statistics = {
+        'Statistic': ['Average', 'Maximum', 'Minimum', 'Start', 'End',
+                      '25th Percentile', 'Median', '75th Percentile', '90th Percentile'],
+        'Value': stats[['mean', 'max', 'min', 'first', 'last',
+                        'p25', 'p50', 'p75', 'p90']].tolist()
+    }
+    return pd.DataFrame(statistics).to_dict('records')
+
+@app.callback(
+    Output('stats-table', 'data'),
+    Input('time-range', 'data'),
+    [State('frame-key', 'data'),
+     State('value-dropdown', 'value'),
+     State('session-id', 'data')],
+    prevent_initial_call=True
+)
+def brush_statistics(time_range, frame_ref, selected_value, session_id):
+    # Estadísticas del tramo visible: sumas acumuladas y búsqueda binaria
+    # sobre el índice por tiempo, sin recorrer el frame.
+    key = (frame_ref or {}).get('key')
+    view_key, df, summary = session_frame(key, session_id)
+    if df is None or summary is None or selected_value not in summary.index:
+        return no_update
+    x_range = brushed_range(time_range, key)
+    return statistics_records(core.range_summary(view_key, df, summary, selected_value, x_range))
+
+@app.callback(
+    Output('map-plot', 'figure'),
+    [Input('map-plot', 'relayoutData'),
+     Input('time-range', 'data')],
+    [State('frame-key', 'data'),
+     State('value-dropdown', 'value'),
+     State('map-mode', 'value'),
+     State('session-id', 'data')],
+    prevent_initial_call=True
+)
+def pan_map(relayout_data, time_range, frame_ref, selected_value, map_mode, session_id):
+    # Al mover o hacer zoom se reagrupa sólo lo que queda en el viewport; al
+    # elegir un rango en el gráfico temporal, sólo los puntos de ese rango.
+    bounds = viewport_bounds(relayout_data) if map_mode != 'points' else None
+    if ctx.triggered_id == 'map-plot' and bounds is None:
+        return no_update
+    if not frame_ref or not selected_value:
+        return no_update
+    view_key, df, summary = session_frame(frame_ref.get('key'), session_id)
+    if df is None or summary is None or selected_value not in summary.index:
+        return no_update
+    color_scale, midpoint = map_scales(summary.loc[selected_value])
+    return core.map_figure(view_key, df, selected_value, map_mode, bounds,
+                           brushed_range(time_range, frame_ref['key']), color_scale=color_scale,
+                           midpoint=midpoint, mapbox_style="open-street-map")
+
+def client_layout(df, summary, selected_value):
+    """
+    Contenedores del modo cliente con el payload columnar de la métrica
+    elegida; el callback clientside torque.render los llena, y las demás
+    métricas llegan a 'client-columns' cuando se eligen (fetch_client_column).
+    """
+    payload = columnar_payload(df, summary, [selected_value] if selected_value else [])
+    payload['scales'] = {'diverging': px.colors.sequential.RdBu, 'sequential': px.colors.sequential.Jet}
+    has_gps = 'Latitude' in summary.index and 'Longitude' in summary.index
+    return html.Div([
+        dcc.Store(id='columns-data', data=payload),
+        dcc.Store(id='client-columns', data={}),
+        dcc.Store(id='client-request'),
+        html.Div("⚠️ El archivo no contiene columnas 'Latitude' y 'Longitude'. No se puede mostrar el mapa.",
+                 style={'color': 'orange', 'marginBottom': '10px', 'display': 'none' if has_gps else 'block'}),
+        dcc.Graph(id='client-map', style={} if has_gps else {'display': 'none'}),
+        dcc.Graph(id='client-time'),
+        dash_table.DataTable(
+            id='client-stats',
+            columns=[{'id': c, 'name': c} for c in ('Statistic', 'Value')],
+            style_cell={'textAlign': 'left'},
+            style_header={'backgroundColor': 'white', 'fontWeight': 'bold'},
+            style_data_conditional=[
+                {'if': {'row_index': 'odd'}, 'backgroundColor': 'rgb(248, 248, 248)'}
+            ]
+        )
+    ])
+
+app.clientside_callback(
+    ClientsideFunction(namespace='torque', function_name='serverMetric'),
+    Output('server-metric', 'data'),
+    [Input('value-dropdown', 'value'),
+     Input('render-mode', 'value')]
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace='torque', function_name='missingColumn'),
+    Output('client-request', 'data'),
+    [Input('value-dropdown', 'value'),
+     Input('columns-data', 'data')],
+    State('client-columns', 'data')
+)
+
+@app.callback(
+    Output('client-columns', 'data'),
+    Input('client-request', 'data'),
+    [State('frame-key', 'data'),
+     State('session-id', 'data')],
+    prevent_initial_call=True
+)
+def fetch_client_column(metric, frame_ref, session_id):
+    # Una métrica que el navegador todavía no tiene: sólo esa columna, y
+    # con Patch, sin reenviar las que ya llegaron.
+    _, df, summary = session_frame((frame_ref or {}).get('key'), session_id)
+    if df is None or summary is None or metric not in summary.index:
+        return no_update
+    columns = Patch()
+    columns[metric] = encode_column(df[metric], summary.at[metric, 'min'])
+    return columns
+
+app.clientside_callback(
+    ClientsideFunction(namespace='torque', function_name='render'),
+    [Output('client-map', 'figure'),
+     Output('client-time', 'figure'),
+     Output('client-stats', 'data')],
+    [Input('value-dropdown', 'value'),
+     Input('map-mode', 'value'),
+     Input('client-map', 'relayoutData'),
+     Input('columns-data', 'data'),
+     Input('client-columns', 'data')]
+)
+
+@app.callback(
+    [Output('output-data-upload', 'children'),
+     Output('time-range', 'data', allow_duplicate=True)],
+    [Input('frame-key', 'data'),
+     Input('server-metric', 'data'),
+     Input('map-mode', 'value'),
+     Input('render-mode', 'value')],
+    [State('value-dropdown', 'value'),
+     State('time-range', 'data'),
+     State('session-id', 'data')],
+    prevent_initial_call='initial_duplicate'
+)
+def update_output(frame_ref, _server_metric, map_mode, render_mode, selected_value, time_range, session_id):
+    children = render_output(frame_ref, map_mode, render_mode, selected_value, session_id)
+    # Un render completo vuelve a mostrar el log entero: el rango elegido ya no vale.
+    reset = None if time_range and children is not no_update else no_update
+    return children, reset
+
+def render_output(frame_ref, map_mode, render_mode, selected_value, session_id=None):
+    if frame_ref:
+        if 'error' in frame_ref:
+            return html.Div(frame_ref['error'], style={'color': 'red'})
+
+        if render_mode == 'client' and ctx.triggered_id == 'map-mode':
+            # En modo cliente el cambio de mapa lo resuelve el navegador.
+            return no_update
+
+        view_key, df, summary = session_frame(frame_ref['key'], session_id)
+        if df is None or summary is None:
+            return html.Div("El archivo ya no está en memoria. Volvé a subirlo.", style={'color': 'red'})
+
+        if render_mode == 'client':
+            return client_layout(df, summary, selected_value)
+
+        time_column = "Time" if "Time" in df.columns else None
+
+        if selected_value in summary.index:
+            stats = summary.loc[selected_value]
+            color_scale, midpoint = map_scales(stats)
 
             # Validar columnas GPS
             if 'Latitude' in df.columns and 'Longitude' in df.columns:
-                fig_map = px.scatter_map(df, lat='Latitude', lon='Longitude', color=selected_value,
-                                            zoom=10, height=500, color_continuous_scale=color_scale,
-                                            color_continuous_midpoint=color_continuous_midpoint,
-                                            hover_data=df.columns)
-                fig_map.update_layout(mapbox_style="open-street-map", margin={"r": 0, "t": 0, "l": 0, "b": 0})
+                fig_map = core.map_figure(view_key, df, selected_value, map_mode,
+                                          color_scale=color_scale, midpoint=midpoint,
+                                          mapbox_style="open-street-map")
                 map_fig = dcc.Graph(id='map-plot', figure=fig_map)
             else:
                 map_fig = html.Div("⚠️ El archivo no contiene columnas 'Latitude' y 'Longitude'. No se puede mostrar el mapa.",
@@ -131,42 +706,84 @@ def update_output(list_of_contents, selected_value):
 
             # Gráfico de serie temporal
             if time_column:
-                fig_time_series = px.line(df, x=time_column, y=selected_value, title=f'{selected_value} over Time')
-                fig_time_series.update_traces(mode='lines')
-                fig_time_series.update_layout(hovermode='closest')
+                fig_time_series = time_series_figure(df, selected_value, title=f'{selected_value} over Time',
+                                                     time_column=time_column, hovermode='closest')
             else:
                 fig_time_series = None
 
-            statistics = {
-                'Statistic': ['Average', 'Maximum', 'Minimum', 'Start', 'End',
-                              '25th Percentile', 'Median', '75th Percentile', '90th Percentile'],
-                'Value': [
-                    df[selected_value].mean(), df[selected_value].max(), df[selected_value].min(),
-                    df[selected_value].iloc[0], df[selected_value].iloc[-1],
-                    np.percentile(df[selected_value].dropna(), 25),
-                    np.percentile(df[selected_value].dropna(), 50),
-                    np.percentile(df[selected_value].dropna(), 75),
-                    np.percentile(df[selected_value].dropna(), 90)
-                ]
-            }
-
-            stats_df = pd.DataFrame(statistics)
-
             return html.Div([
                 map_fig,
                 dcc.Graph(id='time-series', figure=fig_time_series),
                 dash_table.DataTable(
-                    data=stats_df.to_dict('records'),
-                    columns=[{'id': c, 'name': c} for c in stats_df.columns],
+                    id='stats-table',
+                    data=statistics_records(stats),
+                    columns=[{'id': c, 'name': c} for c in ('Statistic', 'Value')],
                     style_cell={'textAlign': 'left'},
                     style_header={'backgroundColor': 'white', 'fontWeight': 'bold'},
                     style_data_conditional=[
                         {'if': {'row_index': 'odd'}, 'backgroundColor': 'rgb(248, 248, 248)'}
                     ]
                 )
-            ]), dropdown_options
+            ])
+
+    return "No file uploaded."
+
+@app.callback(
+    Output('live-session', 'options'),
+    Input('live-refresh', 'n_intervals')
+)
+def update_live_sessions(_n):
+    return [{'label': f"{s['id']} ({s['rows']} rows, idle {s['idle_s']:.0f} s)", 'value': s['id']}
+            for s in live_store.sessions()]
+
+@app.callback(
+    [Output('live-channel', 'options'),
+     Output('live-channel', 'value'),
+     Output('live-tick', 'disabled')],
+    Input('live-session', 'value'),
+    State('live-channel', 'value')
+)
+def update_live_channels(session_id, channel):
+    live = live_store.session(session_id) if session_id else None
+    if live is None:
+        return [], None, True
+    _, _, columns = live.read(len(live))  # sólo para conocer los PIDs
+    options = [{'label': live.column_name(pid), 'value': pid} for pid in columns]
+    if channel not in columns:
+        channel = next((pid for pid in columns if pid not in ('kff1006', 'kff1005')), None)
+    return options, channel, False
+
+@app.callback(
+    [Output('live-graph', 'figure'),
+     Output('live-cursor', 'data')],
+    [Input('live-tick', 'n_intervals'),
+     Input('live-session', 'value'),
+     Input('live-channel', 'value')],
+    State('live-cursor', 'data')
+)
+def tail_live(_n, session_id, channel, cursor):
+    live = live_store.session(session_id) if session_id else None
+    if live is None or not channel:
+        return px.line(title='Select a live session'), None
+    same = cursor and cursor['session'] == session_id and cursor['channel'] == channel
+    if ctx.triggered_id == 'live-tick' and same and cursor['points'] < LIVE_POINTS:
+        # Sólo las filas nuevas: se agregan a la traza existente con un Patch.
+        next_row, times, columns = live.read(cursor['next'], [channel])
+        if next_row == cursor['next']:
+            return no_update, no_update
+        patch = Patch()
+        patch['data'][0]['x'].extend(pd.to_datetime(times, unit='ms').strftime('%Y-%m-%d %H:%M:%S.%f').tolist())
+        patch['data'][0]['y'].extend(columns.get(channel, np.full(len(times), np.nan)).tolist())
+        return patch, dict(cursor, next=next_row, points=cursor['points'] + len(times))
 
-    return "No file uploaded.", []
+    # Figura completa: al cambiar de sesión/canal o al llegar al tope de puntos.
+    next_row, times, columns = live.read(max(len(live) - LIVE_POINTS // 2, 0), [channel])
+    values = columns.get(channel, np.full(len(times), np.nan))
+    name = live.column_name(channel)
+    fig = px.line(x=pd.to_datetime(times, unit='ms'), y=values, labels={'x': 'Time', 'y': name},
+                  title=f'{name} (live)')
+    fig.update_layout(uirevision=f'{session_id}/{channel}')
+    return fig, {'session': session_id, 'channel': channel, 'next': next_row, 'points': len(times)}
 
 if __name__ == '__main__':
     app.run_server(debug=False)
\ No newline at end of file
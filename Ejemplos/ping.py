@@ -1,124 +1,654 @@
 #!/usr/bin/env python3
 """
-MultiPing minimal: pingeos concurrentes con asyncio + subprocess.
+MultiPing minimal: pingeos concurrentes con asyncio.
 Imprime tabla en consola con latencia promedio, recuento y pérdida.
-Uso: python3 multi_ping.py hosts.txt
-hosts.txt = una IP/host por línea (comentarios con #)
+El sondeo, las estadísticas y el CSV vienen de latency_core.py, compartido
+con delay_jitter.py: por defecto se usa un único socket ICMP para todos los
+hosts y, si no hay permisos, el ping del sistema (--backend).
+Uso: python3 multi_ping.py hosts.txt [--backend auto|raw|dgram|subprocess] [--csv salida.csv]
+     python3 multi_ping.py hosts.txt --web 5001   (dashboard con sparklines por host)
+     python3 multi_ping.py hosts.txt --sweep [--rate 2000] [--timeout 1.0]
+hosts.txt = una entrada por línea (comentarios con #). Cada entrada puede ser:
+  172.29.14.101                  IP suelta
+  172.29.12.0/22                 bloque CIDR (se expanden las IPs de host)
+  172.29.14.101-116              rango sobre el último octeto
+  172.29.14.101-172.29.15.20     rango entre dos IPs
+  ont-01.lab.local               nombre DNS (se resuelve y se cachea)
+El archivo se recarga solo al modificarse, sin perder las estadísticas de los
+hosts que siguen presentes.
+Con --sweep se hace un único barrido: un echo por dirección desde un solo
+socket ICMP, a la tasa indicada, y se imprime qué hosts responden.
 """
+import argparse
 import asyncio
+import ipaddress
+import logging
+import os
 import sys
-import platform
+import socket
+import threading
 import time
-from collections import deque, defaultdict
+from collections import deque
+from datetime import datetime
+
+from latency_core import CsvSink, IcmpProber, WindowStats, make_prober
 
 DEFAULT_INTERVAL = 2.0  # segundos entre pings por host
 SAMPLE_WINDOW = 10      # cantidad de muestras para calcular promedio
+RELOAD_INTERVAL = 2.0   # cada cuánto se revisa si cambió hosts.txt
+DNS_TTL = 300.0         # segundos que se reutiliza una resolución DNS
+MAX_EXPANSION = 65536   # tope de IPs por entrada, evita expandir un /8 por error
+DEFAULT_TIMEOUT = 1.0   # timeout por ping; en --sweep, espera tras el último envío
+SPARK_POINTS = 60       # muestras por host que dibuja la sparkline web
+SWEEP_RATE = 2000       # paquetes por segundo en modo --sweep
 
-IS_WINDOWS = platform.system() == "Windows"
+def expand_host_entry(entry: str) -> list[str]:
+    """
+    Expande una línea de hosts.txt a la lista de hosts que representa.
+    Los nombres DNS se devuelven tal cual; se resuelven al pinguear.
+    """
+    entry = entry.strip()
+    if not entry:
+        return []
 
-def make_ping_cmd(host):
-    if IS_WINDOWS:
-        # -n 1 (uno), -w timeout(ms)
-        return ["ping", "-n", "1", "-w", "1000", host]
-    else:
-        # -c 1 (uno), -W timeout(s)
-        return ["ping", "-c", "1", "-W", "1", host]
-
-def parse_latency(output: str) -> float | None:
-    out = output.lower()
-    # Linux example: "64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=14.1 ms"
-    # Windows example: "Approximate round trip times in milli-seconds: Minimum = 14ms, Maximum = 14ms, Average = 14ms"
-    if "time=" in out:
-        try:
-            # take substring after time= and up to ' ms'
-            part = out.split("time=")[1].split()[0]
-            # remove trailing 'ms' if present
-            part = part.replace("ms", "")
-            return float(part)
-        except Exception:
-            return None
-    if "average" in out and "ms" in out:
+    if "/" in entry:
+        network = ipaddress.ip_network(entry, strict=False)
+        if network.num_addresses > MAX_EXPANSION:
+            raise ValueError(f"{entry}: demasiadas direcciones ({network.num_addresses})")
+        # /31 y /32 no tienen red/broadcast, hosts() ya lo contempla.
+        return [str(ip) for ip in network.hosts()] or [str(network.network_address)]
+
+    if "-" in entry:
+        start_text, end_text = (part.strip() for part in entry.split("-", 1))
         try:
-            avg = out.split("average =")[-1].strip().replace("ms","").replace("msec","").strip()
-            return float(avg)
-        except Exception:
-            return None
-    return None
+            start = ipaddress.ip_address(start_text)
+        except ValueError:
+            # Un nombre DNS puede contener guiones (ont-01.lab): no es un rango.
+            return [entry]
+        if end_text.isdigit():
+            # Forma corta: 172.29.14.101-116 reemplaza el último octeto.
+            prefix = start_text.rsplit(".", 1)[0]
+            end = ipaddress.ip_address(f"{prefix}.{end_text}")
+        else:
+            end = ipaddress.ip_address(end_text)
+        if end < start:
+            raise ValueError(f"{entry}: el rango termina antes de empezar")
+        count = int(end) - int(start) + 1
+        if count > MAX_EXPANSION:
+            raise ValueError(f"{entry}: demasiadas direcciones ({count})")
+        return [str(start + i) for i in range(count)]
+
+    return [entry]
+
+def load_hosts(path: str) -> list[str]:
+    """Lee hosts.txt, expande cada entrada y elimina duplicados conservando el orden."""
+    hosts = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            entry = line.split("#", 1)[0].strip()
+            if not entry:
+                continue
+            try:
+                for host in expand_host_entry(entry):
+                    hosts[host] = None
+            except ValueError as e:
+                print(f"{path}:{lineno}: entrada ignorada: {e}")
+    return list(hosts)
 
-class HostStats:
+# Cache de resoluciones DNS: nombre -> (ip, vencimiento)
+_dns_cache: dict[str, tuple[str, float]] = {}
+
+async def resolve_host(host: str) -> str:
+    """
+    Devuelve la IP de host. Las IPs literales no se tocan; los nombres se
+    resuelven una vez y se reutilizan durante DNS_TTL segundos, así ping no
+    consulta al DNS en cada muestra.
+    """
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+
+    now = time.monotonic()
+    cached = _dns_cache.get(host)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    loop = asyncio.get_running_loop()
+    try:
+        infos = await loop.getaddrinfo(host, None, family=socket.AF_INET)
+        ip = infos[0][4][0]
+    except (OSError, IndexError):
+        # Si el DNS falla seguimos con la última IP conocida, si la hay.
+        if cached:
+            return cached[0]
+        raise
+    _dns_cache[host] = (ip, now + DNS_TTL)
+    return ip
+
+# La web lee las estadísticas desde el thread de Flask mientras el event loop
+# las actualiza; este lock protege stats_map y cada HostStats.
+stats_lock = threading.Lock()
+# Cada muestra recibe un número global creciente ("generación"): la web pide
+# sólo las muestras posteriores a la última que ya tiene.
+last_generation = 0
+# Cambia cuando la recarga de hosts.txt altera la lista de hosts.
+hosts_version = 0
+
+class HostStats(WindowStats):
     def __init__(self):
-        self.samples = deque(maxlen=SAMPLE_WINDOW)
-        self.sent = 0
-        self.recv = 0
+        super().__init__(SAMPLE_WINDOW)
+        self.history = deque(maxlen=SPARK_POINTS)  # (generación, rtt)
+
     def add(self, latency):
-        self.sent += 1
-        if latency is None:
-            # timeout / lost
-            self.samples.append(None)
-        else:
-            self.recv += 1
-            self.samples.append(latency)
-    def loss_pct(self):
-        if self.sent == 0: return 0.0
-        return 100.0 * (self.sent - self.recv) / self.sent
-    def avg_latency(self):
-        vals = [v for v in self.samples if v is not None]
-        return sum(vals)/len(vals) if vals else None
-    def last(self):
-        if not self.samples: return None
-        return self.samples[-1]
-
-async def ping_host_loop(host, stats: HostStats, interval=DEFAULT_INTERVAL):
-    cmd = make_ping_cmd(host)
+        global last_generation
+        with stats_lock:
+            jitter = super().add(latency)
+            last_generation += 1
+            self.history.append((last_generation, latency))
+        return jitter
+
+async def ping_host_loop(host, stats: HostStats, prober, interval=DEFAULT_INTERVAL,
+                         timeout=DEFAULT_TIMEOUT, sink=None):
     while True:
         start = time.time()
         try:
-            proc = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=3.0)
-            out = (stdout or b"").decode(errors="ignore") + (stderr or b"").decode(errors="ignore")
-            latency = parse_latency(out)
+            latency = await prober.aprobe(await resolve_host(host), timeout)
         except Exception:
             latency = None
-        stats.add(latency)
+        jitter = stats.add(latency)
+        if sink:
+            sink.write({
+                "host": host,
+                "seq": stats.sent,
+                "timestamp": datetime.now().isoformat(timespec="milliseconds"),
+                "rtt_ms": None if latency is None else round(latency, 6),
+                "jitter_ms": None if jitter is None else round(jitter, 6),
+            })
         # sleep remainder
         elapsed = time.time() - start
         await asyncio.sleep(max(0, interval - elapsed))
 
+def sweep(hosts, rate=SWEEP_RATE, timeout=DEFAULT_TIMEOUT, backend="auto"):
+    """
+    Barrido único: envía un echo a cada host desde un solo socket, espaciando
+    los envíos para no superar `rate` paquetes/s, mientras el thread receptor
+    del prober recoge las respuestas a medida que llegan. Termina `timeout`
+    segundos después del último envío. Devuelve {host: rtt_ms o None}.
+    """
+    # Resolvemos antes de empezar para no frenar el ritmo de envío con el DNS.
+    targets = {}
+    for h in hosts:
+        try:
+            targets.setdefault(socket.gethostbyname(h), []).append(h)
+        except OSError:
+            pass
+
+    prober = IcmpProber(backend)
+    rtts = {}  # ip -> rtt en ms
+
+    gap_ns = int(1_000_000_000 / rate)
+    next_ns = time.perf_counter_ns()
+    try:
+        for ip in targets:
+            now_ns = time.perf_counter_ns()
+            if now_ns < next_ns:
+                time.sleep((next_ns - now_ns) / 1_000_000_000)
+            try:
+                prober.send(ip, lambda rtt, ip=ip: rtts.setdefault(ip, rtt))
+            except OSError:
+                # Red inalcanzable, broadcast rechazado, etc.: queda como caído.
+                pass
+            next_ns += gap_ns
+        time.sleep(timeout)
+    finally:
+        prober.close()
+
+    results = {}
+    for ip, names in targets.items():
+        for h in names:
+            results[h] = rtts.get(ip)
+    for h in hosts:
+        results.setdefault(h, None)
+    return results
+
+def print_sweep(hosts, results, elapsed):
+    alive = [h for h in hosts if results[h] is not None]
+    print(f"{'Host':30} {'Estado':7} {'RTT':10}")
+    print("-"*50)
+    for h in hosts:
+        rtt = results[h]
+        print(f"{h:30} {'UP' if rtt is not None else 'DOWN':7} {format_val(rtt):10}")
+    print("-"*50)
+    print(f"{len(alive)}/{len(hosts)} hosts responden - barrido en {elapsed:.2f} s")
+
 def format_val(lat):
     if lat is None: return "----"
     return f"{lat:.1f} ms"
 
-async def main(hosts, interval=DEFAULT_INTERVAL):
+DASHBOARD_HTML = r"""
+<!doctype html>
+<html lang="es">
+<head>
+    <meta charset="utf-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1">
+    <title>MultiPing</title>
+    <style>
+        body {
+            margin: 0;
+            font-family: Arial, sans-serif;
+            background: #101418;
+            color: #e8edf2;
+        }
+        .container {
+            max-width: 1500px;
+            margin: auto;
+            padding: 20px;
+        }
+        h1 { margin-bottom: 5px; }
+        .subtitle { color: #9da8b3; margin-bottom: 20px; }
+        .cards {
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(150px, 1fr));
+            gap: 12px;
+            margin-bottom: 20px;
+        }
+        .card { background: #1a2128; border-radius: 10px; padding: 15px; }
+        .label { font-size: 13px; color: #98a3ad; }
+        .value { font-size: 25px; margin-top: 6px; font-weight: bold; }
+        .toolbar { margin-bottom: 10px; }
+        .toolbar input, .toolbar select {
+            background: #1a2128; color: #e8edf2; border: 1px solid #2c3640;
+            padding: 6px; border-radius: 5px;
+        }
+        .table { background: #1a2128; border-radius: 10px; }
+        .row {
+            display: grid;
+            grid-template-columns: 240px 130px 90px 90px 70px 70px 70px;
+            align-items: center;
+            height: 28px;
+            padding: 0 12px;
+            font-size: 13px;
+            border-bottom: 1px solid #222b33;
+        }
+        .head { font-weight: bold; color: #98a3ad; }
+        #viewport { height: 70vh; overflow-y: auto; position: relative; }
+        #rows { position: absolute; left: 0; right: 0; }
+        .ok { color: #8ee6a0; }
+        .bad { color: #ff8585; }
+    </style>
+</head>
+<body>
+<div class="container">
+    <h1>MultiPing</h1>
+    <div class="subtitle">backend: {{ backend }} | intervalo: {{ interval }} s | sparkline: {{ spark_points }} muestras</div>
+
+    <div class="cards">
+        <div class="card"><div class="label">Hosts</div><div class="value" id="total">-</div></div>
+        <div class="card"><div class="label">Responden</div><div class="value ok" id="up">-</div></div>
+        <div class="card"><div class="label">Sin respuesta</div><div class="value bad" id="down">-</div></div>
+        <div class="card"><div class="label">RTT promedio</div><div class="value" id="avgAll">-</div></div>
+    </div>
+
+    <div class="toolbar">
+        <input id="filter" placeholder="Filtrar host...">
+        <select id="order">
+            <option value="file">Orden del archivo</option>
+            <option value="loss">Mayor pérdida</option>
+            <option value="avg">Mayor latencia</option>
+        </select>
+    </div>
+
+    <div class="table">
+        <div class="row head"><div>Host</div><div>RTT</div><div>Last</div><div>Avg</div><div>Sent</div><div>Recv</div><div>Loss%</div></div>
+        <div id="viewport"><div id="spacer"></div><div id="rows"></div></div>
+    </div>
+</div>
+
+<script>
+const ROW_HEIGHT = 28;
+const SPARK_POINTS = {{ spark_points }};
+
+// Estado en el cliente: el servidor manda las columnas de todos los hosts en
+// una sola respuesta y, para las sparklines, sólo las muestras nuevas.
+let version = -1;
+let generation = 0;
+let hosts = [];
+let cols = {};
+let sparks = [];
+let order = [];
+
+function fmt(value) {
+    if (value === null || value === undefined) return "----";
+    return value.toFixed(1) + " ms";
+}
+
+function computeOrder() {
+    const text = document.getElementById("filter").value.trim();
+    const mode = document.getElementById("order").value;
+    order = [];
+    for (let i = 0; i < hosts.length; i++) {
+        if (!text || hosts[i].includes(text)) order.push(i);
+    }
+    if (mode === "loss") order.sort((a, b) => cols.loss[b] - cols.loss[a]);
+    if (mode === "avg") order.sort(byAvg);
+    document.getElementById("spacer").style.height = (order.length * ROW_HEIGHT) + "px";
+}
+
+// Peor primero: hosts sin respuesta (avg null) arriba, después el avg más alto.
+function byAvg(a, b) {
+    const x = cols.avg[a] ?? null, y = cols.avg[b] ?? null;
+    if (x === null || y === null) return (x === null ? 0 : 1) - (y === null ? 0 : 1);
+    return y - x;
+}
+
+function drawSpark(canvas, data) {
+    const ctx = canvas.getContext("2d");
+    const w = canvas.width, h = canvas.height;
+    ctx.clearRect(0, 0, w, h);
+    let max = 0;
+    for (const v of data) if (v !== null && v > max) max = v;
+    if (max === 0) max = 1;
+    const step = w / (SPARK_POINTS - 1);
+    const offset = SPARK_POINTS - data.length;
+    ctx.strokeStyle = "#6cb6ff";
+    ctx.beginPath();
+    let pen = false;
+    data.forEach((v, i) => {
+        const x = (offset + i) * step;
+        if (v === null) {
+            // Timeout: marca roja y corte de la línea.
+            ctx.fillStyle = "#ff8585";
+            ctx.fillRect(x - 1, 0, 2, h);
+            pen = false;
+            return;
+        }
+        const y = h - 1 - (v / max) * (h - 2);
+        if (pen) ctx.lineTo(x, y); else ctx.moveTo(x, y);
+        pen = true;
+    });
+    ctx.stroke();
+}
+
+// Sólo se dibujan las filas visibles; con miles de hosts el DOM no crece.
+function render() {
+    const viewport = document.getElementById("viewport");
+    const first = Math.floor(viewport.scrollTop / ROW_HEIGHT);
+    const count = Math.ceil(viewport.clientHeight / ROW_HEIGHT) + 1;
+    const container = document.getElementById("rows");
+    container.style.top = (first * ROW_HEIGHT) + "px";
+
+    while (container.children.length < count) {
+        const row = document.createElement("div");
+        row.className = "row";
+        row.innerHTML = "<div></div><div><canvas width='120' height='20'></canvas></div>" +
+                        "<div></div><div></div><div></div><div></div><div></div>";
+        container.appendChild(row);
+    }
+
+    for (let r = 0; r < container.children.length; r++) {
+        const row = container.children[r];
+        const i = order[first + r];
+        if (i === undefined) { row.style.display = "none"; continue; }
+        row.style.display = "";
+        const cells = row.children;
+        cells[0].textContent = hosts[i];
+        drawSpark(cells[1].firstChild, sparks[i]);
+        cells[2].textContent = fmt(cols.last[i]);
+        cells[3].textContent = fmt(cols.avg[i]);
+        cells[4].textContent = cols.sent[i];
+        cells[5].textContent = cols.recv[i];
+        cells[6].textContent = cols.loss[i].toFixed(1);
+        cells[6].className = cols.loss[i] === 0 ? "ok" : "bad";
+    }
+}
+
+function renderCards() {
+    let up = 0, sum = 0, n = 0;
+    for (let i = 0; i < hosts.length; i++) {
+        if (cols.last[i] !== null) up++;
+        if (cols.avg[i] !== null) { sum += cols.avg[i]; n++; }
+    }
+    document.getElementById("total").textContent = hosts.length;
+    document.getElementById("up").textContent = up;
+    document.getElementById("down").textContent = hosts.length - up;
+    document.getElementById("avgAll").textContent = n ? fmt(sum / n) : "-";
+}
+
+async function refresh() {
+    try {
+        const response = await fetch(`/api/hosts?since=${generation}&version=${version}`, { cache: "no-store" });
+        const payload = await response.json();
+
+        if (payload.hosts) {
+            // Cambió la lista de hosts (o es la primera carga): reinicio completo.
+            hosts = payload.hosts;
+            sparks = hosts.map(() => []);
+        }
+        version = payload.version;
+        generation = payload.generation;
+        cols = payload.columns;
+        payload.spark.forEach((fresh, i) => {
+            if (!fresh.length) return;
+            const s = sparks[i];
+            s.push(...fresh);
+            if (s.length > SPARK_POINTS) s.splice(0, s.length - SPARK_POINTS);
+        });
+
+        computeOrder();
+        renderCards();
+        requestAnimationFrame(render);
+    } catch (error) {
+        console.error("No se pudo actualizar el dashboard:", error);
+    }
+}
+
+document.getElementById("viewport").addEventListener("scroll", () => requestAnimationFrame(render));
+document.getElementById("filter").addEventListener("input", () => { computeOrder(); render(); });
+document.getElementById("order").addEventListener("change", () => { computeOrder(); render(); });
+
+refresh();
+setInterval(refresh, 1000);
+</script>
+</body>
+</html>
+"""
+
+def hosts_payload(stats_map, since: int, version: int) -> dict:
+    """
+    Respuesta única para todos los hosts: columnas paralelas (una lista por
+    métrica) y, por host, sólo las muestras de sparkline posteriores a `since`.
+    Si la lista de hosts cambió desde `version`, se manda completa.
+    """
+    with stats_lock:
+        reset = version != hosts_version
+        if reset:
+            since = 0
+        items = list(stats_map.items())
+        payload = {
+            "version": hosts_version,
+            "generation": last_generation,
+            "columns": {
+                "last": [s.last() for _, s in items],
+                "avg": [s.avg_latency() for _, s in items],
+                "sent": [s.sent for _, s in items],
+                "recv": [s.recv for _, s in items],
+                "loss": [round(s.loss_pct(), 2) for _, s in items],
+            },
+            "spark": [
+                [None if rtt is None else round(rtt, 3) for gen, rtt in s.history if gen > since]
+                for _, s in items
+            ],
+        }
+    if reset:
+        payload["hosts"] = [h for h, _ in items]
+    return payload
+
+def start_web(stats_map, port, backend, interval):
+    """Levanta el dashboard Flask en un thread aparte del event loop."""
+    # Flask sólo hace falta para --web.
+    from flask import Flask, jsonify, render_template_string, request
+
+    app = Flask(__name__)
+
+    @app.route("/")
+    def index():
+        return render_template_string(
+            DASHBOARD_HTML,
+            backend=backend,
+            interval=interval,
+            spark_points=SPARK_POINTS,
+        )
+
+    @app.route("/api/hosts")
+    def api_hosts():
+        since = request.args.get("since", 0, type=int)
+        version = request.args.get("version", -1, type=int)
+        return jsonify(hosts_payload(stats_map, since, version))
+
+    # Evita que Flask ensucie la consola con un GET /api/hosts por segundo.
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    threading.Thread(
+        target=app.run,
+        kwargs={"host": "127.0.0.1", "port": port, "debug": False,
+                "use_reloader": False, "threaded": True},
+        daemon=True,
+        name="multiping-web",
+    ).start()
+
+async def watch_hosts_file(path, stats_map, tasks, spawn):
+    """
+    Recarga hosts.txt cuando cambia su mtime. Sólo se crean tareas (con
+    spawn(host, stats)) para los hosts nuevos y se cancelan las de los
+    quitados; el resto conserva sus estadísticas y su loop de ping.
+    """
+    last_mtime = os.stat(path).st_mtime
+    while True:
+        await asyncio.sleep(RELOAD_INTERVAL)
+        try:
+            mtime = os.stat(path).st_mtime
+            if mtime == last_mtime:
+                continue
+            last_mtime = mtime
+            hosts = load_hosts(path)
+        except OSError:
+            # El editor puede estar reescribiendo el archivo; reintentamos luego.
+            continue
+
+        global hosts_version
+        wanted = set(hosts)
+        with stats_lock:
+            if list(stats_map) == hosts:
+                continue
+            hosts_version += 1
+            for h in [h for h in stats_map if h not in wanted]:
+                tasks.pop(h).cancel()
+                del stats_map[h]
+            # Reconstruimos el dict para respetar el orden del archivo en la tabla.
+            current = dict(stats_map)
+            stats_map.clear()
+            for h in hosts:
+                stats_map[h] = current.get(h) or HostStats()
+        for h in hosts:
+            if h not in tasks:
+                tasks[h] = spawn(h, stats_map[h])
+
+async def main(hosts, interval=DEFAULT_INTERVAL, hostsfile=None, backend="auto",
+               timeout=DEFAULT_TIMEOUT, csv_path=None, web_port=None):
+    try:
+        prober = make_prober(backend)
+    except PermissionError:
+        print("ERROR: no hay permisos para abrir el socket ICMP.")
+        print("Ejecutá con sudo/Administrador o usá --backend dgram/subprocess.")
+        sys.exit(1)
+    except OSError as exc:
+        print(f"ERROR al crear el socket ICMP: {exc}")
+        sys.exit(1)
+    sink = CsvSink(csv_path, with_host=True) if csv_path else None
+
+    def spawn(h, stats):
+        return asyncio.create_task(ping_host_loop(h, stats, prober, interval, timeout, sink))
+
     stats_map = {h: HostStats() for h in hosts}
-    tasks = [asyncio.create_task(ping_host_loop(h, stats_map[h], interval)) for h in hosts]
+    tasks = {h: spawn(h, stats_map[h]) for h in hosts}
+    watcher = None
+    if hostsfile:
+        watcher = asyncio.create_task(watch_hosts_file(hostsfile, stats_map, tasks, spawn))
+    if web_port:
+        start_web(stats_map, web_port, prober.backend, interval)
 
     try:
         while True:
+            if web_port:
+                # Con la web activa la consola sólo muestra un resumen: una
+                # tabla de miles de filas no entra en la terminal.
+                with stats_lock:
+                    up = sum(1 for s in stats_map.values() if s.last() is not None)
+                    total = len(stats_map)
+                print(f"\rMultiPing ({prober.backend}) - http://127.0.0.1:{web_port} - "
+                      f"{up}/{total} hosts responden", end="", flush=True)
+                await asyncio.sleep(1.0)
+                continue
             # clear screen
             print("\033[H\033[J", end="")  # funciona en la mayoría de terminales
-            print(f"MultiPing - {time.strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"MultiPing ({prober.backend}) - {time.strftime('%Y-%m-%d %H:%M:%S')}")
             print(f"{'Host':30} {'Last':8} {'Avg':8} {'Sent':5} {'Recv':5} {'Loss%':6}")
             print("-"*70)
-            for h in hosts:
-                s = stats_map[h]
+            with stats_lock:
+                rows = list(stats_map.items())
+            for h, s in rows:
                 last = format_val(s.last())
                 avg = format_val(s.avg_latency()) if s.avg_latency() is not None else "----"
                 print(f"{h:30} {last:8} {avg:8} {s.sent:5d} {s.recv:5d} {s.loss_pct():6.1f}")
             await asyncio.sleep(1.0)
-    except KeyboardInterrupt:
-        for t in tasks: t.cancel()
-        await asyncio.gather(*tasks, return_exceptions=True)
-        print("\nStopped.")
+    except asyncio.CancelledError:
+        # Ctrl+C: asyncio.run cancela esta tarea y después levanta
+        # KeyboardInterrupt. Se frenan los pings y se propaga la cancelación.
+        if watcher: watcher.cancel()
+        for t in tasks.values(): t.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    finally:
+        prober.close()
+        if sink: sink.close()
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Uso: python3 multi_ping.py hosts.txt")
-        sys.exit(1)
-    hostsfile = sys.argv[1]
-    with open(hostsfile, "r", encoding="utf-8") as f:
-        hosts = [line.strip().split("#",1)[0].strip() for line in f if line.strip() and not line.strip().startswith("#")]
-    asyncio.run(main(hosts))
+    parser = argparse.ArgumentParser(description="MultiPing: pings concurrentes a una lista de hosts.")
+    parser.add_argument("hostsfile", help="archivo con una IP, rango, CIDR o nombre por línea")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                        help=f"segundos entre pings por host. Default: {DEFAULT_INTERVAL}")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"timeout por ping; en --sweep, espera final (s). Default: {DEFAULT_TIMEOUT}")
+    parser.add_argument("--backend", choices=["auto", "raw", "dgram", "subprocess"], default="auto",
+                        help="socket ICMP raw/dgram o ping del sistema. Default: auto")
+    parser.add_argument("--csv", help="guardar todas las muestras en este CSV")
+    parser.add_argument("--web", type=int, metavar="PORT",
+                        help="dashboard web en http://127.0.0.1:PORT (requiere Flask)")
+    parser.add_argument("--sweep", action="store_true",
+                        help="un solo barrido de descubrimiento y salir")
+    parser.add_argument("--rate", type=int, default=SWEEP_RATE,
+                        help=f"paquetes/s en --sweep. Default: {SWEEP_RATE}")
+    args = parser.parse_args()
+    if args.rate <= 0:
+        parser.error("--rate debe ser mayor que 0")
+    if args.timeout <= 0:
+        parser.error("--timeout debe ser mayor que 0")
+    if args.sweep and args.backend == "subprocess":
+        parser.error("--sweep necesita un socket ICMP (--backend auto, raw o dgram)")
+
+    hosts = load_hosts(args.hostsfile)
+    if args.sweep:
+        start = time.perf_counter()
+        try:
+            results = sweep(hosts, args.rate, args.timeout, args.backend)
+        except PermissionError:
+            print("ERROR: no hay permisos para abrir un socket ICMP (usá sudo/Administrador).")
+            sys.exit(1)
+        print_sweep(hosts, results, time.perf_counter() - start)
+    else:
+        try:
+            asyncio.run(main(hosts, args.interval, args.hostsfile, args.backend, args.timeout,
+                             args.csv, args.web))
+        except KeyboardInterrupt:
+            print("\nStopped.")
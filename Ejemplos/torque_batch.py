@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Importación en lote de logs de Torque a la biblioteca en disco (LogLibrary).
+
+Cada archivo se parsea en un proceso aparte (ProcessPoolExecutor, uno por
+núcleo), y el proceso mismo guarda el frame en Feather: al proceso principal
+sólo vuelve una fila de resultado, no el DataFrame. Los archivos ya
+importados (mismo hash de contenido) se saltean sin parsear.
+
+Uso: python3 torque_batch.py logs/ otro_log.csv [--workers 8]
+     (importa a la biblioteca de main.py y Torque_log.py; los viajes aparecen en la lista de main.py)
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from torque_cache import LogLibrary, file_key
+from torque_core import LIBRARY_DIR, parse_file
+from torque_summary import summarize_columns, trip_info
+
+
+def find_logs(paths) -> list[str]:
+    """Los .csv de `paths` (archivos o carpetas, sin recorrer subcarpetas)."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found += sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(".csv"))
+        else:
+            found.append(path)
+    return found
+
+
+def import_one(path: str, parse, library_dir: str, name: str = "") -> dict:
+    """
+    Parsea `path` con parse(path) -> (df, error) y lo guarda en la
+    biblioteca. Corre dentro de un proceso del pool.
+    """
+    start = time.perf_counter()
+    library = LogLibrary(library_dir)
+    key = file_key(path)
+    result = {"path": path, "key": key, "status": "cached", "seconds": 0.0}
+    if key in library:
+        return result
+    try:
+        df, error = parse(path)
+    except Exception as e:
+        df, error = None, str(e)
+    if df is None:
+        result.update(status="error", error=error)
+    else:
+        summary = summarize_columns(df)
+        info = dict(trip_info(df), name=name or os.path.basename(path))
+        result["status"] = "imported" if library.save(key, df, summary, info) else "error"
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def import_logs(paths, parse, library_dir: str, workers: int | None = None, names=None) -> list[dict]:
+    """
+    Importa `paths` en paralelo. parse debe ser una función de nivel de
+    módulo (se envía a los procesos). Devuelve un resultado por archivo, en
+    el orden de `paths`; names (opcional) reemplaza el nombre de cada viaje.
+    """
+    names = names or [""] * len(paths)
+    results = [None] * len(paths)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) == 1:
+        return [import_one(p, parse, library_dir, n) for p, n in zip(paths, names)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        futures = {pool.submit(import_one, p, parse, library_dir, n): i
+                   for i, (p, n) in enumerate(zip(paths, names))}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Importa logs de Torque a la biblioteca de los visualizadores.")
+    parser.add_argument("paths", nargs="+", help="archivos .csv o carpetas con logs")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="procesos en paralelo. Default: un proceso por núcleo")
+    args = parser.parse_args()
+
+    paths = find_logs(args.paths)
+    start = time.perf_counter()
+    results = import_logs(paths, parse_file, LIBRARY_DIR, args.workers)
+    elapsed = time.perf_counter() - start
+
+    for r in results:
+        detail = r.get("error") or f"{r['seconds']:.2f} s"
+        print(f"{r['status']:9} {r['path']}  ({detail})")
+    counts = {s: sum(r["status"] == s for r in results) for s in ("imported", "cached", "error")}
+    print(f"\n{len(results)} archivos en {elapsed:.1f} s: {counts['imported']} importados, "
+          f"{counts['cached']} ya estaban, {counts['error']} con error")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""
+Cache de DataFrames parseados para los visualizadores de Torque
+(main.py y Torque_log.py).
+
+El upload se parsea una sola vez: el frame queda en memoria del servidor bajo
+una clave derivada del contenido, y los callbacks de Dash reciben sólo esa
+clave (en un dcc.Store) en vez de volver a decodificar el CSV en cada cambio
+de métrica. Junto a cada frame se puede guardar su resumen por columna
+(torque_summary.summarize_columns), que se conserva aunque el frame se
+vuelque a disco.
+
+- FrameCache: LRU compartido, indexado sólo por contenido.
+- SessionStore: frames por sesión de navegador, con presupuesto de memoria,
+  vencimiento por inactividad y volcado a disco (Feather) de lo menos usado.
+- LogLibrary: logs ya parseados guardados en un directorio local (Feather +
+  metadatos), para volver a abrir un viaje sin subir ni parsear el CSV.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+try:
+    from pyarrow import feather
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+# Tope por defecto: pocas entradas y ~1 GB entre todas.
+DEFAULT_MAX_ITEMS = 8
+DEFAULT_MAX_BYTES = 1_000_000_000
+# Una sesión sin actividad durante este tiempo se descarta (memoria y disco).
+DEFAULT_SESSION_TTL = 3600.0
+DEFAULT_LIBRARY_DIR = os.environ.get(
+    "TORQUE_LIBRARY_DIR", os.path.join(os.path.expanduser("~"), ".cache", "torque_logs"))
+
+_KEY_RE = re.compile(r"[0-9a-f]{32}")
+
+
+def content_key(contents: str) -> str:
+    """
+    Clave estable para el contenido de un dcc.Upload (data URL en base64):
+    hash de los bytes del archivo, el mismo que calcula
+    torque_upload.stream_to_disk, así un log tiene la misma clave por
+    cualquiera de los dos caminos de subida.
+    """
+    data = base64.b64decode(contents.partition(",")[2])
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_key(path: str, chunk_size: int = 1 << 20) -> str:
+    """La misma clave que content_key, para un archivo en disco."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """Memoria que ocupa el frame, incluyendo el contenido de columnas texto."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+class FrameCache:
+    """
+    LRU de DataFrames con doble límite: cantidad de entradas y bytes totales.
+    Al superar cualquiera de los dos se descartan los menos usados. Es seguro
+    para los threads de Flask que atienden callbacks en paralelo.
+    """
+
+    def __init__(self, max_items: int = DEFAULT_MAX_ITEMS, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._frames = OrderedDict()  # clave -> (df, bytes, resumen)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._frames
+
+    def get(self, key):
+        """Devuelve el frame o None si nunca se cargó o ya fue desalojado."""
+        if not key:
+            return None
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                return None
+            self._frames.move_to_end(key)
+            return entry[0]
+
+    def summary(self, key):
+        """Resumen por columna guardado con el frame, o None."""
+        with self._lock:
+            entry = self._frames.get(key) if key else None
+            return entry[2] if entry is not None else None
+
+    def put(self, key, df: pd.DataFrame, summary: pd.DataFrame | None = None):
+        size = frame_nbytes(df)
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._frames[key] = (df, size, summary)
+            self._bytes += size
+            # El recién agregado nunca se desaloja, aunque solo supere el tope.
+            while len(self._frames) > 1 and (
+                len(self._frames) > self.max_items or self._bytes > self.max_bytes
+            ):
+                _, (_, evicted, _) = self._frames.popitem(last=False)
+                self._bytes -= evicted
+
+    def discard(self, key):
+        """Saca el frame de `key`, si está."""
+        with self._lock:
+            old = self._frames.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+
+class _SessionEntry:
+    __slots__ = ("df", "nbytes", "summary", "path", "last_access")
+
+    def __init__(self, df, nbytes, summary=None):
+        self.df = df          # None si está volcado a disco
+        self.nbytes = nbytes
+        self.summary = summary  # queda en memoria aunque df se vuelque
+        self.path = None      # archivo Feather, si se volcó
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """
+    Frames parseados por sesión de navegador, indexados por
+    (session_id, clave de contenido), para que varios analistas usen la app a
+    la vez sin pisarse.
+
+    - Cada sesión conserva sólo sus últimos `per_session` logs.
+    - Si la memoria supera `max_bytes`, los frames menos usados se vuelcan a
+      `spill_dir` en Feather (o se descartan si no hay pyarrow) y se releen
+      al pedirlos de nuevo.
+    - Las entradas sin uso durante `ttl` segundos se eliminan del todo.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl: float = DEFAULT_SESSION_TTL,
+                 per_session: int = 1, spill_dir: str | None = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.per_session = per_session
+        self.spill_dir = spill_dir or tempfile.mkdtemp(prefix="torque_sessions_")
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._entries = OrderedDict()  # (session_id, key) -> _SessionEntry
+        self._bytes = 0                # sólo lo que está en memoria
+        self._lock = threading.Lock()
+
+    def put(self, session_id: str, key: str, df: pd.DataFrame, summary: pd.DataFrame | None = None):
+        with self._lock:
+            self._drop((session_id, key))
+            self._entries[(session_id, key)] = _SessionEntry(df, frame_nbytes(df), summary)
+            self._bytes += self._entries[(session_id, key)].nbytes
+            # Logs anteriores de la misma sesión: se liberan ya.
+            own = [k for k in self._entries if k[0] == session_id]
+            for old in own[:-self.per_session]:
+                self._drop(old)
+            self._expire()
+            self._enforce_budget()
+
+    def get(self, session_id: str, key: str):
+        """Devuelve el frame de la sesión, releyéndolo de disco si hace falta."""
+        if not session_id or not key:
+            return None
+        with self._lock:
+            self._expire()
+            entry = self._entries.get((session_id, key))
+            if entry is None:
+                return None
+            entry.last_access = time.monotonic()
+            self._entries.move_to_end((session_id, key))
+            if entry.df is None:
+                entry.df = feather.read_feather(entry.path, memory_map=True)
+                self._bytes += entry.nbytes
+                self._enforce_budget()
+            return entry.df
+
+    def summary(self, session_id: str, key: str):
+        """Resumen por columna del frame de la sesión, sin releerlo de disco."""
+        with self._lock:
+            entry = self._entries.get((session_id, key))
+            return entry.summary if entry is not None else None
+
+    def close(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    # Los métodos con _ asumen el lock tomado.
+
+    def _drop(self, k):
+        entry = self._entries.pop(k, None)
+        if entry is None:
+            return
+        if entry.df is not None:
+            self._bytes -= entry.nbytes
+        if entry.path:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _expire(self):
+        limit = time.monotonic() - self.ttl
+        for k in [k for k, e in self._entries.items() if e.last_access < limit]:
+            self._drop(k)
+
+    def _enforce_budget(self):
+        # El más reciente (último del OrderedDict) siempre queda en memoria.
+        for k, entry in list(self._entries.items())[:-1]:
+            if self._bytes <= self.max_bytes:
+                return
+            if entry.df is None:
+                continue
+            if not HAS_ARROW:
+                self._drop(k)
+                continue
+            if entry.path is None:
+                # El session_id viene del navegador: no lo usamos crudo como nombre.
+                name = hashlib.blake2b(f"{k[0]}/{k[1]}".encode(), digest_size=16).hexdigest()
+                entry.path = os.path.join(self.spill_dir, f"{name}.feather")
+                # Sin compresión, la relectura con memory_map no descomprime.
+                feather.write_feather(entry.df.reset_index(drop=True), entry.path,
+                                      compression="uncompressed")
+            entry.df = None
+            self._bytes -= entry.nbytes
+
+
+class LogLibrary:
+    """
+    Logs parseados persistidos en `directory`, uno por clave de contenido:
+    <clave>.feather (el frame), <clave>.summary.feather (el resumen por
+    columna) y <clave>.json (nombre, duración, distancia, canales...). Los
+    frames se escriben sin compresión y se releen con memory_map, así abrir
+    un viaje ya cargado no vuelve a parsear el CSV ni las fechas.
+
+    Sin pyarrow la biblioteca queda vacía y save() no hace nada.
+    """
+
+    def __init__(self, directory: str = DEFAULT_LIBRARY_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        if HAS_ARROW:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str, suffix: str) -> str:
+        # La clave puede venir del navegador: sólo se aceptan hashes.
+        if not _KEY_RE.fullmatch(key or ""):
+            raise KeyError(key)
+        return os.path.join(self.directory, key + suffix)
+
+    def __contains__(self, key) -> bool:
+        try:
+            return HAS_ARROW and os.path.exists(self._path(key, ".json"))
+        except KeyError:
+            return False
+
+    def save(self, key: str, df: pd.DataFrame, summary: pd.DataFrame, info: dict) -> bool:
+        """Guarda frame, resumen y metadatos; devuelve False si no se pudo."""
+        if not HAS_ARROW:
+            return False
+        meta = dict(info, key=key, rows=len(df), channels=list(summary.index),
+                    columns=[str(c) for c in df.columns], saved_at=time.time())
+        # Temporales por proceso: el import en lote puede guardar el mismo
+        # log desde dos procesos a la vez.
+        tmp = f".{os.getpid()}.tmp"
+        with self._lock:
+            try:
+                feather.write_feather(df.reset_index(drop=True), self._path(key, ".feather" + tmp),
+                                      compression="uncompressed")
+                feather.write_feather(summary.rename_axis("column").reset_index(),
+                                      self._path(key, ".summary.feather" + tmp), compression="uncompressed")
+                with open(self._path(key, ".json" + tmp), "w", encoding="utf-8") as f:
+                    json.dump(meta, f, default=str)
+            except Exception as e:
+                # Columnas de texto con tipos mezclados, disco lleno, etc.
+                print(f"No se pudo guardar {key} en la biblioteca: {e}")
+                for suffix in (".feather", ".summary.feather", ".json"):
+                    try:
+                        os.remove(self._path(key, suffix + tmp))
+                    except OSError:
+                        pass
+                return False
+            # El .json va último: sólo cuenta como guardado si está completo.
+            for suffix in (".feather", ".summary.feather", ".json"):
+                os.replace(self._path(key, suffix + tmp), self._path(key, suffix))
+        return True
+
+    def load(self, key: str, columns: list[str] | None = None):
+        """
+        (frame, resumen) del log guardado, o (None, None). Con `columns` se
+        leen sólo esas columnas del archivo (las que existan).
+        """
+        if key not in self:
+            return None, None
+        try:
+            if columns is not None:
+                available = set(self.info(key).get("columns", columns))
+                columns = [c for c in columns if c in available]
+            df = feather.read_feather(self._path(key, ".feather"), columns=columns, memory_map=True)
+            summary = feather.read_feather(self._path(key, ".summary.feather")).set_index("column")
+        except (OSError, ValueError) as e:
+            print(f"No se pudo leer {key} de la biblioteca: {e}")
+            return None, None
+        summary.index.name = None
+        return df, summary
+
+    def info(self, key: str) -> dict:
+        """Metadatos de un log guardado ({} si no está)."""
+        try:
+            with open(self._path(key, ".json"), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def entries(self) -> list[dict]:
+        """Metadatos de los logs guardados, del más reciente al más viejo."""
+        if not HAS_ARROW:
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json") or not _KEY_RE.fullmatch(name[:-5]):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(entries, key=lambda e: e.get("saved_at", 0), reverse=True)
+
+    def remove(self, key: str):
+        for suffix in (".json", ".feather", ".summary.feather"):
+            try:
+                os.remove(self._path(key, suffix))
+            except (OSError, KeyError):
+                pass
@@ -0,0 +1,74 @@
+"""
+Payload columnar compacto para dibujar un log de Torque en el navegador.
+
+En el modo "cliente" de main.py el servidor manda al cargar el archivo el
+tiempo, la latitud/longitud, la sesión y la métrica elegida como arrays
+tipados en base64, más el resumen de todas las columnas, y
+assets/torque_columnar.js arma el mapa y la serie temporal (decimada a
+DEFAULT_BUCKETS baldes, como decimate_frame) en el navegador. Las demás
+métricas se piden de a una la primera vez que se eligen (encode_column) y
+quedan en el navegador: volver a una ya vista no pasa por el servidor.
+
+- Columnas: float32, restando a cada una su mínimo (`offset`) para no perder
+  precisión en valores grandes como latitud/longitud u odómetro.
+- Tiempo: ms desde la época como int32 de diferencias con la muestra válida
+  anterior; TIME_NAT marca las filas sin hora. Si alguna diferencia no entra
+  en int32 (sesiones separadas por semanas) se manda float64 absoluto.
+"""
+import base64
+
+import numpy as np
+import pandas as pd
+
+from torque_parse import SESSION_COLUMN
+
+TIME_NAT = np.iinfo(np.int32).min
+# Columnas que el navegador necesita con cualquier métrica: mapa y cortes entre sesiones.
+BASE_COLUMNS = ("Latitude", "Longitude", SESSION_COLUMN)
+
+
+def encode_array(values: np.ndarray) -> str:
+    """Bytes little-endian del array, en base64 (para JSON)."""
+    return base64.b64encode(np.ascontiguousarray(values).tobytes()).decode("ascii")
+
+
+def encode_time(times: pd.Series) -> dict:
+    ms = times.to_numpy(dtype="datetime64[ms]").view("int64")
+    valid = ~pd.isna(times).to_numpy()
+    if not valid.any():
+        return None
+    start = int(ms[valid][0])
+    # Diferencia con la muestra válida anterior; la primera válida queda en 0.
+    previous = np.maximum.accumulate(np.where(valid, np.arange(len(ms)), -1))
+    previous = np.r_[-1, previous[:-1]]
+    base = np.where(previous >= 0, ms[np.maximum(previous, 0)], start)
+    deltas = np.where(valid, ms - base, 0)
+    if np.abs(deltas[valid]).max() < -TIME_NAT:
+        deltas = np.where(valid, deltas, TIME_NAT).astype("<i4")
+        return {"encoding": "int32-delta", "start": start, "data": encode_array(deltas)}
+    return {"encoding": "float64", "data": encode_array(np.where(valid, ms, np.nan).astype("<f8"))}
+
+
+def encode_column(series: pd.Series, minimum: float) -> dict:
+    offset = 0.0 if np.isnan(minimum) else float(minimum)
+    values = series.to_numpy(dtype=float, na_value=np.nan) - offset
+    return {"offset": offset, "data": encode_array(values.astype("<f4"))}
+
+
+def columnar_payload(df: pd.DataFrame, summary: pd.DataFrame, channels=(),
+                     time_column: str = "Time") -> dict:
+    """
+    Payload para el dcc.Store del modo cliente: el tiempo, BASE_COLUMNS y
+    `channels` (las métricas a graficar), más el resumen (torque_summary) de
+    todas las columnas, así la tabla de estadísticas se arma en el navegador.
+    """
+    time = encode_time(df[time_column]) if time_column in df.columns else None
+    stats = summary.astype(object).where(summary.notna(), None)
+    wanted = set(BASE_COLUMNS) | set(channels)
+    return {
+        "n": len(df),
+        "time": time,
+        "columns": {col: encode_column(df[col], summary.at[col, "min"])
+                    for col in summary.index if col in wanted},
+        "summary": stats.to_dict("index"),
+    }
@@ -0,0 +1,320 @@
+"""
+Núcleo común de los visualizadores de Torque: main.py y Torque_log.py son
+dos front ends de Dash sobre estas mismas funciones.
+
+- Ingesta: read_log(), parse_contents() y parse_file() leen un CSV de Torque
+  con un solo criterio de columnas: `Time`, `Session`, `Elapsed (s)` y, si
+  hay velocidad GPS en m/s, además `GPS Speed (km/h)` (la original se
+  conserva). Devuelven (frame, mensaje de error), como espera
+  torque_batch.import_one.
+- Caché: TorqueCore.load() busca el log en la biblioteca en disco (una sola,
+  compartida por las dos apps: un log parseado en una se abre sin parsear en
+  la otra), si no está lo parsea, resume y guarda, y le agrega los canales
+  derivados. Los índices por tiempo y espaciales se arman una vez por log y
+  los reusan todos los callbacks y usuarios.
+- Agregados: estadísticas de un rango, serie temporal decimada, mapa por
+  grilla y gráfico multicanal remuestreado (torque_plot, torque_summary).
+
+Cada app guarda los frames en memoria a su manera (main.py compartidos por
+contenido en un FrameCache, Torque_log.py por sesión de navegador en un
+SessionStore), y arma su propio layout e idioma.
+"""
+import base64
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from torque_cache import DEFAULT_LIBRARY_DIR, DEFAULT_MAX_BYTES, LogLibrary
+from torque_derived import DERIVED_ATTR, ChannelEngine
+from torque_parse import (KEEP_FULL_PRECISION, SESSION_COLUMN, add_elapsed, compact_frame,
+                          format_compaction, parse_log_time, read_sessions)
+from torque_plot import RAW_POINT_LIMIT, GeoIndex, decimate_frame, grid_aggregate, resample_channels
+from torque_summary import TimeIndex, summarize_columns, trip_info
+
+GPS_SPEED_MS = "GPS Speed (Meters/second)"
+GPS_SPEED_KMH = "GPS Speed (km/h)"
+# Con precisión completa los frames son otros: van a otro directorio.
+LIBRARY_DIR = os.path.join(DEFAULT_LIBRARY_DIR, "logs-full" if KEEP_FULL_PRECISION else "logs")
+INDEX_CACHE = 32        # índices (por tiempo o espaciales) en memoria
+# Bytes entre todos los índices (con las columnas que cachea cada TimeIndex),
+# aparte del presupuesto de los frames.
+INDEX_CACHE_BYTES = DEFAULT_MAX_BYTES // 4
+MULTI_ROW_HEIGHT = 150  # px por canal en el gráfico multicanal
+
+
+def read_log(f, progress=None):
+    """
+    Lee un CSV de Torque (archivo binario) separando las sesiones que marcan
+    los headers repetidos, y arma la columna Time. progress (opcional,
+    torque_jobs.JobProgress) recibe el avance y la primera sesión de un log
+    con varias apenas está lista.
+    """
+    def on_session(number, session, last):
+        # Vista previa mientras se parsean las sesiones siguientes.
+        if number == 0 and not last:
+            # concat y no assign: con cientos de canales assign fragmenta el frame.
+            numbered = pd.concat([session, pd.Series(0, index=session.index, name=SESSION_COLUMN)], axis=1)
+            preview, _ = finish_log(numbered)
+            if preview is not None:
+                progress.partial(preview)
+
+    try:
+        df = read_sessions(f, progress=progress.rows if progress else None,
+                           on_session=on_session if progress else None)
+    except Exception as e:
+        print(e)
+        return None, 'There was an error processing the file.'
+    return finish_log(df, progress)
+
+
+def finish_log(df, progress=None):
+    """Columna Time, km/h, tiempo transcurrido y compactación de un frame leído."""
+    columns = {}
+    try:
+        if progress is not None:
+            progress.stage('parsing time')
+        # Device Time o GPS Time, con el formato detectado una vez por header.
+        time = parse_log_time(df)
+        if time is not None:
+            columns["Time"] = time
+        elif "Device Time" in df.columns or "GPS Time" in df.columns:
+            source = "Device Time" if "Device Time" in df.columns else "GPS Time"
+            print(f"Error converting '{source}'")
+            return None, f"Error parsing '{source}'. Check the format."
+    except Exception as e:
+        print(e)
+        return None, 'There was an error processing the file.'
+
+    if GPS_SPEED_MS in df.columns:
+        columns[GPS_SPEED_KMH] = df[GPS_SPEED_MS] * 3.6
+    if columns:
+        # Todas juntas y sin copiar: con cien canales, agregar columnas de a
+        # una a un frame recién leído lo fragmenta.
+        df = pd.concat([df.drop(columns=[c for c in columns if c in df.columns]),
+                        pd.DataFrame(columns, index=df.index)], axis=1)
+
+    if "Time" in df.columns:
+        df = add_elapsed(df)
+
+    if progress is not None:
+        progress.stage('compacting')
+    df, report = compact_frame(df)
+    print(format_compaction(report))
+    return df, ''
+
+
+def parse_contents(contents):
+    """Contenido de dcc.Upload ('data:...;base64,...')."""
+    _, content_string = contents.split(',')
+    return read_log(io.BytesIO(base64.b64decode(content_string)))
+
+
+def parse_file(path, progress=None):
+    """Parsea un CSV ya escrito en disco por el upload directo, sin cargarlo en memoria."""
+    with open(path, 'rb') as f:
+        return read_log(f, progress)
+
+
+def time_series_figure(df, metric, x_range=None, title=None, time_column="Time", **layout):
+    """Serie temporal de `metric`, con sólo min/max por píxel del rango visible."""
+    data = decimate_frame(df, time_column, metric, x_range)
+    # line_group: no unir con una recta el final de una sesión y el comienzo de la siguiente.
+    fig = px.line(data, x=time_column, y=metric, title=title,
+                  line_group=SESSION_COLUMN if SESSION_COLUMN in data.columns else None)
+    fig.update_traces(mode='lines')
+    fig.update_layout(uirevision=metric, **layout)
+    if x_range:
+        fig.update_xaxes(range=list(x_range))
+    return fig
+
+
+def map_scales(stats):
+    """Escala de color y punto medio para una fila del resumen: divergente si cruza el cero."""
+    if stats['min'] < 0 and stats['max'] > 0:
+        return px.colors.sequential.RdBu, 0
+    return px.colors.sequential.Jet, None
+
+
+def metric_unit(metric: str) -> str:
+    """Unidad entre paréntesis al final del nombre de un canal de Torque."""
+    match = re.search(r'\(([^()]*)\)\s*$', metric)
+    return match.group(1) if match else ''
+
+
+class TorqueCore:
+    """
+    Biblioteca de logs, canales derivados e índices por log, compartidos por
+    todos los callbacks de una app. Los métodos reciben el frame y su clave
+    (hash del contenido): de dónde sale el frame en memoria lo decide la app.
+    """
+
+    def __init__(self, library_dir: str = LIBRARY_DIR, channels: ChannelEngine | None = None):
+        self.library = LogLibrary(library_dir)
+        # Canales derivados por defecto (torque_derived.py): aparecen como métricas.
+        self.channels = channels or ChannelEngine()
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, key, parse, name=''):
+        """
+        Frame de `key` con sus canales derivados: (df, resumen, error). Un
+        log ya guardado en la biblioteca se relee de disco sin parsear; uno
+        nuevo se parsea con parse() -> (df, error), se resume y se guarda.
+        """
+        df, summary = self.library.load(key)
+        if df is None:
+            df, error = parse()
+            if df is None:
+                return None, None, error
+            summary = summarize_columns(df)
+            self.library.save(key, df, summary, dict(trip_info(df), name=name))
+        # La biblioteca guarda sólo las columnas nativas; los derivados salen
+        # del cache del motor si otro usuario ya abrió el mismo log.
+        df, summary, _ = self.derive(key, df, summary)
+        return df, summary, ''
+
+    def derive(self, key, df, summary, session=None):
+        """
+        Agrega (o actualiza) los canales derivados de `session` (None: los por
+        defecto): (df, resumen, errores por canal). Los errores también van
+        al log del servidor.
+        """
+        df, summary, errors = self.channels.apply(key, df, summary, session)
+        for channel, error in errors.items():
+            print(f"Derived channel '{channel}': {error}")
+        return df, summary, errors
+
+    def session_key(self, key, session=None):
+        """
+        Clave del frame que ve `session`: la del log si usa los canales por
+        defecto, otra si definió los suyos (índices y cachés aparte).
+        """
+        return f"{key}/{session}" if self.channels.customized(session) else key
+
+    def current(self, df, session=None) -> bool:
+        """El frame ya tiene los canales derivados actuales de `session`."""
+        return self.channels.current(df, session)
+
+    def _index(self, kind, key, df, build):
+        # La revisión de los canales del frame es parte de la clave: un canal
+        # redefinido no reusa sumas viejas del índice por tiempo. Un frame con
+        # canales propios de una sesión llega con otra clave (session_key).
+        k = (kind, key, df.attrs.get(DERIVED_ATTR, {}).get("revision"))
+        with self._lock:
+            index = self._indexes.get(k)
+            if index is not None:
+                self._indexes.move_to_end(k)
+                self._evict()
+                return index
+        index = build()
+        with self._lock:
+            self._indexes[k] = index
+            self._evict()
+        return index
+
+    def _evict(self):
+        # Un TimeIndex crece con cada columna consultada: el tope en bytes se
+        # revisa también al reusarlo (_index). El más reciente siempre queda.
+        total = sum(index.nbytes for index in self._indexes.values())
+        while len(self._indexes) > 1 and (len(self._indexes) > INDEX_CACHE or total > INDEX_CACHE_BYTES):
+            _, index = self._indexes.popitem(last=False)
+            total -= index.nbytes
+
+    def forget(self, key):
+        """
+        Descarta índices y canales derivados calculados para `key` (y para
+        las vistas de sesión del mismo log), por ejemplo una vista previa.
+        """
+        with self._lock:
+            for k in [k for k in self._indexes if k[1] == key or k[1].startswith(f"{key}/")]:
+                del self._indexes[k]
+        self.channels.forget(key)
+
+    def time_index(self, key, df) -> TimeIndex:
+        """Índice por tiempo del log: filas y estadísticas de un rango."""
+        return self._index('time', key, df, lambda: TimeIndex(df['Time']))
+
+    def geo_index(self, key, df) -> GeoIndex:
+        """Índice espacial del log, para el mapa por viewport."""
+        return self._index('geo', key, df, lambda: GeoIndex(df['Latitude'].to_numpy(), df['Longitude'].to_numpy()))
+
+    def rows_in_range(self, key, df, x_range):
+        """Filas (posiciones, en orden) del rango de tiempo, o None para el log entero."""
+        if not x_range or 'Time' not in df.columns:
+            return None
+        return np.sort(self.time_index(key, df).rows(*x_range))
+
+    def range_summary(self, key, df, summary, metric, x_range=None) -> pd.Series:
+        """
+        SUMMARY_FIELDS de `metric`: sin rango, la fila del resumen calculado
+        al cargar; con rango, sumas acumuladas y búsqueda binaria sobre el
+        índice por tiempo, sin recorrer el frame.
+        """
+        if not x_range or 'Time' not in df.columns:
+            return summary.loc[metric]
+        return pd.Series(self.time_index(key, df).summary(metric, df[metric], *x_range))
+
+    def map_figure(self, key, df, metric, mode='grid', bounds=None, x_range=None, hover_columns=None,
+                   color_scale=None, midpoint=None, **layout):
+        """
+        Mapa del recorrido. En modo 'grid' los puntos del viewport (bounds) se
+        agrupan en celdas (media/máximo/cantidad de la métrica) salvo que sean
+        pocos; los puntos crudos, con hover_columns (todas si es None) en el
+        hover, sólo se mandan cuando el viewport es chico o en modo 'points'.
+        Con x_range sólo entran los puntos de ese rango de tiempo.
+        """
+        index = self.geo_index(key, df)
+        rows = index.query(bounds)
+        if x_range and 'Time' in df.columns:
+            in_range = np.zeros(len(df), dtype=bool)
+            in_range[self.time_index(key, df).rows(*x_range)] = True
+            rows = rows[in_range[rows]]
+        if color_scale is None:
+            color_scale = px.colors.sequential.Jet
+        if mode == 'points' or len(rows) <= RAW_POINT_LIMIT:
+            hover = df.columns if hover_columns is None else [c for c in hover_columns if c in df.columns]
+            fig = px.scatter_map(df.iloc[rows], lat='Latitude', lon='Longitude', color=metric,
+                                 zoom=10, height=500, color_continuous_scale=color_scale,
+                                 color_continuous_midpoint=midpoint, hover_data=hover)
+        else:
+            grid = grid_aggregate(df['Latitude'].to_numpy(dtype=float)[rows],
+                                  df['Longitude'].to_numpy(dtype=float)[rows],
+                                  df[metric].to_numpy(dtype=float)[rows],
+                                  bounds or index.bounds())
+            grid = grid.rename(columns={'mean': metric, 'max': 'Maximum', 'count': 'Points'})
+            fig = px.scatter_map(grid.dropna(subset=[metric]), lat='Latitude', lon='Longitude',
+                                 color=metric, zoom=10, height=500, color_continuous_scale=color_scale,
+                                 color_continuous_midpoint=midpoint,
+                                 hover_data={'Maximum': ':.2f', 'Points': True})
+        # uirevision: al reemplazar la figura en un relayout se conserva la vista del usuario.
+        fig.update_layout(margin={"r": 0, "t": 0, "l": 0, "b": 0}, uirevision=metric, **layout)
+        return fig
+
+    def multi_channel_figure(self, key, df, channels, x_range=None, **layout):
+        """
+        Varios canales sobre la misma base de tiempo (torque_plot.resample_channels),
+        en subplots con el eje x compartido: el zoom en uno mueve a todos.
+        """
+        data = resample_channels(df, self.time_index(key, df), channels, x_range)
+        # Filas toda NaN: pausas donde se corta la línea. Los NaN sueltos de un
+        # canal (PID sin dato en esa fila) se saltean para no cortarla.
+        gaps = data[channels].isna().all(axis=1)
+        fig = make_subplots(rows=len(channels), cols=1, shared_xaxes=True, vertical_spacing=0.02)
+        for row, channel in enumerate(channels, 1):
+            trace = data[data[channel].notna() | gaps]
+            fig.add_trace(go.Scattergl(x=trace['Time'], y=trace[channel], name=channel, mode='lines'),
+                          row=row, col=1)
+            fig.update_yaxes(title_text=channel, title_font=dict(size=10), row=row, col=1)
+        fig.update_layout(height=MULTI_ROW_HEIGHT * len(channels) + 60, hovermode='x unified',
+                          showlegend=False, margin={"t": 20}, uirevision='|'.join(channels), **layout)
+        if x_range:
+            fig.update_xaxes(range=list(x_range))
+        return fig
@@ -0,0 +1,412 @@
+"""
+Canales derivados de un log de Torque: expresiones sobre columnas existentes.
+
+Un canal se define con un nombre y una expresión en la que las columnas van
+entre backticks, como en DataFrame.eval:
+
+    `Fuel flow rate/hour(l/hr)` / `Speed (OBD)(km/h)` * 100
+    deriv(`Speed (OBD)(km/h)` / 3.6)
+    rolling_mean(`Engine RPM(rpm)`, '10s')
+
+La expresión se valida con ast (sólo aritmética, comparaciones y las
+funciones de FUNCTIONS) y se evalúa una vez sobre las columnas enteras como
+arrays de numpy. La potencia se evalúa siempre en float de numpy: con
+enteros de Python, `9**9**9` colgaría al servidor armando un número enorme.
+deriv, diff y rolling_mean trabajan por sesión, así el reinicio del logging
+no aparece como un salto.
+
+ChannelEngine guarda cada resultado con una huella de la expresión y de sus
+entradas (recursivamente): si se redefine un canal sólo se recalculan ése y
+los que dependen de él; el resto sale del cache. Los canales que se definen
+desde la página son de la sesión de navegador que los definió (se suman a
+los por defecto o los reemplazan); el cache de resultados es de todos,
+porque la huella ya distingue expresiones distintas. Los canales se agregan
+al frame y al resumen por columna como si fueran columnas nativas, así
+aparecen en la lista de métricas sin tocar los callbacks.
+"""
+import ast
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from torque_parse import KEEP_FULL_PRECISION, SESSION_COLUMN
+from torque_summary import summarize_column
+
+DERIVED_ATTR = "derived"
+DEFAULT_CACHE_BYTES = 256 << 20
+MAX_SESSIONS = 256  # sesiones con canales propios que se recuerdan
+_COLUMN_RE = re.compile(r"`([^`]+)`")
+
+# Canales por defecto. Un nombre puede tener varias definiciones: se usa la
+# primera cuyas columnas estén en el log (no todos los autos dan la
+# velocidad por OBD).
+DEFAULT_CHANNELS = [
+    ("Acceleration (m/s²)", "deriv(`Speed (OBD)(km/h)` / 3.6)"),
+    ("Acceleration (m/s²)", "deriv(`GPS Speed (Meters/second)`)"),
+    ("Fuel Economy (l/100km)",
+     "where(`Speed (OBD)(km/h)` > 2, `Fuel flow rate/hour(l/hr)` / `Speed (OBD)(km/h)` * 100, nan)"),
+    ("Speed 10 s avg (km/h)", "rolling_mean(`Speed (OBD)(km/h)`, '10s')"),
+    ("RPM 10 s avg (rpm)", "rolling_mean(`Engine RPM(rpm)`, '10s')"),
+]
+
+
+class _Context:
+    """Tiempo (s) y sesión del log, para las funciones que miran filas vecinas."""
+
+    def __init__(self, df: pd.DataFrame, time_column: str):
+        self.df = df
+        self.time_column = time_column
+        self._seconds = None
+        self._session = None
+
+    @property
+    def seconds(self) -> np.ndarray:
+        if self._seconds is None:
+            if self.time_column not in self.df.columns:
+                raise ValueError(f"el log no tiene columna '{self.time_column}'")
+            times = self.df[self.time_column]
+            ns = times.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(float)
+            ns[times.isna().to_numpy()] = np.nan
+            self._seconds = ns / 1e9
+        return self._seconds
+
+    @property
+    def session(self) -> np.ndarray:
+        if self._session is None:
+            if SESSION_COLUMN in self.df.columns:
+                self._session = self.df[SESSION_COLUMN].to_numpy()
+            else:
+                self._session = np.zeros(len(self.df), dtype=np.int64)
+        return self._session
+
+    def boundary(self) -> np.ndarray:
+        """True en la primera fila de cada sesión."""
+        first = np.ones(len(self.session), dtype=bool)
+        first[1:] = self.session[1:] != self.session[:-1]
+        return first
+
+
+def _diff(ctx: _Context, values):
+    values = np.asarray(values, dtype=float)
+    out = np.empty_like(values)
+    out[0:1] = np.nan
+    out[1:] = values[1:] - values[:-1]
+    out[ctx.boundary()] = np.nan
+    return out
+
+
+def _deriv(ctx: _Context, values):
+    # Derivada respecto del tiempo (por segundo), hacia atrás.
+    dt = _diff(ctx, ctx.seconds)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(dt > 0, _diff(ctx, values) / dt, np.nan)
+
+
+def _rolling_mean(ctx: _Context, values, window):
+    """
+    Media móvil hacia atrás por sesión: window entero = cantidad de filas,
+    texto = ventana de tiempo de pandas ('10s', '1min').
+    """
+    values = np.asarray(values, dtype=float)
+    if isinstance(window, str):
+        times = ctx.df[ctx.time_column] if ctx.time_column in ctx.df.columns else None
+        if times is None or times.isna().any():
+            raise ValueError("rolling_mean con ventana de tiempo necesita una columna de tiempo completa")
+        # La ventana de tiempo pide el índice ordenado: se ordena por
+        # (sesión, tiempo) y el resultado vuelve a las filas originales.
+        order = np.lexsort((ctx.seconds, ctx.session))
+        series = pd.Series(values[order], index=pd.DatetimeIndex(times.to_numpy()[order]))
+        session = ctx.session[order]
+    elif isinstance(window, (int, np.integer)) and window >= 1:
+        order = None
+        series = pd.Series(values)
+        session = ctx.session
+    else:
+        raise ValueError("la ventana de rolling_mean debe ser un entero positivo o un intervalo ('10s')")
+    means = series.groupby(session, sort=False).transform(
+        lambda g: g.rolling(window, min_periods=1).mean()).to_numpy(dtype=float)
+    if order is None:
+        return means
+    out = np.empty_like(means)
+    out[order] = means
+    return out
+
+
+def _elementwise(function):
+    return lambda ctx, *args: function(*args)
+
+
+FUNCTIONS = {
+    "deriv": _deriv,
+    "diff": _diff,
+    "rolling_mean": _rolling_mean,
+    "abs": _elementwise(np.abs),
+    "sqrt": _elementwise(np.sqrt),
+    "log": _elementwise(np.log),
+    "exp": _elementwise(np.exp),
+    "clip": _elementwise(np.clip),
+    "where": _elementwise(np.where),
+    "minimum": _elementwise(np.minimum),
+    "maximum": _elementwise(np.maximum),
+}
+CONSTANTS = {"nan": np.nan, "pi": np.pi}
+
+
+def _power(base, exponent):
+    # Desborda a inf en vez de construir un entero de Python gigante.
+    return np.power(np.asarray(base, dtype=float), np.asarray(exponent, dtype=float))
+
+
+class _NumpyPower(ast.NodeTransformer):
+    """Reemplaza a ** b por _pow(a, b)."""
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Pow):
+            return ast.Call(func=ast.Name(id="_pow", ctx=ast.Load()), args=[node.left, node.right],
+                            keywords=[])
+        return node
+
+_ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.USub, ast.UAdd, ast.Invert, ast.BitAnd, ast.BitOr,
+    ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq,
+)
+
+
+class DerivedChannel:
+    """Un canal: nombre, expresión ya compilada y columnas de las que depende."""
+
+    def __init__(self, name: str, expression: str):
+        self.name = name
+        self.expression = expression
+        self.inputs = list(dict.fromkeys(_COLUMN_RE.findall(expression)))
+        placeholders = {column: f"_c{i}" for i, column in enumerate(self.inputs)}
+        source = _COLUMN_RE.sub(lambda m: placeholders[m.group(1)], expression)
+        try:
+            tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"'{name}': expresión inválida ({e.msg})") from None
+        # Texto sólo como argumento de una función (la ventana de
+        # rolling_mean): 'a' * 9999999999 también colgaría al servidor.
+        arguments = {id(arg) for node in ast.walk(tree) if isinstance(node, ast.Call) for arg in node.args}
+        for node in ast.walk(tree):
+            if not isinstance(node, _ALLOWED_NODES):
+                raise ValueError(f"'{name}': no se permite {type(node).__name__} en la expresión")
+            if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)) \
+                    and id(node) not in arguments:
+                raise ValueError(f"'{name}': el texto {node.value!r} sólo puede ser argumento de una función")
+            if isinstance(node, ast.Call):
+                if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+                    raise ValueError(f"'{name}': función no soportada "
+                                     f"(disponibles: {', '.join(sorted(FUNCTIONS))})")
+                # Las funciones reciben el contexto del log como primer argumento.
+                node.args.insert(0, ast.Name(id="_ctx", ctx=ast.Load()))
+            elif isinstance(node, ast.Name) and node.id not in FUNCTIONS and node.id not in CONSTANTS \
+                    and node.id not in placeholders.values() and node.id != "_ctx":
+                raise ValueError(f"'{name}': nombre desconocido '{node.id}' (las columnas van entre backticks)")
+        self._variables = list(placeholders.values())
+        tree = _NumpyPower().visit(tree)
+        self._code = compile(ast.fix_missing_locations(tree), f"<canal {name}>", "eval")
+
+    def evaluate(self, ctx: _Context, columns: list[np.ndarray]) -> np.ndarray:
+        namespace = dict(FUNCTIONS, **CONSTANTS, _ctx=ctx, _pow=_power)
+        namespace.update(zip(self._variables, columns))
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            result = eval(self._code, {"__builtins__": {}}, namespace)
+        result = np.broadcast_to(np.asarray(result, dtype=float), (len(ctx.df),))
+        return result.astype(np.float64 if KEEP_FULL_PRECISION else np.float32)
+
+
+class ChannelEngine:
+    """
+    Definiciones de canales derivados y cache de sus resultados por log.
+    Seguro entre threads; `revision` cambia con cada definición nueva (de
+    cualquier sesión) y revision_of(session) con las que ve esa sesión, para
+    saber si un frame ya cargado tiene los canales al día.
+
+    session=None son los canales por defecto, los de todas las sesiones.
+    """
+
+    def __init__(self, channels=DEFAULT_CHANNELS, max_bytes: int = DEFAULT_CACHE_BYTES,
+                 time_column: str = "Time"):
+        self.max_bytes = max_bytes
+        self.time_column = time_column
+        self.revision = 0
+        self._definitions = OrderedDict()  # nombre -> [DerivedChannel] alternativas
+        self._sessions = OrderedDict()     # sesión -> {nombre: [DerivedChannel], [] = quitado}
+        self._revisions = {None: 0}        # sesión -> revision de su último cambio
+        self._cache = OrderedDict()        # huella -> (array, fila de resumen, clave del log)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        for name, expression in channels:
+            self._definitions.setdefault(name, []).append(DerivedChannel(name, expression))
+
+    def define(self, name: str, expression: str, session: str | None = None) -> DerivedChannel:
+        """Agrega o reemplaza un canal. ValueError si la expresión no es válida."""
+        name = (name or "").strip()
+        if not name:
+            raise ValueError("el canal necesita un nombre")
+        channel = DerivedChannel(name, expression)
+        with self._lock:
+            self._scope(session)[name] = [channel]
+            self._changed(session)
+        return channel
+
+    def remove(self, name: str, session: str | None = None):
+        with self._lock:
+            scope = self._scope(session)
+            if session is not None and name in self._definitions:
+                # Un canal por defecto se oculta sólo para esta sesión.
+                if scope.get(name) != []:
+                    scope[name] = []
+                    self._changed(session)
+            elif scope.pop(name, None) is not None:
+                self._changed(session)
+
+    def channels(self, session: str | None = None) -> list[dict]:
+        with self._lock:
+            return [{"name": name, "expression": alternatives[0].expression}
+                    for name, alternatives in self._visible(session).items()]
+
+    def customized(self, session: str | None) -> bool:
+        """La sesión definió o quitó canales: sus frames no son los compartidos."""
+        with self._lock:
+            return session is not None and session in self._sessions
+
+    def revision_of(self, session: str | None = None) -> int:
+        with self._lock:
+            return max(self._revisions[None], self._revisions.get(session, 0))
+
+    # Los métodos con _ asumen el lock tomado.
+
+    def _scope(self, session):
+        if session is None:
+            return self._definitions
+        if session not in self._sessions:
+            self._sessions[session] = OrderedDict()
+            while len(self._sessions) > MAX_SESSIONS:
+                old, _ = self._sessions.popitem(last=False)
+                self._revisions.pop(old, None)
+        self._sessions.move_to_end(session)
+        return self._sessions[session]
+
+    def _changed(self, session):
+        self.revision += 1
+        self._revisions[session] = self.revision
+
+    def _visible(self, session):
+        definitions = OrderedDict(self._definitions)
+        for name, alternatives in self._sessions.get(session, {}).items():
+            definitions[name] = alternatives
+        return {name: list(alternatives) for name, alternatives in definitions.items() if alternatives}
+
+    def apply(self, key: str, df: pd.DataFrame, summary: pd.DataFrame, session: str | None = None):
+        """
+        Devuelve (df, resumen, errores) con los canales derivados de `session`
+        agregados.
+        Los canales cuyas columnas no están en el log se omiten; errores
+        tiene {nombre: mensaje} de los que fallaron al evaluarse. Se puede
+        volver a aplicar sobre un frame ya aumentado: primero se sacan los
+        canales de la aplicación anterior.
+        """
+        previous = df.attrs.get(DERIVED_ATTR, {}).get("columns", [])
+        if previous:
+            df = df.drop(columns=[c for c in previous if c in df.columns])
+            summary = summary.drop(index=[c for c in previous if c in summary.index])
+
+        with self._lock:
+            definitions = self._visible(session)
+            revision = max(self._revisions[None], self._revisions.get(session, 0))
+        ctx = _Context(df, self.time_column)
+        resolved = {}   # nombre -> (huella, array, fila de resumen) o None
+        errors = {}
+
+        def resolve(name, stack=()):
+            if name in stack:
+                errors[name] = "dependencia circular"
+                return None
+            if name in resolved:
+                return resolved[name]
+            resolved[name] = None
+            for channel in definitions.get(name, []):
+                inputs = []
+                for column in channel.inputs:
+                    if column in df.columns:
+                        inputs.append((f"{key}:{column}", None))
+                    elif column in definitions:
+                        inputs.append(resolve(column, stack + (name,)))
+                    else:
+                        inputs.append(None)
+                if any(i is None for i in inputs):
+                    continue
+                fingerprint = hashlib.blake2b(
+                    "\0".join([key, channel.expression] + [i[0] for i in inputs]).encode(),
+                    digest_size=16).hexdigest()
+                cached = self._cached(fingerprint)
+                if cached is None:
+                    columns = [df[column].to_numpy(dtype=float, na_value=np.nan) if array is None else array
+                               for column, (_, array, *_) in zip(channel.inputs, inputs)]
+                    try:
+                        values = channel.evaluate(ctx, columns)
+                    except Exception as e:
+                        errors[name] = str(e)
+                        return None
+                    cached = (values, summarize_column(pd.Series(values)))
+                    self._store(fingerprint, cached + (key,))
+                resolved[name] = (fingerprint,) + cached
+                break
+            return resolved[name]
+
+        for name in definitions:
+            # Un canal con el nombre de una columna nativa no la pisa.
+            if name not in df.columns:
+                resolve(name)
+
+        added = {name: entry for name, entry in resolved.items() if entry is not None}
+        if not added:
+            df = df.copy(deep=False)
+        else:
+            # Todas juntas: con cien canales nativos, agregarlas de a una
+            # (assign) fragmenta el frame.
+            df = pd.concat([df, pd.DataFrame({name: entry[1] for name, entry in added.items()},
+                                             index=df.index)], axis=1)
+            rows = pd.DataFrame.from_dict({name: entry[2] for name, entry in added.items()},
+                                          orient="index", columns=summary.columns)
+            summary = pd.concat([summary, rows])
+        df.attrs[DERIVED_ATTR] = {"revision": revision, "session": session, "columns": list(added)}
+        return df, summary, errors
+
+    def current(self, df: pd.DataFrame, session: str | None = None) -> bool:
+        """True si df ya tiene aplicados los canales actuales de `session`."""
+        applied = df.attrs.get(DERIVED_ATTR, {})
+        return applied.get("session") == session and applied.get("revision") == self.revision_of(session)
+
+    def _cached(self, fingerprint):
+        with self._lock:
+            entry = self._cache.get(fingerprint)
+            if entry is not None:
+                self._cache.move_to_end(fingerprint)
+                return entry[:2]
+            return None
+
+    def _store(self, fingerprint, entry):
+        with self._lock:
+            if fingerprint in self._cache:
+                return
+            self._cache[fingerprint] = entry
+            self._bytes += entry[0].nbytes
+            while len(self._cache) > 1 and self._bytes > self.max_bytes:
+                _, (evicted, *_) = self._cache.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def forget(self, key: str):
+        """Descarta los resultados calculados sobre el log `key`."""
+        with self._lock:
+            for fingerprint in [f for f, entry in self._cache.items() if entry[2] == key]:
+                self._bytes -= self._cache.pop(fingerprint)[0].nbytes
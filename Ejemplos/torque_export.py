@@ -0,0 +1,185 @@
+"""
+Exportación en streaming de logs de Torque (Excel, CSV comprimido, Parquet).
+
+dcc.send_data_frame(df.to_excel) arma el xlsx entero en memoria dentro del
+callback y lo manda en base64 por JSON. Acá la descarga es un link a una
+ruta de Flask que devuelve la respuesta de a pedazos:
+
+- csv.gz: bloques de CHUNK_ROWS filas pasados por un compresor gzip; cada
+  bloque comprimido sale apenas está listo.
+- parquet: un row group por bloque, escrito a un sink que se vacía después
+  de cada uno.
+- xlsx: xlsxwriter en modo constant_memory (escribe fila por fila a disco)
+  sobre un archivo temporal, que después se manda por bloques y se borra.
+  Un xlsx no se puede mandar antes de cerrarlo, pero tampoco vive en RAM.
+
+En todos los casos se recorren las filas elegidas de a bloques por índice,
+sin copiar el frame filtrado, y se pueden pedir un subconjunto de columnas y
+un rango de tiempo.
+"""
+import os
+import tempfile
+import zlib
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+from flask import Response, request
+
+EXPORT_ROUTE = "/export"
+CHUNK_ROWS = 50_000
+EXCEL_MAX_ROWS = 1_048_575  # filas de datos por hoja (más el header)
+FORMATS = {
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "csv.gz": ("application/gzip", "csv.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def select_rows(df: pd.DataFrame, time_column: str = "Time", start=None, end=None) -> np.ndarray:
+    """Posiciones de las filas con time_column en [start, end] (todas si no hay rango)."""
+    if time_column not in df.columns or (start is None and end is None):
+        return np.arange(len(df))
+    times = df[time_column]
+    mask = times.notna()
+    if start is not None:
+        mask &= times >= pd.Timestamp(start)
+    if end is not None:
+        mask &= times <= pd.Timestamp(end)
+    return np.flatnonzero(mask.to_numpy())
+
+
+def iter_chunks(df: pd.DataFrame, columns, rows: np.ndarray, chunk_rows: int = CHUNK_ROWS):
+    # Posiciones de las columnas, no df[columns]: eso copiaría las columnas
+    # elegidas del frame entero antes del primer bloque.
+    positions = df.columns.get_indexer(columns)
+    for i in range(0, len(rows), chunk_rows):
+        yield df.iloc[rows[i:i + chunk_rows], positions]
+
+
+def stream_csv_gz(df, columns, rows, chunk_rows: int = CHUNK_ROWS):
+    # wbits 16+: encabezado y cola gzip, así el archivo abre con gunzip.
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    header = True
+    for chunk in iter_chunks(df, columns, rows, chunk_rows):
+        data = compressor.compress(chunk.to_csv(index=False, header=header).encode("utf-8"))
+        header = False
+        if data:
+            yield data
+    if header:
+        yield compressor.compress(pd.DataFrame(columns=columns).to_csv(index=False).encode("utf-8"))
+    yield compressor.flush()
+
+
+class _Drain:
+    """Sink de escritura para pyarrow que junta bytes hasta que se los saca."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def stream_parquet(df, columns, rows, chunk_rows: int = CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _Drain()
+    # Esquema de un corte vacío, con las mismas posiciones que iter_chunks.
+    schema = pa.Schema.from_pandas(df.iloc[:0, df.columns.get_indexer(columns)], preserve_index=False)
+    with pq.ParquetWriter(sink, schema) as writer:
+        for chunk in iter_chunks(df, columns, rows, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_xlsx(df, columns, rows, chunk_rows: int = CHUNK_ROWS):
+    import xlsxwriter
+
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {
+            "constant_memory": True,
+            "default_date_format": "yyyy-mm-dd hh:mm:ss.000",
+        })
+        sheet, row = None, EXCEL_MAX_ROWS
+        for chunk in iter_chunks(df, columns, rows, chunk_rows):
+            # NaN/NaT como celdas vacías, igual que DataFrame.to_excel.
+            values = chunk.astype(object).where(chunk.notna(), None)
+            for record in values.itertuples(index=False, name=None):
+                if row >= EXCEL_MAX_ROWS:
+                    sheet = workbook.add_worksheet()
+                    sheet.write_row(0, 0, [str(c) for c in columns])
+                    row = 0
+                row += 1
+                sheet.write_row(row, 0, record)
+        if sheet is None:
+            workbook.add_worksheet().write_row(0, 0, [str(c) for c in columns])
+        workbook.close()
+        with open(path, "rb") as f:
+            yield from iter(lambda: f.read(1 << 20), b"")
+    finally:
+        os.remove(path)
+
+
+STREAMERS = {"xlsx": stream_xlsx, "csv.gz": stream_csv_gz, "parquet": stream_parquet}
+
+
+def export_url(fmt: str, key: str, session_id: str = "", columns=None, time_range=None,
+               route: str = EXPORT_ROUTE) -> str:
+    """URL de descarga para el link del visualizador."""
+    params = [("key", key), ("session", session_id or ""), ("format", fmt)]
+    params += [("column", c) for c in columns or []]
+    if time_range:
+        params += [("start", str(time_range[0])), ("end", str(time_range[1]))]
+    return f"{route}?{urlencode(params)}"
+
+
+def register_export_route(server, get_frame, filename: str = "torque_log", route: str = EXPORT_ROUTE):
+    """
+    Agrega al servidor Flask la ruta GET `route`. get_frame(session_id, key)
+    devuelve el DataFrame o None. Parámetros: key, session, format
+    (xlsx | csv.gz | parquet), column (repetible; todas si no se indica) y
+    start/end para limitar por `Time`.
+    """
+
+    def export():
+        fmt = request.args.get("format", "xlsx")
+        if fmt not in STREAMERS:
+            return Response("Formato no soportado.", status=400)
+        df = get_frame(request.args.get("session", ""), request.args.get("key", ""))
+        if df is None:
+            return Response("El archivo ya no está en memoria. Volvé a subirlo.", status=404)
+        columns = [c for c in request.args.getlist("column") if c in df.columns] or list(df.columns)
+        try:
+            rows = select_rows(df, "Time", request.args.get("start"), request.args.get("end"))
+        except (ValueError, TypeError):
+            return Response("Rango de tiempo inválido.", status=400)
+
+        mimetype, extension = FORMATS[fmt]
+        return Response(STREAMERS[fmt](df, columns, rows), mimetype=mimetype, headers={
+            "Content-Disposition": f'attachment; filename="{filename}.{extension}"',
+        })
+
+    server.add_url_rule(route, "torque_export", export)
@@ -0,0 +1,191 @@
+"""
+Parseo en segundo plano de logs grandes, con avance y resultado parcial.
+
+El callback de Dash (o la ruta de upload) sólo deja el archivo en disco y
+encola el trabajo; el parseo corre en un pool de procesos, así los threads
+del servidor web siguen atendiendo a los demás usuarios. Todo el estado vive
+en archivos de JOBS_DIR, para que cualquier proceso del servidor (gunicorn
+con varios workers) pueda consultarlo:
+
+- <clave>.json: etapa, filas leídas, fracción del archivo, error, fin.
+- <clave>.partial.feather: la primera sesión de un log con varias, lista
+  para mostrar mientras se parsea el resto (sólo con pyarrow).
+
+El frame final va a la biblioteca (LogLibrary) con torque_batch.import_one,
+igual que en la importación en lote.
+"""
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from torque_batch import import_one
+
+try:
+    from pyarrow import feather
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+JOBS_DIR = os.path.join(tempfile.gettempdir(), "torque_jobs")
+JOB_WORKERS = max(1, min(2, (os.cpu_count() or 1) // 2))
+JOB_MIN_BYTES = 5 << 20        # archivos más chicos se parsean en el callback
+PROGRESS_INTERVAL = 0.25       # segundos mínimos entre escrituras del avance
+JOB_STALE = 600.0              # un trabajo sin avance en este tiempo se da por muerto
+JOB_TTL = 3600.0               # estados de trabajos terminados que se conservan
+
+
+def _write_json(path: str, data: dict):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class JobProgress:
+    """Avance de un trabajo, escrito por el proceso que parsea."""
+
+    def __init__(self, key: str, directory: str = JOBS_DIR):
+        self.key = key
+        self.directory = directory
+        self.state = {"key": key, "stage": "queued", "rows": 0, "fraction": 0.0,
+                      "partial": False, "done": False, "error": None, "started": time.time()}
+        self._written = 0.0
+
+    def update(self, force: bool = False, **fields):
+        self.state.update(fields)
+        now = time.monotonic()
+        if force or now - self._written >= PROGRESS_INTERVAL:
+            self._written = now
+            _write_json(os.path.join(self.directory, f"{self.key}.json"), self.state)
+
+    def stage(self, name: str):
+        self.update(force=True, stage=name)
+
+    def rows(self, rows: int, fraction: float):
+        # Firma de progress en torque_parse.read_sessions.
+        self.update(stage="reading", rows=rows, fraction=round(fraction, 4))
+
+    def partial(self, df):
+        if not HAS_ARROW:
+            return  # sin vista previa: el log se muestra al terminar
+        path = os.path.join(self.directory, f"{self.key}.partial.feather")
+        tmp = f"{path}.{os.getpid()}.tmp"
+        feather.write_feather(df.reset_index(drop=True), tmp)
+        os.replace(tmp, path)
+        self.update(force=True, partial=True)
+
+
+def run_job(path: str, key: str, parse, library_dir: str, name: str = "", directory: str = JOBS_DIR) -> dict:
+    """
+    Corre en un proceso del pool: parse(path, progress) -> (df, error), y el
+    resultado se guarda en la biblioteca. Borra `path` al terminar.
+    """
+    progress = JobProgress(key, directory)
+    progress.stage("reading")
+
+    def parse_with_progress(p):
+        result = parse(p, progress)
+        progress.stage("saving")
+        return result
+
+    try:
+        result = import_one(path, parse_with_progress, library_dir, name)
+    except Exception as e:
+        result = {"path": path, "key": key, "status": "error", "error": str(e)}
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    if result["status"] == "error":
+        progress.update(force=True, stage="error", error=result.get("error") or "error", done=True)
+    else:
+        progress.update(force=True, stage="done", fraction=1.0, done=True)
+    return result
+
+
+class ParseJobs:
+    """Cola de parseos en un pool de procesos, con el estado en disco."""
+
+    def __init__(self, parse, library_dir: str, directory: str = JOBS_DIR, workers: int = JOB_WORKERS):
+        self.parse = parse
+        self.library_dir = library_dir
+        self.directory = directory
+        self.workers = workers
+        self._pool = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _status_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _partial_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.partial.feather")
+
+    def submit(self, path: str, key: str, name: str = ""):
+        """
+        Encola el parseo del archivo `path`, que se mueve a JOBS_DIR y pasa a
+        ser del trabajo. Si ya hay uno en curso para la misma clave, el
+        archivo se descarta.
+        """
+        if self.running(key):
+            os.remove(path)
+            return
+        self.expire()
+        self.clear(key)
+        fd, job_path = tempfile.mkstemp(suffix=".csv", prefix=f"{key}-", dir=self.directory)
+        os.close(fd)
+        os.replace(path, job_path)
+        JobProgress(key, self.directory).stage("queued")
+        if self._pool is None:
+            # Creado al primer uso: importar la app no levanta procesos.
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        self._pool.submit(run_job, job_path, key, self.parse, self.library_dir, name, self.directory)
+
+    def status(self, key: str):
+        """Estado del trabajo de `key`, o None si no hay."""
+        try:
+            with open(self._status_path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def running(self, key: str) -> bool:
+        """Hay un trabajo sin terminar para `key` que sigue dando señales de vida."""
+        status = self.status(key)
+        if status is None or status["done"]:
+            return False
+        try:
+            return time.time() - os.path.getmtime(self._status_path(key)) < JOB_STALE
+        except OSError:
+            return False
+
+    def partial(self, key: str):
+        """Primera sesión ya parseada, si el trabajo la dejó."""
+        if not HAS_ARROW:
+            return None
+        try:
+            return feather.read_feather(self._partial_path(key))
+        except OSError:
+            return None
+
+    def clear(self, key: str):
+        for path in (self._status_path(key), self._partial_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def expire(self, ttl: float = JOB_TTL):
+        """Borra estados y resultados parciales de trabajos viejos."""
+        limit = time.time() - ttl
+        for name in os.listdir(self.directory):
+            if name.endswith(".csv"):
+                continue  # archivos de trabajos en curso
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,239 @@
+"""
+Ingesta en vivo de Torque Pro ("Upload to web server" / real-time web upload).
+
+Torque manda una request HTTP por lectura con la sesión, el dispositivo, la
+hora y un parámetro por sensor:
+
+    GET /torque?v=8&session=1714567890123&id=<hash>&time=1714567891123&kd=54&kff1006=-34.6...
+
+y, aparte, requests con los nombres y unidades de cada PID
+(userFullName<pid>, userShortName<pid>, userUnit<pid>, defaultUnit<pid>).
+Espera "OK!" como respuesta.
+
+Cada sesión guarda las lecturas en un buffer columnar: un array por PID
+(float32) y uno de tiempos (int64 ms), que crecen duplicando capacidad. Las
+lecturas se juntan en una lista y se vuelcan a los arrays de a BATCH_ROWS,
+así la request sólo paga un append. read(since) devuelve las filas nuevas
+desde un índice, para que el dashboard sólo pida la diferencia.
+"""
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from flask import Response, jsonify, request
+
+LIVE_ROUTE = "/torque"
+BATCH_ROWS = 64                # lecturas por volcado al buffer columnar
+MAX_LIVE_ROWS = 200_000        # por sesión; al pasarlo se descarta la mitad vieja
+LIVE_SESSION_TTL = 3600.0      # sesiones sin datos durante este tiempo se borran
+MAX_LIVE_SESSIONS = 2000
+# PIDs de GPS de Torque, con los nombres que usan los CSV exportados.
+DEFAULT_NAMES = {
+    "kff1006": "Latitude",
+    "kff1005": "Longitude",
+    "kff1001": "GPS Speed (km/h)",
+    "kff1010": "Altitude",
+    "kff1007": "Bearing",
+}
+
+
+class LiveSession:
+    """Buffer columnar de una sesión de Torque en vivo. Seguro entre threads."""
+
+    def __init__(self, session_id: str, device: str = "", max_rows: int = MAX_LIVE_ROWS):
+        self.session_id = session_id
+        self.device = device
+        self.max_rows = max_rows
+        self.names = {}            # pid -> nombre completo (userFullName)
+        self.units = {}            # pid -> unidad (userUnit / defaultUnit)
+        self.last_seen = time.monotonic()
+        self._lock = threading.Lock()
+        self._pending = []         # [(time_ms, {pid: valor})] sin volcar
+        self._time = np.empty(1024, dtype=np.int64)
+        self._columns = {}         # pid -> array float32, misma capacidad que _time
+        self._rows = 0             # filas en los arrays
+        self._dropped = 0          # filas descartadas al inicio (índices globales)
+
+    def append(self, time_ms: int, values: dict):
+        with self._lock:
+            self._pending.append((time_ms, values))
+            self.last_seen = time.monotonic()
+            if len(self._pending) >= BATCH_ROWS:
+                self._flush()
+
+    def describe(self, pid: str, name: str | None = None, unit: str | None = None):
+        with self._lock:
+            if name:
+                self.names[pid] = name
+            if unit:
+                self.units[pid] = unit
+
+    def column_name(self, pid: str) -> str:
+        name = self.names.get(pid) or DEFAULT_NAMES.get(pid) or pid
+        unit = self.units.get(pid)
+        if unit and pid not in DEFAULT_NAMES and not name.endswith(f"({unit})"):
+            return f"{name} ({unit})"
+        return name
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._dropped + self._rows + len(self._pending)
+
+    def read(self, since: int = 0, pids=None):
+        """
+        Filas con índice global >= since: (próximo índice, tiempos en ms,
+        {pid: valores}). Con pids se devuelven sólo esas columnas.
+        """
+        with self._lock:
+            self._flush()
+            start = max(since - self._dropped, 0)
+            end = self._rows
+            wanted = self._columns if pids is None else {p: self._columns[p] for p in pids if p in self._columns}
+            return (self._dropped + end, self._time[start:end].copy(),
+                    {pid: values[start:end].copy() for pid, values in wanted.items()})
+
+    def frame(self) -> pd.DataFrame:
+        """La sesión entera como DataFrame, con las columnas ya nombradas."""
+        _, times, columns = self.read(0)
+        df = pd.DataFrame({self.column_name(pid): values for pid, values in columns.items()})
+        df.insert(0, "Time", pd.to_datetime(times, unit="ms"))
+        return df
+
+    # Los métodos con _ asumen el lock tomado.
+
+    def _flush(self):
+        batch = self._pending
+        if not batch:
+            return
+        self._pending = []
+        self._reserve(self._rows + len(batch))
+        rows = np.arange(self._rows, self._rows + len(batch))
+        self._time[rows] = [t for t, _ in batch]
+        # Agrupar por PID para escribir cada columna con una sola asignación.
+        by_pid = {}
+        for offset, (_, values) in enumerate(batch):
+            for pid, value in values.items():
+                by_pid.setdefault(pid, ([], []))
+                by_pid[pid][0].append(offset)
+                by_pid[pid][1].append(value)
+        for pid, (offsets, values) in by_pid.items():
+            column = self._columns.get(pid)
+            if column is None:
+                column = self._columns[pid] = np.full(len(self._time), np.nan, dtype=np.float32)
+            column[self._rows + np.asarray(offsets)] = values
+        self._rows += len(batch)
+        if self._rows > self.max_rows:
+            self._discard(self._rows - self.max_rows // 2)
+
+    def _reserve(self, rows: int):
+        capacity = len(self._time)
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        grown = np.empty(capacity, dtype=np.int64)
+        grown[:self._rows] = self._time[:self._rows]
+        self._time = grown
+        for pid, column in self._columns.items():
+            wider = np.full(capacity, np.nan, dtype=np.float32)
+            wider[:self._rows] = column[:self._rows]
+            self._columns[pid] = wider
+
+    def _discard(self, count: int):
+        keep = self._rows - count
+        self._time[:keep] = self._time[count:self._rows]
+        for column in self._columns.values():
+            column[:keep] = column[count:self._rows]
+            column[keep:] = np.nan
+        self._rows = keep
+        self._dropped += count
+
+
+class LiveStore:
+    """Sesiones en vivo por (dispositivo, sesión de Torque)."""
+
+    def __init__(self, ttl: float = LIVE_SESSION_TTL, max_sessions: int = MAX_LIVE_SESSIONS,
+                 max_rows: int = MAX_LIVE_ROWS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_rows = max_rows
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, session_id: str):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def _get_or_create(self, session_id: str, device: str) -> LiveSession:
+        with self._lock:
+            live = self._sessions.get(session_id)
+            if live is None:
+                self._expire()
+                live = self._sessions[session_id] = LiveSession(session_id, device, self.max_rows)
+            return live
+
+    def _expire(self):
+        # Con el lock tomado. Vencidas primero; si aun así sobran, las más viejas.
+        limit = time.monotonic() - self.ttl
+        for sid in [s for s, live in self._sessions.items() if live.last_seen < limit]:
+            del self._sessions[sid]
+        while len(self._sessions) >= self.max_sessions:
+            oldest = min(self._sessions, key=lambda s: self._sessions[s].last_seen)
+            del self._sessions[oldest]
+
+    def ingest(self, args) -> bool:
+        """
+        Procesa los parámetros de una request de Torque (cualquier mapping
+        str -> str). Devuelve False si no trae sesión.
+        """
+        session = args.get("session")
+        if not session:
+            return False
+        device = args.get("id", "")
+        live = self._get_or_create(f"{device[:8]}-{session}" if device else session, device)
+
+        values = {}
+        for name, raw in args.items():
+            if name.startswith("k"):
+                try:
+                    values[name] = float(raw)
+                except ValueError:
+                    continue
+            elif name.startswith("userFullName"):
+                live.describe("k" + name[len("userFullName"):], name=raw)
+            elif name.startswith("userUnit") or name.startswith("defaultUnit"):
+                pid = "k" + name[len("userUnit" if name.startswith("userUnit") else "defaultUnit"):]
+                live.describe(pid, unit=raw)
+        if values:
+            try:
+                time_ms = int(args.get("time") or time.time() * 1000)
+            except ValueError:
+                time_ms = int(time.time() * 1000)
+            live.append(time_ms, values)
+        return True
+
+    def sessions(self) -> list[dict]:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return sorted(({"id": s.session_id, "device": s.device, "rows": len(s),
+                        "idle_s": round(time.monotonic() - s.last_seen, 1)} for s in sessions),
+                      key=lambda s: s["idle_s"])
+
+
+def register_live_routes(server, store: LiveStore, route: str = LIVE_ROUTE):
+    """
+    Agrega al servidor Flask:
+    - `route`: la URL que se configura en Torque Pro (GET o POST), responde "OK!".
+    - `route`/sessions: sesiones activas, en JSON.
+    """
+
+    def ingest():
+        store.ingest(request.values)
+        return Response("OK!", mimetype="text/plain")
+
+    def sessions():
+        return jsonify(store.sessions())
+
+    server.add_url_rule(route, "torque_live_ingest", ingest, methods=["GET", "POST"])
+    server.add_url_rule(f"{route}/sessions", "torque_live_sessions", sessions)
@@ -0,0 +1,440 @@
+"""
+Lectura de CSV de Torque separando las sesiones de logging.
+
+Torque vuelve a escribir el header cada vez que reinicia el logging, así que
+cada repetición marca el comienzo de una sesión nueva. En vez de partir el
+archivo en una lista de líneas de Python y compararlas una a una, se buscan
+las repeticiones del header en los bytes (bytes.find, en C) en una sola
+pasada por bloques, y cada tramo entre headers se parsea con pandas como un
+frame propio, con su propia base de tiempo.
+
+parse_log_time() arma `Time` sin inferir el formato fila por fila: lo
+detecta en una muestra, lo recuerda por firma del header (mismo dispositivo
+y canales, mismo formato) y parsea la columna entera con formato fijo. El
+GPS Time en milisegundos desde la época se convierte directo.
+
+compact_frame() es la etapa posterior al parseo que achica el frame en
+memoria: canales a float32 cuando no se pierden dígitos, tiempo en int64 ns
+(datetime64[ns]) y sin las columnas de texto de las que sale `Time`.
+"""
+import hashlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 8 << 20  # 8 MB por lectura al buscar headers
+PROGRESS_ROWS = 200_000  # filas por bloque cuando se informa el avance
+NA_VALUES = ["-"]
+SESSION_COLUMN = "Session"
+ELAPSED_COLUMN = "Elapsed (s)"
+# Texto crudo del que se deriva `Time`; no hace falta una vez parseado.
+RAW_TIME_COLUMNS = ["Device Time", "GPS Time"]
+# Formatos conocidos de Device Time / GPS Time, en orden de prueba.
+TIME_FORMATS = [
+    "%d-%b-%Y %H:%M:%S.%f",          # Device Time: 01-May-2024 10:00:00.200
+    "%d-%b-%Y %H:%M:%S",
+    "%a %b %d %H:%M:%S GMT%z %Y",    # GPS Time: Wed May 01 10:00:00 GMT-03:00 2024
+    "%a %b %d %H:%M:%S %Z %Y",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M:%S",
+]
+EPOCH_MS = "epoch-ms"
+EPOCH_S = "epoch-s"
+TIME_SAMPLE = 200
+# Si con el formato recordado fallan más filas que esto, se vuelve a detectar.
+MAX_TIME_FAILURES = 0.01
+# (firma del header, columna) -> formato; None si no hubo formato fijo.
+_time_formats = {}
+
+# Dígitos significativos que tienen que sobrevivir al pasar a float32.
+FLOAT32_DIGITS = 7
+# TORQUE_FULL_PRECISION=1 deja todos los canales en float64.
+KEEP_FULL_PRECISION = os.environ.get("TORQUE_FULL_PRECISION") == "1"
+
+
+def find_header_offsets(f, header: bytes, start: int = 0, chunk_size: int = CHUNK_SIZE) -> list[int]:
+    """
+    Offsets (inicio de línea) de cada línea idéntica a `header` a partir de
+    `start`, leyendo el archivo binario f en bloques.
+    """
+    needle = b"\n" + header
+    offsets = []
+    f.seek(start)
+    # Si `start` es inicio de línea, simulamos el \n previo para no perder
+    # un header justo al comienzo del tramo.
+    carry = b"\n"
+    base = start - 1  # offset absoluto de carry[0]
+    while True:
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        data = carry + chunk
+        pos = 0
+        while True:
+            i = data.find(needle, pos)
+            if i < 0:
+                break
+            end = i + len(needle)
+            if end == len(data) and not eof:
+                # Falta el byte siguiente para confirmar el fin de línea;
+                # el match queda en el carry y se reevalúa con el bloque nuevo.
+                break
+            if end == len(data) or data[end:end + 1] in (b"\r", b"\n"):
+                offsets.append(base + i + 1)
+            pos = i + 1
+        if eof:
+            return offsets
+        keep = min(len(needle), len(data))
+        base += len(data) - keep
+        carry = data[len(data) - keep:]
+
+
+class FileSlice(io.RawIOBase):
+    """Vista de sólo lectura de los bytes [start, end) de un archivo abierto."""
+
+    def __init__(self, f, start: int, end: int):
+        self._f = f
+        self._pos = start
+        self._end = end
+
+    @property
+    def position(self) -> int:
+        """Offset absoluto hasta donde se leyó."""
+        return self._pos
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        remaining = self._end - self._pos
+        if remaining <= 0:
+            return 0
+        self._f.seek(self._pos)
+        view = memoryview(buffer)[:remaining]
+        n = self._f.readinto(view)
+        self._pos += n or 0
+        return n or 0
+
+
+def split_sessions(f, na_values=NA_VALUES, progress=None, on_session=None) -> list[pd.DataFrame]:
+    """
+    Parsea un CSV de Torque (archivo binario con seek) y devuelve un DataFrame
+    por sesión de logging, en orden. Los tramos vacíos (headers seguidos) se
+    descartan.
+
+    Con progress, cada sesión se lee en bloques de PROGRESS_ROWS filas y
+    después de cada bloque se llama progress(filas leídas, fracción del
+    archivo). on_session(número, df, última) recibe cada sesión apenas se
+    termina de leer, antes de parsear las siguientes.
+    """
+    f.seek(0)
+    first_line = f.readline()
+    body_start = f.tell()
+    header = first_line.lstrip(b"\xef\xbb\xbf").rstrip(b"\r\n")
+    if not header:
+        return []
+    # Mismo criterio de nombres que read_csv (espacios iniciales, duplicados).
+    columns = pd.read_csv(io.BytesIO(header), skipinitialspace=True, nrows=0).columns
+
+    f.seek(0, io.SEEK_END)
+    size = f.tell()
+    bounds = []
+    start = body_start
+    for offset in find_header_offsets(f, header, body_start):
+        bounds.append((start, offset))
+        f.seek(offset)
+        f.readline()
+        start = f.tell()
+    bounds.append((start, size))
+
+    sessions = []
+    rows = 0
+    bounds = [(start, end) for start, end in bounds if end - start > 2]
+    for i, (start, end) in enumerate(bounds):
+        piece = FileSlice(f, start, end)
+        reader = io.BufferedReader(piece)
+        options = dict(header=None, names=columns, skipinitialspace=True,
+                       na_values=na_values, encoding="utf-8")
+        if progress is None:
+            df = pd.read_csv(reader, **options)
+        else:
+            parts = []
+            with pd.read_csv(reader, chunksize=PROGRESS_ROWS, **options) as chunks:
+                for part in chunks:
+                    parts.append(part)
+                    rows += len(part)
+                    progress(rows, min(piece.position / max(size, 1), 1.0))
+            df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns)
+        if len(df):
+            sessions.append(df)
+            if on_session is not None:
+                on_session(len(sessions) - 1, df, i == len(bounds) - 1)
+    return sessions
+
+
+def read_sessions(f, na_values=NA_VALUES, progress=None, on_session=None) -> pd.DataFrame:
+    """
+    Igual que split_sessions, pero devuelve un solo frame con la columna
+    `Session` (0, 1, ...) para que los visualizadores puedan seguir
+    trabajando con un DataFrame y aun así distinguir los reinicios.
+    """
+    sessions = split_sessions(f, na_values, progress, on_session)
+    if not sessions:
+        return pd.DataFrame()
+    # concat en vez de df[col] = ...: con cien canales, agregar una columna
+    # a un frame recién leído lo fragmenta (y pandas avisa en cada log).
+    sessions = [pd.concat([df, pd.Series(number, index=df.index, name=SESSION_COLUMN)], axis=1)
+                for number, df in enumerate(sessions)]
+    if len(sessions) == 1:
+        return sessions[0]
+    return pd.concat(sessions, ignore_index=True)
+
+
+def add_elapsed(df: pd.DataFrame, time_column: str = "Time") -> pd.DataFrame:
+    """Frame con `Elapsed (s)`: segundos desde el inicio de cada sesión."""
+    if time_column not in df.columns or SESSION_COLUMN not in df.columns:
+        return df
+    start = df.groupby(SESSION_COLUMN)[time_column].transform("min")
+    elapsed = (df[time_column] - start).dt.total_seconds().rename(ELAPSED_COLUMN)
+    return pd.concat([df.drop(columns=ELAPSED_COLUMN, errors="ignore"), elapsed], axis=1)
+
+
+def header_signature(columns) -> str:
+    """Firma de un header de Torque: identifica dispositivo + canales elegidos."""
+    return hashlib.blake2b("\x1f".join(map(str, columns)).encode(), digest_size=8).hexdigest()
+
+
+def detect_time_format(sample: pd.Series):
+    """
+    Formato de una muestra sin nulos: EPOCH_MS / EPOCH_S si es numérica, el
+    primero de TIME_FORMATS que parsea toda la muestra, o None.
+    """
+    if pd.api.types.is_numeric_dtype(sample):
+        # Milisegundos desde 1970 tienen 13 dígitos hasta el año 2286.
+        return EPOCH_MS if sample.abs().median() > 1e11 else EPOCH_S
+    for fmt in TIME_FORMATS:
+        try:
+            pd.to_datetime(sample, format=fmt)
+        except (ValueError, TypeError):
+            continue
+        return fmt
+    return None
+
+
+_FIELD_WIDTHS = {"%d": 2, "%m": 2, "%b": 3, "%a": 3, "%Y": 4, "%H": 2, "%M": 2, "%S": 2, "%z": 6}
+# Abreviaturas de mes como enteros de 3 bytes, para compararlas vectorizado.
+_MONTHS = np.array([int.from_bytes(m.encode(), "big") for m in
+                    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")],
+                   dtype=np.uint32)
+_MONTH_ORDER = np.argsort(_MONTHS)
+
+
+def _fixed_width_layout(fmt: str):
+    """[(directiva o literal, inicio, ancho)] de un formato de ancho fijo, o None."""
+    layout, pos, i = [], 0, 0
+    while i < len(fmt):
+        if fmt[i] == "%":
+            directive = fmt[i:i + 2]
+            if directive == "%f" and i + 2 == len(fmt):
+                layout.append((directive, pos, None))  # el resto de la línea
+                return layout
+            if directive not in _FIELD_WIDTHS:
+                return None
+            layout.append((directive, pos, _FIELD_WIDTHS[directive]))
+            pos += _FIELD_WIDTHS[directive]
+            i += 2
+        else:
+            layout.append((fmt[i], pos, 1))
+            pos += 1
+            i += 1
+    return layout
+
+
+def _digits(block: np.ndarray) -> np.ndarray:
+    """Entero de cada fila de una matriz de dígitos (0-9)."""
+    value = np.zeros(len(block), dtype=np.int64)
+    for k in range(block.shape[1]):
+        value = value * 10 + block[:, k]
+    return value
+
+
+def parse_fixed_width(values: pd.Series, fmt: str):
+    """
+    Parseo vectorizado (numpy sobre la matriz de bytes) de textos de ancho
+    fijo en `fmt`, sin nulos. Devuelve datetime64[ns] o None si el formato o
+    algún valor no encaja, y entonces se usa pd.to_datetime.
+    """
+    layout = _fixed_width_layout(fmt)
+    if layout is None or not len(values):
+        return None
+    try:
+        raw = values.to_numpy(dtype=object).astype("S")
+    except (UnicodeEncodeError, ValueError):
+        return None
+    width = raw.dtype.itemsize
+    chars = raw.view(np.uint8).reshape(len(raw), width)
+    if (chars[:, -1] == 0).any():
+        return None  # largos distintos: no es de ancho fijo
+
+    fields = {"%H": 0, "%M": 0, "%S": 0, "%f": 0}
+    for directive, start, size in layout:
+        if size is None:
+            size = width - start
+            if size <= 0 or size > 9:
+                return None
+        elif start + size > width:
+            return None
+        if directive in ("%a", "%z"):
+            continue  # día de semana redundante; %z: se conserva la hora local
+        if len(directive) == 1:
+            if (chars[:, start] != ord(directive)).any():
+                return None
+            continue
+        if directive == "%b":
+            code = (chars[:, start].astype(np.uint32) << 16 | chars[:, start + 1].astype(np.uint32) << 8
+                    | chars[:, start + 2])
+            month = _MONTH_ORDER[np.minimum(np.searchsorted(_MONTHS[_MONTH_ORDER], code), 11)]
+            if (_MONTHS[month] != code).any():
+                return None
+            fields["%m"] = month + 1
+            continue
+        block = chars[:, start:start + size] - np.uint8(ord("0"))
+        if (block > 9).any():
+            return None
+        fields[directive] = _digits(block)
+        if directive == "%f":
+            fields[directive] *= 10 ** (9 - size)  # a nanosegundos
+    if not {"%Y", "%m", "%d"} <= fields.keys():
+        return None
+
+    months = (fields["%Y"] - 1970) * 12 + fields["%m"] - 1
+    month_start = months.astype("datetime64[M]").astype("datetime64[D]")
+    day = month_start + (fields["%d"] - 1).astype("timedelta64[D]")
+    # Días fuera del mes (31-Feb), horas 24+, etc.: que lo resuelva pandas.
+    if ((fields["%d"] < 1) | (day.astype("datetime64[M]") != months.astype("datetime64[M]"))
+            | (fields["%m"] > 12) | (fields["%H"] > 23) | (fields["%M"] > 59) | (fields["%S"] > 60)).any():
+        return None
+    nanos = (day.astype("datetime64[ns]").view(np.int64)
+             + ((fields["%H"] * 60 + fields["%M"]) * 60 + fields["%S"]) * 1_000_000_000 + fields["%f"])
+    return pd.Series(nanos.view("datetime64[ns]"), index=values.index, name=values.name)
+
+
+def _parse_with(values: pd.Series, fmt):
+    if fmt == EPOCH_MS:
+        return pd.to_datetime(values, unit="ms", errors="coerce")
+    if fmt == EPOCH_S:
+        return pd.to_datetime(values, unit="s", errors="coerce")
+    if fmt is not None and not values.isna().any():
+        parsed = parse_fixed_width(values, fmt)
+        if parsed is not None:
+            return parsed
+    if fmt is None:
+        # Sin formato fijo: inferencia por fila, la vía lenta.
+        parsed = pd.to_datetime(values, format="mixed", errors="coerce")
+    else:
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+    if isinstance(parsed.dtype, pd.DatetimeTZDtype):
+        # Hora local del dispositivo, como Device Time.
+        parsed = parsed.dt.tz_localize(None)
+    return parsed
+
+
+def parse_time_column(values: pd.Series, signature: str | None = None) -> pd.Series:
+    """
+    Convierte una columna de tiempo de Torque a datetime64 usando el formato
+    recordado para (signature, columna) o detectándolo en una muestra.
+    """
+    cache_key = (signature, values.name)
+    present = values.dropna()
+    if not len(present):
+        return pd.to_datetime(values, errors="coerce")
+    if signature and cache_key in _time_formats:
+        fmt = _time_formats[cache_key]
+    else:
+        step = max(len(present) // TIME_SAMPLE, 1)
+        fmt = detect_time_format(present.iloc[::step])
+    parsed = _parse_with(values, fmt)
+    failures = parsed.isna().sum() - values.isna().sum()
+    if fmt is not None and failures > MAX_TIME_FAILURES * len(present):
+        # El formato recordado ya no sirve (otra configuración regional).
+        fmt = None
+        parsed = _parse_with(values, fmt)
+    if signature:
+        _time_formats[cache_key] = fmt
+    return parsed
+
+
+def parse_log_time(df: pd.DataFrame):
+    """
+    Serie `Time` del log: Device Time si está, si no GPS Time. None si el log
+    no tiene ninguna de las dos o no se pudo parsear ninguna fila.
+    """
+    signature = header_signature(df.columns)
+    for col in ("Device Time", "GPS Time"):
+        if col in df.columns:
+            parsed = parse_time_column(df[col], signature)
+            return parsed if parsed.notna().any() else None
+    return None
+
+
+def fits_float32(values: np.ndarray, digits: int = FLOAT32_DIGITS) -> bool:
+    """
+    True si todos los valores vuelven iguales al pasar por float32 y
+    redondear a `digits` cifras significativas, es decir, si el CSV no traía
+    más precisión que la que float32 conserva (velocidades, temperaturas,
+    presiones; no latitud/longitud con 6 decimales).
+    """
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return True
+    if np.abs(finite).max() > np.finfo(np.float32).max:
+        return False
+    nonzero = finite[finite != 0]
+    scale = 10.0 ** (digits - 1 - np.floor(np.log10(np.abs(nonzero))))
+    restored = np.round(nonzero.astype(np.float32).astype(np.float64) * scale) / scale
+    return bool(np.allclose(restored, nonzero, rtol=1e-12, atol=0))
+
+
+def compact_frame(df: pd.DataFrame, keep_precision: bool = KEEP_FULL_PRECISION, time_column: str = "Time"):
+    """
+    Achica un frame recién parseado, en el lugar. Devuelve (df, reporte) con
+    los bytes antes/después y las columnas convertidas o descartadas.
+
+    - Columnas de fecha: datetime64[ns] (int64 de nanosegundos).
+    - Si `time_column` quedó parseada, se descartan RAW_TIME_COLUMNS.
+    - Salvo keep_precision, canales float64 a float32 si fits_float32().
+    - Enteros chicos (como `Session`) al menor entero que los contiene.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    report = {"bytes_before": before, "float32": [], "dropped": []}
+
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]) and df[col].dtype != "datetime64[ns]":
+            df[col] = df[col].astype("datetime64[ns]")
+
+    if time_column in df.columns and df[time_column].notna().any():
+        report["dropped"] = [c for c in RAW_TIME_COLUMNS if c in df.columns and c != time_column]
+        df.drop(columns=report["dropped"], inplace=True)
+
+    if not keep_precision:
+        for col in df.columns:
+            if df[col].dtype == np.float64 and fits_float32(df[col].to_numpy()):
+                df[col] = df[col].astype(np.float32)
+                report["float32"].append(col)
+            elif df[col].dtype == np.int64:
+                df[col] = pd.to_numeric(df[col], downcast="integer")
+
+    report["bytes_after"] = int(df.memory_usage(deep=True).sum())
+    report["bytes_saved"] = before - report["bytes_after"]
+    return df, report
+
+
+def format_compaction(report: dict) -> str:
+    """Una línea para el log del servidor con lo que ahorró compact_frame()."""
+    mb = 1 << 20
+    return (f"Frame compactado: {report['bytes_before'] / mb:.1f} MB -> "
+            f"{report['bytes_after'] / mb:.1f} MB ({len(report['float32'])} canales a float32, "
+            f"{len(report['dropped'])} columnas de texto descartadas)")
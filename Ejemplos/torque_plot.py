@@ -0,0 +1,272 @@
+"""
+Ayudas de graficado para los visualizadores de Torque.
+
+Un log de varias horas a 10 Hz tiene cientos de miles de puntos y Plotly no
+los necesita: el gráfico tiene ~1000 píxeles de ancho. decimate_frame()
+divide el rango visible en baldes de tiempo (uno por píxel) y conserva, por
+balde, la fila del mínimo y la del máximo, así los picos siguen viéndose. Al
+hacer zoom (relayoutData) se vuelve a decimar sólo el rango visible, y con un
+rango corto aparecen todos los puntos originales.
+
+resample_channels() hace lo mismo para varios canales a la vez, sobre una
+base de tiempo común: el gráfico multicanal comparte el eje x entre
+subplots y cada balde se reduce para todos los canales con un solo
+reduceat sobre la matriz de valores.
+
+Para el mapa pasa lo mismo con la cantidad de puntos GPS: grid_aggregate()
+agrupa los puntos del viewport en una grilla (media, máximo y cantidad de
+la métrica por celda) y GeoIndex resuelve qué puntos caen en el viewport sin
+recorrer el frame entero, así el relayout del mapa responde rápido y los
+puntos crudos se muestran sólo cuando el viewport es chico.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_BUCKETS = 1000  # ~ancho en píxeles del gráfico
+GRID_CELLS = 120        # celdas de la grilla a lo ancho del viewport
+RAW_POINT_LIMIT = 5000  # con menos puntos en el viewport se muestran crudos
+GAP_BUCKETS = 3         # baldes vacíos seguidos a partir de los cuales se corta la línea
+
+
+def minmax_indices(x: np.ndarray, y: np.ndarray, n_buckets: int = DEFAULT_BUCKETS) -> np.ndarray:
+    """
+    Posiciones (ordenadas) de las filas a graficar: mínimo y máximo de y en
+    cada uno de n_buckets baldes de igual ancho en x. x debe estar ordenado
+    y y no debe tener NaN.
+    """
+    n = len(x)
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+
+    edges = np.linspace(x[0], x[-1], n_buckets + 1)
+    bucket = np.clip(np.searchsorted(edges, x, side="right") - 1, 0, n_buckets - 1)
+    # Como x está ordenado, cada balde es un tramo contiguo: reduceat sobre
+    # los comienzos de tramo da el mínimo y el máximo de cada uno.
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    lows = np.minimum.reduceat(y, starts)
+    highs = np.maximum.reduceat(y, starts)
+    run = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+
+    # Primera fila de cada tramo que alcanza su mínimo / máximo.
+    is_low = y == lows[run]
+    is_high = y == highs[run]
+    low_rows = np.flatnonzero(is_low)[np.unique(run[is_low], return_index=True)[1]]
+    high_rows = np.flatnonzero(is_high)[np.unique(run[is_high], return_index=True)[1]]
+    return np.union1d(low_rows, high_rows)
+
+
+def decimate_frame(df: pd.DataFrame, x_column: str, y_column: str, x_range=None,
+                   n_buckets: int = DEFAULT_BUCKETS) -> pd.DataFrame:
+    """
+    Filas de df a graficar para y_column contra x_column (datetime o
+    numérica), limitadas a x_range=(inicio, fin) si se indica. Conserva
+    todas las columnas, así hover_data y line_group siguen funcionando.
+    """
+    # Todo sobre posiciones (arrays de numpy): el frame se toca una sola vez,
+    # al final, para sacar las pocas filas elegidas; con cien canales,
+    # dropna u ordenar el frame copiaría todas sus columnas.
+    x = df[x_column].to_numpy()
+    y = df[y_column].to_numpy(dtype=float, na_value=np.nan)
+    rows = np.flatnonzero(~(pd.isna(x) | np.isnan(y)))
+    x = x[rows]
+    if len(x) > 1 and (x[1:] < x[:-1]).any():
+        order = np.argsort(x, kind="stable")
+        rows, x = rows[order], x[order]
+    if x_range is not None:
+        lo, hi = (_as_x(v, x.dtype) for v in x_range)
+        # Un punto de margen a cada lado para que la línea llegue al borde.
+        first = max(np.searchsorted(x, lo, side="left") - 1, 0)
+        last = min(np.searchsorted(x, hi, side="right") + 1, len(x))
+        rows, x = rows[first:last], x[first:last]
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.view("int64")
+    return df.iloc[rows[minmax_indices(x.astype(float), y[rows], n_buckets)]]
+
+
+def resample_channels(df: pd.DataFrame, index, channels, x_range=None,
+                      n_buckets: int = DEFAULT_BUCKETS) -> pd.DataFrame:
+    """
+    Canales de df llevados a una base de tiempo común, dentro de x_range.
+    index es el TimeIndex del frame (filas ordenadas por tiempo). Devuelve un
+    frame con `Time` y una columna por canal:
+
+    - con pocas filas en el rango (hasta 2 por balde), las filas originales;
+    - si no, dos filas por balde (mínimo y máximo de cada canal, en el centro
+      del balde), calculadas para todos los canales con un fmin/fmax.reduceat
+      sobre la matriz canales x filas.
+
+    En las pausas (más de GAP_BUCKETS baldes sin datos, p. ej. entre
+    sesiones) se inserta una fila toda NaN, para cortar la línea ahí.
+    """
+    lo, hi = index.bounds(*(x_range or (None, None)))
+    # Un punto de margen a cada lado para que la línea llegue al borde.
+    lo, hi = max(lo - 1, 0), min(hi + 1, len(index))
+    rows = index.order[lo:hi]
+    times = index.times[lo:hi]
+    # Canal por fila (reduceat sobre el eje contiguo) y en float32, como
+    # quedan las columnas en compact_frame: alcanza para graficar.
+    matrix = np.empty((len(channels), len(rows)), dtype=np.float32)
+    for i, channel in enumerate(channels):
+        matrix[i] = df[channel].to_numpy(dtype=np.float32, na_value=np.nan)[rows]
+
+    if len(rows) <= 2 * n_buckets:
+        x, values = times.astype(float), matrix.T
+        # Sin baldes, una pausa es un salto mucho mayor que el paso habitual.
+        step = np.diff(x)
+        limit = GAP_BUCKETS * max((x[-1] - x[0]) / n_buckets, np.median(step)) if len(step) else 0
+        breaks = np.flatnonzero(step > limit) + 1
+        gap_x = x[breaks - 1]
+    else:
+        edges = np.linspace(times[0], times[-1], n_buckets + 1)
+        bucket = np.clip(np.searchsorted(edges, times, side="right") - 1, 0, n_buckets - 1)
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        with np.errstate(invalid="ignore"):
+            lows = np.fmin.reduceat(matrix, starts, axis=1)
+            highs = np.fmax.reduceat(matrix, starts, axis=1)
+        used = bucket[starts]
+        centers = (edges[used] + edges[used + 1]) / 2
+        values = np.empty((2 * len(starts), len(channels)), dtype=np.float32)
+        values[0::2] = lows.T
+        values[1::2] = highs.T
+        x = np.repeat(centers, 2)
+        gaps = np.flatnonzero(np.diff(used) > GAP_BUCKETS) + 1
+        breaks, gap_x = 2 * gaps, centers[gaps - 1]
+
+    if len(breaks):
+        values = np.insert(values, breaks, np.nan, axis=0)
+        x = np.insert(x, breaks, gap_x)
+    data = pd.DataFrame(values, columns=list(channels))
+    data.insert(0, "Time", pd.to_datetime(x.astype(np.int64)))
+    return data
+
+
+def shared_x_range(relayout_data):
+    """
+    Como relayout_range, para subplots con el eje x compartido: el zoom
+    llega como xaxis, xaxis2, ... según el subplot donde se hizo.
+    """
+    for name in relayout_data or {}:
+        axis = name.split(".")[0]
+        if axis == "xaxis" or (axis.startswith("xaxis") and axis[5:].isdigit()):
+            x_range = relayout_range(relayout_data, axis)
+            if x_range is not False:
+                return x_range
+    return False
+
+
+def _as_x(value, dtype):
+    """Convierte un borde de rango de Plotly (texto o número) al tipo de x."""
+    if np.issubdtype(dtype, np.datetime64):
+        return pd.Timestamp(value).to_datetime64().astype(dtype)
+    return np.asarray(float(value), dtype=dtype)
+
+
+def relayout_range(relayout_data, axis: str = "xaxis"):
+    """
+    Rango pedido por el usuario en un relayoutData de Plotly: (inicio, fin),
+    None si volvió al autorange, o False si el evento no cambia ese eje.
+    """
+    if not relayout_data:
+        return False
+    if relayout_data.get(f"{axis}.autorange"):
+        return None
+    if f"{axis}.range[0]" in relayout_data:
+        return relayout_data[f"{axis}.range[0]"], relayout_data[f"{axis}.range[1]"]
+    if f"{axis}.range" in relayout_data:
+        return tuple(relayout_data[f"{axis}.range"])
+    return False
+
+
+def brushed_range(time_range, key):
+    """
+    Rango (inicio, fin) guardado en el Store 'time-range' al hacer zoom en el
+    gráfico temporal, o None si no hay o es de otro log.
+    """
+    if not time_range or time_range.get("key") != key or not time_range.get("range"):
+        return None
+    return tuple(time_range["range"])
+
+
+class GeoIndex:
+    """
+    Índice espacial de los puntos GPS de un frame: posiciones de fila
+    ordenadas por latitud. Una consulta por viewport es un searchsorted sobre
+    la latitud y un filtro sobre la longitud del tramo resultante.
+    """
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        order = valid[np.argsort(lat[valid], kind="stable")]
+        self.rows = order
+        self.lat = lat[order]
+        self.lon = lon[order]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.lat.nbytes + self.lon.nbytes
+
+    def bounds(self):
+        """(oeste, sur, este, norte) de todos los puntos."""
+        if not len(self.rows):
+            return None
+        return float(self.lon.min()), float(self.lat[0]), float(self.lon.max()), float(self.lat[-1])
+
+    def query(self, bounds=None) -> np.ndarray:
+        """Posiciones de fila (en orden original) dentro de bounds."""
+        if bounds is None:
+            return np.sort(self.rows)
+        west, south, east, north = bounds
+        lo = np.searchsorted(self.lat, south, side="left")
+        hi = np.searchsorted(self.lat, north, side="right")
+        lon = self.lon[lo:hi]
+        return np.sort(self.rows[lo:hi][(lon >= west) & (lon <= east)])
+
+
+def grid_aggregate(lat: np.ndarray, lon: np.ndarray, values: np.ndarray, bounds,
+                   cells: int = GRID_CELLS) -> pd.DataFrame:
+    """
+    Agrupa puntos en celdas cuadradas (en grados) de bounds/cells de lado.
+    Devuelve una fila por celda ocupada: centro (Latitude, Longitude) y
+    media, máximo y cantidad de values.
+    """
+    west, south, east, north = bounds
+    size = max(east - west, north - south) / cells or 1e-6
+    ix = np.floor((lon - west) / size).astype(np.int64)
+    iy = np.floor((lat - south) / size).astype(np.int64)
+    cell = iy * (cells + 1) + ix
+    grouped = pd.DataFrame({"cell": cell, "value": values}).groupby("cell", sort=False)["value"]
+    agg = grouped.agg(["mean", "max", "count"])
+    codes = agg.index.to_numpy()
+    agg["Latitude"] = south + (codes // (cells + 1) + 0.5) * size
+    agg["Longitude"] = west + (codes % (cells + 1) + 0.5) * size
+    return agg.reset_index(drop=True)
+
+
+def viewport_bounds(relayout_data, subplot: str = "map", width_px: int = 1000, height_px: int = 500):
+    """
+    Viewport (oeste, sur, este, norte) de un relayoutData de mapa, o None si
+    el evento no lo trae. Usa las esquinas que reporta Plotly
+    ('map._derived'); si no están, lo estima con el centro y el zoom.
+    """
+    if not relayout_data:
+        return None
+    derived = relayout_data.get(f"{subplot}._derived")
+    if derived and derived.get("coordinates"):
+        lons = [c[0] for c in derived["coordinates"]]
+        lats = [c[1] for c in derived["coordinates"]]
+        return min(lons), min(lats), max(lons), max(lats)
+    center = relayout_data.get(f"{subplot}.center")
+    zoom = relayout_data.get(f"{subplot}.zoom")
+    if center is None or zoom is None:
+        return None
+    # Grados por píxel en Web Mercator (teselas de 512 px en MapLibre).
+    deg_per_px = 360.0 / (512 * 2 ** zoom)
+    half_w = deg_per_px * width_px / 2
+    half_h = deg_per_px * height_px / 2 * np.cos(np.radians(center["lat"]))
+    return (float(center["lon"] - half_w), float(center["lat"] - half_h),
+            float(center["lon"] + half_w), float(center["lat"] + half_h))
@@ -0,0 +1,222 @@
+"""
+Resumen por columna de un log de Torque, calculado una sola vez al cargarlo.
+
+La tabla de estadísticas pedía media, máximo, mínimo y cuatro np.percentile
+por separado (cada uno ordena la columna de nuevo) en cada cambio de métrica.
+summarize_columns() recorre cada columna numérica una vez: los cuatro
+cuantiles salen de un único np.partition, y el resultado queda guardado junto
+al frame en el cache, así el panel de estadísticas y la lista de métricas se
+arman leyendo una fila. trip_info() resume el viaje entero (inicio, duración,
+distancia) para la biblioteca de logs, binned_profile() compara un canal
+entre varios viajes y TimeIndex da el mismo resumen para un rango de tiempo.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from torque_parse import SESSION_COLUMN
+
+TRIP_COLUMN = "Trip"
+PROFILE_BINS = 40
+RANGE_BLOCK = 1024  # filas por bloque de mínimos/máximos en TimeIndex
+INDEX_COLUMNS = 8   # columnas con sumas acumuladas que guarda cada TimeIndex
+QUANTILES = (0.25, 0.50, 0.75, 0.90)
+EARTH_RADIUS_KM = 6371.0088
+SUMMARY_FIELDS = ["count", "nan_count", "mean", "min", "max", "first", "last",
+                  "p25", "p50", "p75", "p90"]
+
+
+def column_quantiles(values: np.ndarray, quantiles=QUANTILES) -> np.ndarray:
+    """
+    Cuantiles de values (sin NaN) con la misma interpolación lineal que
+    np.percentile, pero con una sola partición para todos.
+    """
+    n = len(values)
+    if n == 0:
+        return np.full(len(quantiles), np.nan)
+    positions = np.asarray(quantiles) * (n - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, n - 1)
+    part = np.partition(values, np.unique(np.r_[lower, upper]))
+    frac = positions - lower
+    return part[lower] + (part[upper] - part[lower]) * frac
+
+
+def summarize_column(series: pd.Series) -> dict:
+    values = series.to_numpy(dtype=float, na_value=np.nan)
+    valid = ~np.isnan(values)
+    data = values[valid]
+    summary = dict.fromkeys(SUMMARY_FIELDS, np.nan)
+    summary["count"] = len(data)
+    summary["nan_count"] = len(values) - len(data)
+    if len(data):
+        summary.update(mean=data.mean(), min=data.min(), max=data.max(),
+                       first=data[0], last=data[-1])
+        for name, value in zip(("p25", "p50", "p75", "p90"), column_quantiles(data)):
+            summary[name] = value
+    return summary
+
+
+def summarize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Una fila por columna numérica de df (en el orden del frame) con
+    SUMMARY_FIELDS. Las columnas no numéricas no aparecen, así el índice
+    sirve también como lista de métricas graficables.
+    """
+    rows = {col: summarize_column(df[col]) for col in df.columns
+            if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])}
+    return pd.DataFrame.from_dict(rows, orient="index", columns=SUMMARY_FIELDS)
+
+
+def track_distance_km(lat: np.ndarray, lon: np.ndarray) -> float:
+    """Largo del recorrido (haversine entre puntos consecutivos), sin NaN."""
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    lat = np.radians(lat[valid])
+    lon = np.radians(lon[valid])
+    if len(lat) < 2:
+        return 0.0
+    a = (np.sin(np.diff(lat) / 2) ** 2
+         + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2)
+    return float(2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a)).sum())
+
+
+def trip_info(df: pd.DataFrame, time_column: str = "Time") -> dict:
+    """
+    Inicio, duración (s) y distancia (km) del log. Con varias sesiones se
+    suman las de cada una: la pausa entre sesiones no cuenta como viaje.
+    """
+    info = {"start": None, "duration_s": None, "distance_km": None}
+    groups = [df] if SESSION_COLUMN not in df.columns else [g for _, g in df.groupby(SESSION_COLUMN)]
+    if time_column in df.columns and df[time_column].notna().any():
+        info["start"] = df[time_column].min().isoformat()
+        info["duration_s"] = float(sum(
+            (g[time_column].max() - g[time_column].min()).total_seconds()
+            for g in groups if g[time_column].notna().any()))
+    if "Latitude" in df.columns and "Longitude" in df.columns:
+        info["distance_km"] = round(sum(
+            track_distance_km(g["Latitude"].to_numpy(dtype=float), g["Longitude"].to_numpy(dtype=float))
+            for g in groups), 3)
+    return info
+
+
+def binned_profile(frames: dict, x: str, y: str, bins: int = PROFILE_BINS) -> pd.DataFrame:
+    """
+    Perfil de `y` en función de `x` por viaje: {nombre: frame} -> una fila
+    por (viaje, intervalo de x) con el centro del intervalo, media, mínimo,
+    máximo y cantidad de muestras de y. Los intervalos son los mismos para
+    todos los viajes (por ejemplo temperatura del refrigerante por
+    velocidad, auto por auto) y todo sale de un solo groupby.
+    """
+    parts = [pd.DataFrame({TRIP_COLUMN: name, x: df[x].to_numpy(dtype=float), y: df[y].to_numpy(dtype=float)})
+             for name, df in frames.items() if x in df.columns and y in df.columns]
+    if not parts:
+        return pd.DataFrame(columns=[TRIP_COLUMN, x, "mean", "min", "max", "count"])
+    data = pd.concat(parts, ignore_index=True).dropna()
+    data[TRIP_COLUMN] = data[TRIP_COLUMN].astype("category")
+    if data.empty:
+        return pd.DataFrame(columns=[TRIP_COLUMN, x, "mean", "min", "max", "count"])
+    edges = np.linspace(data[x].min(), data[x].max(), bins + 1)
+    data["bin"] = np.clip(np.searchsorted(edges, data[x].to_numpy(), side="right") - 1, 0, bins - 1)
+    profile = (data.groupby([TRIP_COLUMN, "bin"], observed=True)[y]
+               .agg(["mean", "min", "max", "count"]).reset_index())
+    profile.insert(1, x, (edges[profile["bin"]] + edges[profile["bin"] + 1]) / 2)
+    return profile.drop(columns="bin")
+
+
+class TimeIndex:
+    """
+    Índice por tiempo de un log para estadísticas de un rango (brushing).
+
+    Guarda las filas ordenadas por tiempo; un rango [inicio, fin] son dos
+    searchsorted. Por cada columna consultada se arman, una sola vez, sumas
+    y cantidades acumuladas (media del rango en O(1)) y mínimos/máximos por
+    bloques de RANGE_BLOCK filas (mínimo y máximo del rango recorriendo sólo
+    los bloques de las puntas). Los cuantiles sí se calculan sobre el tramo.
+
+    Cada columna ocupa ~24 bytes por fila: se guardan sólo las últimas
+    `max_columns` consultadas, y nbytes dice cuánto ocupa el índice.
+    """
+
+    def __init__(self, times: pd.Series, max_columns: int = INDEX_COLUMNS):
+        ns = times.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+        valid = np.flatnonzero(times.notna().to_numpy())
+        self.order = valid[np.argsort(ns[valid], kind="stable")]
+        self.times = ns[self.order]
+        self.max_columns = max_columns
+        self._columns = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            columns = sum(a.nbytes for column in self._columns.values() for a in column)
+        return self.order.nbytes + self.times.nbytes + columns
+
+    def bounds(self, start=None, end=None):
+        """Posiciones [lo, hi) del rango dentro del orden por tiempo."""
+        lo = 0 if start is None else int(np.searchsorted(self.times, pd.Timestamp(start).value, "left"))
+        hi = len(self.times) if end is None else int(np.searchsorted(self.times, pd.Timestamp(end).value, "right"))
+        return lo, max(lo, hi)
+
+    def rows(self, start=None, end=None) -> np.ndarray:
+        """Filas del frame (posiciones) dentro del rango, en orden de tiempo."""
+        lo, hi = self.bounds(start, end)
+        return self.order[lo:hi]
+
+    def _column(self, name: str, values: pd.Series):
+        with self._lock:
+            column = self._columns.get(name)
+            if column is not None:
+                self._columns.move_to_end(name)
+        if column is None:
+            data = values.to_numpy(dtype=float, na_value=np.nan)[self.order]
+            valid = ~np.isnan(data)
+            sums = np.zeros(len(data) + 1)
+            np.cumsum(np.where(valid, data, 0.0), out=sums[1:])
+            counts = np.zeros(len(data) + 1, dtype=np.int64)
+            np.cumsum(valid, out=counts[1:])
+            pad = -len(data) % RANGE_BLOCK
+            blocks = np.concatenate([data, np.full(pad, np.nan)]).reshape(-1, RANGE_BLOCK)
+            block_min = np.fmin.reduce(blocks, axis=1) if len(blocks) else blocks[:, 0]
+            block_max = np.fmax.reduce(blocks, axis=1) if len(blocks) else blocks[:, 0]
+            column = (data, sums, counts, block_min, block_max)
+            with self._lock:
+                self._columns[name] = column
+                while len(self._columns) > self.max_columns:
+                    self._columns.popitem(last=False)
+        return column
+
+    def _extreme(self, data, blocks, reduce, lo: int, hi: int) -> float:
+        first, last = lo // RANGE_BLOCK, (hi - 1) // RANGE_BLOCK
+        if first == last:
+            parts = [data[lo:hi]]
+        else:
+            parts = [data[lo:(first + 1) * RANGE_BLOCK], blocks[first + 1:last], data[last * RANGE_BLOCK:hi]]
+        return float(reduce(np.concatenate(parts)))
+
+    def summary(self, name: str, values: pd.Series, start=None, end=None) -> dict:
+        """SUMMARY_FIELDS de la columna `name` (valores `values`) en el rango."""
+        data, sums, counts, block_min, block_max = self._column(name, values)
+        lo, hi = self.bounds(start, end)
+        summary = dict.fromkeys(SUMMARY_FIELDS, np.nan)
+        count = int(counts[hi] - counts[lo])
+        summary["count"] = count
+        summary["nan_count"] = (hi - lo) - count
+        if count:
+            with np.errstate(all="ignore"):
+                summary["min"] = self._extreme(data, block_min, np.fmin.reduce, lo, hi)
+                summary["max"] = self._extreme(data, block_max, np.fmax.reduce, lo, hi)
+            summary["mean"] = (sums[hi] - sums[lo]) / count
+            # Primera y última fila válida del rango, con las cantidades acumuladas.
+            summary["first"] = data[np.searchsorted(counts, counts[lo] + 1) - 1]
+            summary["last"] = data[np.searchsorted(counts, counts[hi]) - 1]
+            segment = data[lo:hi]
+            for field, value in zip(("p25", "p50", "p75", "p90"),
+                                    column_quantiles(segment[~np.isnan(segment)])):
+                summary[field] = value
+        return summary
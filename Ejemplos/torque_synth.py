@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Generador de logs sintéticos de Torque, para medir el parseo y los gráficos
+con archivos de cualquier tamaño (bench_torque.py).
+
+El CSV imita lo que escribe Torque Pro:
+- el header completo se repite al comienzo de cada sesión de logging, con
+  una pausa de SESSION_GAP entre una sesión y la siguiente;
+- GPS Time ("Wed May 01 10:00:00 GMT-03:00 2024") y Device Time
+  ("01-May-2024 10:00:00.200") a --hz lecturas por segundo;
+- un recorrido GPS continuo (posición integrada de la velocidad y el rumbo),
+  sin fix durante los primeros GPS_FIX_SECONDS de cada sesión;
+- `-` en las lecturas que faltan (--na por celda) y en los PIDs que el auto
+  no soporta (uno cada UNSUPPORTED_EVERY canales);
+- canales con nombres y unidades de Torque que siguen la velocidad
+  (RPM, carga, MAF...), se calientan (temperaturas), oscilan o acumulan.
+
+Las filas se generan y escriben de a CHUNK_ROWS, así 10M de filas no
+necesitan más memoria que 10k. El texto lo arma pyarrow (write_csv), que es
+~10 veces más rápido que DataFrame.to_csv para cien columnas.
+
+Uso: python3 torque_synth.py salida.csv [--rows 1000000] [--channels 100] [--sessions 3]
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+
+CHUNK_ROWS = 50_000
+SESSION_GAP = pd.Timedelta(hours=2)
+GPS_FIX_SECONDS = 15.0
+UNSUPPORTED_EVERY = 25
+WARMUP_SECONDS = 400.0
+START = pd.Timestamp("2024-05-01 08:00:00")
+ORIGIN = (-34.6037, -58.3816)  # latitud, longitud del primer fix
+GPS_TIME_FORMAT = "%a %b %d %H:%M:%S GMT-03:00 %Y"
+DEVICE_TIME_FORMAT = "%d-%b-%Y %H:%M:%S"
+
+# Primeras columnas de cualquier log de Torque, con los espacios del original.
+BASE_HEADER = ["GPS Time", " Device Time", " Longitude", " Latitude", "GPS Speed (Meters/second)",
+               " Horizontal Dilution of Precision", " Altitude", " Bearing", " G(x)", " G(y)", " G(z)",
+               " G(calibrated)"]
+
+# PIDs de Torque: (nombre, mínimo, máximo, decimales, tipo). Tipos:
+# drive sigue la velocidad, warm sube hasta la temperatura de régimen,
+# wave oscila con período propio; distance es la distancia recorrida por
+# `máximo` (km, litros) y elapsed los segundos desde el comienzo.
+PIDS = [
+    ("Engine RPM(rpm)", 750, 4200, 0, "drive"),
+    ("Speed (OBD)(km/h)", 0, 120, 0, "drive"),
+    ("Engine Coolant Temperature(°C)", 20, 92, 0, "warm"),
+    ("Intake Air Temperature(°C)", 18, 45, 0, "warm"),
+    ("Engine Load(%)", 15, 85, 1, "drive"),
+    ("Throttle Position(Manifold)(%)", 12, 70, 1, "drive"),
+    ("Mass Air Flow Rate(g/s)", 2, 60, 2, "drive"),
+    ("Intake Manifold Pressure(psi)", 4, 14.5, 2, "drive"),
+    ("Fuel Trim Bank 1 Short Term(%)", -8, 8, 1, "wave"),
+    ("Fuel Trim Bank 1 Long Term(%)", -4, 4, 1, "wave"),
+    ("Timing Advance(°)", 5, 35, 1, "drive"),
+    ("O2 Volts Bank 1 sensor 1(V)", 0.1, 0.9, 3, "wave"),
+    ("Voltage (Control Module)(V)", 13.6, 14.4, 2, "wave"),
+    ("Barometric pressure (from vehicle)(psi)", 14.6, 14.8, 2, "wave"),
+    ("Fuel Level (From Engine ECU)(%)", 40, 80, 1, "wave"),
+    ("Ambient air temp(°C)", 16, 24, 0, "wave"),
+    ("Catalyst Temperature (Bank 1 Sensor 1)(°C)", 150, 700, 1, "warm"),
+    ("Engine Oil Temperature(°C)", 20, 105, 0, "warm"),
+    ("Accelerator PedalPosition D(%)", 14, 80, 1, "drive"),
+    ("Relative Throttle Position(%)", 0, 60, 1, "drive"),
+    ("Turbo Boost & Vacuum Gauge(psi)", -10, 12, 2, "drive"),
+    ("Fuel Rail Pressure(psi)", 5000, 20000, 0, "drive"),
+    ("Horsepower (At the wheels)(hp)", 0, 110, 1, "drive"),
+    ("Torque(Nm)", 0, 250, 1, "drive"),
+    ("Kilometers Per Litre(Instant)(kpl)", 4, 25, 2, "wave"),
+    ("Trip Distance(km)", 0, 1, 3, "distance"),
+    ("Fuel used (trip)(l)", 0, 0.07, 3, "distance"),
+    ("Run time since engine start(s)", 0, 1, 0, "elapsed"),
+]
+
+
+def channel_specs(channels: int):
+    """Los primeros `channels` PIDs; si no alcanzan, PIDs extendidos genéricos."""
+    specs = PIDS[:channels]
+    kinds = ("drive", "wave", "warm")
+    for i in range(len(specs), channels):
+        specs.append((f"Custom PID {i - len(PIDS) + 1:03d}(units)", 0, 100 + i, 2, kinds[i % 3]))
+    return specs
+
+
+def header_line(specs) -> bytes:
+    return (",".join(BASE_HEADER + [s[0] for s in specs]) + "\n").encode("utf-8")
+
+
+class _Session:
+    """Estado de una sesión que sigue de un bloque al siguiente."""
+
+    def __init__(self, start: pd.Timestamp, rng: np.random.Generator):
+        self.start = start
+        self.phases = rng.uniform(0, 2 * np.pi, 6)
+        self.lat, self.lon = ORIGIN
+        self.distance = 0.0
+
+
+def drive_profile(t: np.ndarray, phases: np.ndarray) -> np.ndarray:
+    """Fracción de la velocidad máxima (0 a 1), con detenciones."""
+    wave = (0.45 + 0.35 * np.sin(2 * np.pi * t / 600 + phases[0])
+            + 0.15 * np.sin(2 * np.pi * t / 97 + phases[1])
+            + 0.10 * np.sin(2 * np.pi * t / 31 + phases[2]))
+    return np.clip(wave, 0.0, 1.0)
+
+
+def _time_strings(times: pd.DatetimeIndex):
+    # strftime sólo para los segundos distintos del bloque (uno cada hz filas).
+    seconds = times.floor("s")
+    inverse, unique = pd.factorize(seconds)
+    device = pa.array(unique.strftime(DEVICE_TIME_FORMAT).to_numpy(dtype=object)).take(inverse)
+    gps = pa.array(unique.strftime(GPS_TIME_FORMAT).to_numpy(dtype=object)).take(inverse)
+    millis = (times - seconds) // pd.Timedelta(milliseconds=1)
+    ms = pa.array(np.char.mod(".%03d", millis).astype(object))
+    return gps, pc.binary_join_element_wise(device, ms, "")
+
+
+def _column(values: np.ndarray, decimals: int, na: np.ndarray | None = None) -> pa.Array:
+    values = np.round(values, decimals)
+    array = pa.array(values, mask=na) if na is not None else pa.array(values)
+    text = array.cast(pa.int64()).cast(pa.string()) if decimals == 0 else array.cast(pa.string())
+    return pc.fill_null(text, "-")
+
+
+def generate_chunk(session: _Session, first: int, rows: int, hz: float, specs, na_fraction: float,
+                   params, rng: np.random.Generator) -> pa.Table:
+    """Filas first..first+rows de una sesión, ya como texto."""
+    t = (first + np.arange(rows)) / hz
+    times = session.start + pd.to_timedelta(np.round(t * 1000).astype(np.int64), unit="ms")
+    drive = drive_profile(t, session.phases)
+    speed = drive * 120 / 3.6  # m/s
+    noise = rng.standard_normal((rows, len(specs) + 8))
+
+    # Posición: distancia de cada paso a lo largo del rumbo, acumulada.
+    bearing = np.mod(180 + 180 * np.sin(2 * np.pi * t / 900 + session.phases[3]), 360)
+    step = speed / hz
+    rad = np.radians(bearing)
+    lat = session.lat + np.cumsum(step * np.cos(rad)) / 111_320
+    lon = session.lon + np.cumsum(step * np.sin(rad)) / (111_320 * np.cos(np.radians(ORIGIN[0])))
+    distance = session.distance + np.cumsum(step) / 1000
+    session.lat, session.lon, session.distance = lat[-1], lon[-1], distance[-1]
+
+    no_fix = t < GPS_FIX_SECONDS
+    gps_na = no_fix if no_fix.any() else None
+    gps_time, device_time = _time_strings(times)
+    columns = [
+        pc.if_else(pa.array(no_fix), pa.scalar("-"), gps_time),
+        device_time,
+        _column(lon, 6, gps_na),
+        _column(lat, 6, gps_na),
+        _column(speed + 0.2 * noise[:, 0], 2, gps_na),
+        _column(0.8 + 0.3 * np.abs(noise[:, 1]), 1, gps_na),
+        _column(25 + 8 * np.sin(2 * np.pi * t / 1200 + session.phases[4]) + 0.5 * noise[:, 2], 1, gps_na),
+        _column(bearing, 1, gps_na),
+        _column(0.05 * noise[:, 3], 3),
+        _column(0.05 * noise[:, 4], 3),
+        _column(1 + 0.03 * noise[:, 5], 3),
+        _column(0.05 * np.abs(noise[:, 6]), 3),
+    ]
+
+    missing = rng.random((rows, len(specs))) < na_fraction if na_fraction > 0 else None
+    for i, ((name, low, high, decimals, kind), (period, phase)) in enumerate(zip(specs, params)):
+        if i % UNSUPPORTED_EVERY == UNSUPPORTED_EVERY - 1:
+            columns.append(pa.array(np.full(rows, "-", dtype=object), type=pa.string()))
+            continue
+        if kind == "drive":
+            level = drive
+        elif kind == "warm":
+            level = 1 - np.exp(-t / WARMUP_SECONDS)
+        elif kind in ("distance", "elapsed"):
+            columns.append(_column((distance if kind == "distance" else t) * high, decimals))
+            continue
+        else:
+            level = 0.5 + 0.5 * np.sin(2 * np.pi * t / period + phase)
+        values = np.clip(low + (high - low) * (level + 0.01 * noise[:, 8 + i]), low, high)
+        columns.append(_column(values, decimals, missing[:, i] if missing is not None else None))
+    return pa.Table.from_arrays(columns, names=[f"c{i}" for i in range(len(columns))])
+
+
+def write_log(f, rows: int, channels: int = 100, sessions: int = 3, hz: float = 5.0,
+              na_fraction: float = 0.02, seed: int = 0) -> int:
+    """
+    Escribe en `f` (archivo binario) un log de `rows` filas repartidas en
+    `sessions` sesiones, con `channels` PIDs además de las columnas GPS.
+    Devuelve los bytes escritos.
+    """
+    rng = np.random.default_rng(seed)
+    specs = channel_specs(channels)
+    params = list(zip(rng.uniform(20, 600, len(specs)), rng.uniform(0, 2 * np.pi, len(specs))))
+    header = header_line(specs)
+    options = pa_csv.WriteOptions(include_header=False, quoting_style="none")
+    written = 0
+    sessions = max(1, min(sessions, rows))
+    start = START
+    for number in range(sessions):
+        session_rows = rows // sessions + (number < rows % sessions)
+        session = _Session(start, rng)
+        f.write(header)
+        written += len(header)
+        for first in range(0, session_rows, CHUNK_ROWS):
+            table = generate_chunk(session, first, min(CHUNK_ROWS, session_rows - first), hz,
+                                   specs, na_fraction, params, rng)
+            sink = pa.BufferOutputStream()
+            pa_csv.write_csv(table, sink, options)
+            data = sink.getvalue()
+            f.write(data)
+            written += data.size
+        start += pd.Timedelta(seconds=session_rows / hz) + SESSION_GAP
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera un log sintético de Torque (CSV).")
+    parser.add_argument("output", help="archivo CSV a escribir")
+    parser.add_argument("--rows", type=int, default=100_000, help="filas de datos. Default: 100000")
+    parser.add_argument("--channels", type=int, default=100, help="PIDs además del GPS. Default: 100")
+    parser.add_argument("--sessions", type=int, default=3, help="sesiones (headers repetidos). Default: 3")
+    parser.add_argument("--hz", type=float, default=5.0, help="lecturas por segundo. Default: 5")
+    parser.add_argument("--na", type=float, default=0.02, help="fracción de lecturas '-'. Default: 0.02")
+    parser.add_argument("--seed", type=int, default=0, help="semilla. Default: 0")
+    args = parser.parse_args()
+
+    with open(args.output, "wb") as f:
+        size = write_log(f, args.rows, args.channels, args.sessions, args.hz, args.na, args.seed)
+    print(f"{args.output}: {args.rows} filas, {args.sessions} sesiones, "
+          f"{args.channels} PIDs, {size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Upload directo a disco para los visualizadores de Torque.
+
+dcc.Upload manda el archivo entero en base64 dentro del callback: para un log
+de 200 MB el servidor llega a tener en memoria el base64, los bytes, el str,
+el str sin headers repetidos y el DataFrame a la vez. Acá el navegador hace un
+POST con el archivo crudo (assets/torque_upload.js), el servidor lo copia a
+disco en bloques mientras calcula su hash, y pandas lo parsea desde el
+archivo (torque_parse.read_sessions). El pico de memoria queda cerca del
+tamaño del DataFrame final.
+"""
+import hashlib
+import os
+import tempfile
+import uuid
+
+from flask import jsonify, request
+
+CHUNK_SIZE = 1 << 20  # 1 MB por lectura del request
+UPLOAD_DIR = os.path.join(tempfile.gettempdir(), "torque_uploads")
+UPLOAD_ROUTE = "/upload-stream"
+
+
+def stream_to_disk(stream, directory: str = UPLOAD_DIR):
+    """
+    Copia un stream binario a un archivo temporal, en bloques, calculando el
+    hash del contenido al mismo tiempo. Devuelve (ruta, clave).
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.blake2b(digest_size=16)
+    path = os.path.join(directory, f"{uuid.uuid4().hex}.csv")
+    with open(path, "wb") as out:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            out.write(chunk)
+    return path, digest.hexdigest()
+
+
+def register_upload_route(server, handle, route: str = UPLOAD_ROUTE):
+    """
+    Agrega al servidor Flask de la app el endpoint POST `route`.
+
+    handle(path, key, session_id, filename) recibe el archivo ya escrito en disco y
+    devuelve None si se cargó bien o un mensaje de error. El archivo temporal
+    se borra al terminar. La respuesta es {"key": ...} o {"error": ...},
+    lo mismo que guardan los visualizadores en su dcc.Store 'frame-key'.
+    """
+
+    def upload_stream():
+        session_id = request.args.get("session", "")
+        filename = request.args.get("name", "")
+        path, key = stream_to_disk(request.stream)
+        try:
+            error = handle(path, key, session_id, filename)
+        except Exception as e:
+            print(e)
+            error = "There was an error processing the file."
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if error:
+            return jsonify({"error": error})
+        return jsonify({"key": key})
+
+    server.add_url_rule(route, "upload_stream", upload_stream, methods=["POST"])